@@ -1,65 +1,241 @@
 import asyncio
 
+import atexit
+import json
+import logging
 import os
+import queue
+import tempfile
 import time
 import uuid
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from flask import Flask, request, jsonify, render_template
+from flask import Flask, Response, request, jsonify, render_template, stream_with_context
 from flask_cors import CORS
 
 from dotenv import load_dotenv
-from markitdown import MarkItDown
+from modules.AgentPool import AgentPool
+from modules.AgentRegistry import create_registry
 from modules.AssistantWithFilesys import AssistantWithFilesys
+from modules.ChunkDeduplicator import ChunkDeduplicator
+from modules.DocumentConverter import ConversionTimeoutError, DocumentConverter, DocumentTooLargeError
+from modules.ExtractiveSummarizer import ExtractiveSummarizer
+from modules.FileManifest import create_manifest
+from modules.IngestionJobQueue import IngestionError, IngestionJobQueue, QueueFullError
+from modules.LettaClientPool import LettaClientPool
+from modules.MapReduceSummarizer import MapReduceSummarizer
+from modules.RateLimiter import RateLimiter
+from modules.SearchIndex import SearchIndex
+from modules.SummaryCache import SummaryCache
+from modules.Telemetry import Telemetry
+from modules.UploadStatusTracker import UploadStatusTracker
 from langchain.chat_models import init_chat_model
-from langchain_text_splitters import CharacterTextSplitter
-from langchain_core.documents import Document
-from langchain_core.prompts import ChatPromptTemplate
+
+log = logging.getLogger(__name__)
 
 load_dotenv()
 
+# Leveled logging: LOG_LEVEL=WARNING turns the per-request lines off, DEBUG adds one line per timed span.
+logging.basicConfig(
+    level=os.environ.get("LOG_LEVEL", "INFO").upper(),
+    format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+)
 
+# Timed spans and counters served on /metrics; traces are also exported when an OTLP endpoint is set.
+telemetry = Telemetry.default()
+if os.environ.get("OTEL_EXPORTER_OTLP_ENDPOINT"):
+    telemetry.enable_otel(os.environ.get("OTEL_SERVICE_NAME", "research-assistant"))
 
-# Local LLM for summarization
-llm = init_chat_model("gpt-4o-mini", model_provider="openai")
+# Local state (caches, SQLite stores) lives here unless configured otherwise.
+DATA_DIR = os.environ.get("DATA_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache"))
+os.makedirs(DATA_DIR, exist_ok=True)
 
-map_prompt = ChatPromptTemplate.from_messages(
-    [("system", "Write a concise summary of the following:\n\n{context}")]
-)
 
-reduce_prompt = ChatPromptTemplate.from_messages(
-    [("system",
-      "The following are summary fragments:\n\n{summaries}\n\n"
-      "Condense into one high-quality final summary.")]
-)
+# Local LLM for summarization
+SUMMARY_MODEL = "gpt-4o-mini"
+llm = init_chat_model(SUMMARY_MODEL, model_provider="openai")
 
-text_splitter = CharacterTextSplitter(chunk_size=80000, chunk_overlap=500)
+MAP_TEMPLATE = "Write a concise summary of the following:\n\n{context}"
+REDUCE_TEMPLATE = (
+    "The following are summary fragments:\n\n{summaries}\n\n"
+    "Condense into one high-quality final summary."
+)
 
-async def map_reduce_summarize(markdown_text: str) -> str:
-    docs = text_splitter.split_text(markdown_text)
-    docs = [Document(page_content=d) for d in docs]
+# Requests/tokens-per-minute budget of the LLM provider, shared by the summarizer and chat
+# (set LLM_RATE_LIMIT_DB to share it between the workers of this host).
+rate_limiter = RateLimiter.default()
 
-    async def summarize_doc(doc):
-        prompt = map_prompt.invoke({"context": doc.page_content})
-        response = await llm.ainvoke(prompt)
-        return response.content
+# Chunk-level summary cache: re-uploads only pay for chunks never seen before.
+summary_cache = SummaryCache(
+    path=os.environ.get("SUMMARY_CACHE_PATH", os.path.join(DATA_DIR, "summary_cache.sqlite3")),
+    max_bytes=int(os.environ.get("SUMMARY_CACHE_MAX_MB", 256)) * 1024 * 1024,
+)
 
-    summaries = await asyncio.gather(*(summarize_doc(doc) for doc in docs))
+# Repeated headers/footers and near-duplicate chunks (MinHash) are dropped before the map step.
+chunk_deduplicator = None
+if os.environ.get("SUMMARY_DEDUP", "1").strip().lower() not in ("0", "false", "no", "off"):
+    chunk_deduplicator = ChunkDeduplicator(
+        threshold=float(os.environ.get("SUMMARY_DEDUP_THRESHOLD", 0.85)),
+        min_line_repeats=int(os.environ.get("SUMMARY_BOILERPLATE_MIN_REPEATS", 3)),
+    )
 
-    reduce_input = {"summaries": "\n".join(summaries)}
-    final_prompt = reduce_prompt.invoke(reduce_input)
-    final_response = await llm.ainvoke(final_prompt)
+# Token-aware chunking, bounded in-flight LLM calls and a recursive reduce tree.
+summarizer = MapReduceSummarizer(
+    llm,
+    model_name=SUMMARY_MODEL,
+    map_template=MAP_TEMPLATE,
+    reduce_template=REDUCE_TEMPLATE,
+    chunk_tokens=int(os.environ.get("SUMMARY_CHUNK_TOKENS", 16000)),
+    chunk_overlap_tokens=int(os.environ.get("SUMMARY_CHUNK_OVERLAP_TOKENS", 200)),
+    reduce_max_tokens=int(os.environ.get("SUMMARY_REDUCE_MAX_TOKENS", 24000)),
+    max_concurrency=int(os.environ.get("SUMMARY_MAX_CONCURRENCY", 4)),
+    cache=summary_cache,
+    rate_limiter=rate_limiter,
+    deduplicator=chunk_deduplicator,
+    # Local TextRank summaries: the hybrid/extractive modes and the fallback when the LLM is
+    # rate-limited or down.
+    extractive=ExtractiveSummarizer(max_sentences=int(os.environ.get("SUMMARY_EXTRACTIVE_SENTENCES", 15))),
+    mode=os.environ.get("SUMMARY_MODE", "abstractive"),
+    fallback=os.environ.get("SUMMARY_FALLBACK", "1").strip().lower() not in ("0", "false", "no", "off"),
+    fallback_max_wait=float(os.environ.get("SUMMARY_FALLBACK_MAX_WAIT", 30)),
+    fallback_cooldown=float(os.environ.get("SUMMARY_FALLBACK_COOLDOWN", 60)),
+    shrink_sentences=int(os.environ.get("SUMMARY_SHRINK_SENTENCES", 12)),
+)
 
-    return final_response.content
+async def map_reduce_summarize(markdown_text: str, on_event=None, mode: str = None) -> str:
+    return await summarizer.summarize(markdown_text, on_event=on_event, mode=mode)
 
 
 
 app = Flask(__name__)
 CORS(app)
 
-markitdown = MarkItDown()
-LETTA_BASE = "http://letta_server:8283/"
+# MarkItDown runs in worker processes with memory/time limits, never in the API process.
+document_converter = DocumentConverter(
+    workers=int(os.environ.get("CONVERT_WORKERS", 2)),
+    max_rss_mb=int(os.environ.get("CONVERT_MAX_RSS_MB", 2048)),
+    timeout=float(os.environ.get("CONVERT_TIMEOUT", 300)),
+    max_tasks_per_child=int(os.environ.get("CONVERT_MAX_TASKS_PER_CHILD", 20)),
+    max_file_mb=int(os.environ.get("CONVERT_MAX_FILE_MB", 100)),
+)
+atexit.register(document_converter.shutdown)
+LETTA_BASE = os.environ.get("LETTA_BASE_URL", "http://letta_server:8283/")
+CONVERSATION_BUFFER_SIZE = int(os.environ.get("CONVERSATION_BUFFER_SIZE", 200))
+UPLOAD_TMP_DIR = os.environ.get("UPLOAD_TMP_DIR") or None
+letta_pool = LettaClientPool.default()
+
+# One poller for the processing status of every uploaded file.
+upload_tracker = UploadStatusTracker(
+    min_interval=float(os.environ.get("UPLOAD_STATUS_MIN_INTERVAL", 1)),
+    max_interval=float(os.environ.get("UPLOAD_STATUS_MAX_INTERVAL", 15)),
+    max_pending_age=float(os.environ.get("UPLOAD_STATUS_MAX_PENDING_AGE", 3600)),
+)
+
+# Shared registry of agent_id -> (agent_name, folder_id, personality, model), so any
+# worker or replica can serve any agent. `agents` only caches the handles built here.
+AGENT_REGISTRY_URL = os.environ.get("AGENT_REGISTRY_URL", f"sqlite:///{os.path.join(DATA_DIR, 'agents.sqlite3')}")
+agent_registry = create_registry(AGENT_REGISTRY_URL)
+# filename -> content hash -> file_id per folder, so re-uploads of unchanged documents
+# are skipped in every worker. Lives next to the registry unless configured otherwise.
+file_manifest = create_manifest(os.environ.get("FILE_MANIFEST_URL", AGENT_REGISTRY_URL))
 agents = {}
 
+# BM25 full-text index of the uploaded documents and summaries of every folder, for
+# /api/search. Updated by one background thread once an upload reached Letta, so the
+# upload response never waits for it and SQLite sees a single writer.
+search_index = SearchIndex(
+    path=os.environ.get("SEARCH_INDEX_PATH", os.path.join(DATA_DIR, "search_index.sqlite3")),
+    passage_words=int(os.environ.get("SEARCH_PASSAGE_WORDS", 120)),
+)
+search_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="search-index")
+
+# Opt-in (AGENT_POOL_SIZE > 0): idle agent + folder pairs per personality, set up in the
+# background, so creating an agent is a rename instead of the full setup. Each worker
+# keeps its own pairs and deletes them on exit. Nothing is created at import: the pool
+# starts filling on the first agent creation, or from start_agent_pool().
+agent_pool = AgentPool(
+    LETTA_BASE,
+    size=int(os.environ.get("AGENT_POOL_SIZE", 0)),
+    pool=letta_pool,
+    tracker=upload_tracker,
+    manifest=file_manifest,
+)
+atexit.register(agent_pool.shutdown)
+
+
+def start_agent_pool():
+    """Startup hook: fill the agent pool now rather than on the first agent creation."""
+    agent_pool.start()
+
+
+def _exists_in_letta(kind: str, name: str) -> bool:
+    """
+    Whether Letta has an agent or folder (``kind``) of this name.
+
+    Looked up through the metadata cache, under the keys ``AssistantWithFilesys`` uses, so
+    the direct setup that follows reuses the lookup.
+    """
+    client = letta_pool.client(LETTA_BASE)
+    resource = client.agents if kind == "agent" else client.folders
+    found = letta_pool.metadata_cache.get_or_load(
+        f"{kind}_by_name",
+        (LETTA_BASE.rstrip("/"), name),
+        lambda: next(iter(resource.list(name=name)), None)
+    )
+    return found is not None
+
+
+def claim_pooled_agent(personality: str, agent_name: str, folder_name: str):
+    """
+    Claim a pre-provisioned agent + folder from the pool, or None to set one up directly.
+
+    Names of an agent or folder that already exists (in the registry, or only in Letta,
+    e.g. created by another deployment) keep the direct path, which retrieves the existing
+    agent instead of renaming a pooled one into a second agent of the same name.
+    """
+    if agent_pool.size <= 0:
+        return None
+    if any(record["agent_name"] == agent_name for record in agent_registry.list()):
+        return None
+    if _exists_in_letta("agent", agent_name) or _exists_in_letta("folder", folder_name):
+        return None
+    return agent_pool.take(personality, agent_name, folder_name)
+
+def get_assistant(agent_id):
+    """
+    Return the AssistantWithFilesys handle for a registered agent, or None if unknown.
+
+    Handles are rebuilt lazily from the registry on first use in this worker, by id
+    and without any agent/folder setup.
+    """
+    if not agent_id:
+        return None
+    assistant = agents.get(agent_id)
+    if assistant is not None:
+        return assistant
+    record = agent_registry.get(agent_id)
+    if record is None:
+        return None
+    try:
+        assistant = AssistantWithFilesys(
+            agent_name=record["agent_name"],
+            folder_name=record["folder_name"],
+            base_url=LETTA_BASE,
+            model=record["model"],
+            personality=record["personality"],
+            conversation_buffer_size=CONVERSATION_BUFFER_SIZE,
+            agent_id=record["agent_id"],
+            folder_id=record["folder_id"],
+            pool=letta_pool,
+            tracker=upload_tracker,
+            manifest=file_manifest
+        )
+    except Exception as e:
+        log.warning(f"[Registry] Could not rebuild agent {agent_id}: {e}")
+        return None
+    return agents.setdefault(agent_id, assistant)
+
 @app.route("/")
 def index():
     return render_template("index.html")
@@ -69,19 +245,34 @@ def create_agent():
     data = request.get_json(silent=True) or {}
     agent_name = data.get("agent_name")
     personality = data.get("personality", "helpful")
-    print(f"creating agent {agent_name}")
+    log.info(f"creating agent {agent_name}")
     if not agent_name:
         agent_name = f"no_name_{uuid.uuid4().hex[:8]}"
     folder_name = f"{agent_name}_research_folder"
     try:
+        claimed = claim_pooled_agent(personality, agent_name, folder_name) or {}
         assistant = AssistantWithFilesys(
             agent_name=agent_name,
             folder_name=folder_name,
             base_url=LETTA_BASE,
-            personality=personality
+            personality=personality,
+            conversation_buffer_size=CONVERSATION_BUFFER_SIZE,
+            pool=letta_pool,
+            tracker=upload_tracker,
+            manifest=file_manifest,
+            agent=claimed.get("agent"),
+            folder=claimed.get("folder")
         )
         agent_id = assistant.get_agent_id()
         folder_id = assistant.get_folder_id()
+        agent_registry.put({
+            "agent_id": agent_id,
+            "agent_name": agent_name,
+            "folder_id": folder_id,
+            "folder_name": folder_name,
+            "personality": assistant.personality,
+            "model": assistant.model
+        })
         agents[agent_id] = assistant
         return jsonify({
             "message": "Agent created successfully",
@@ -95,67 +286,91 @@ def create_agent():
 
 @app.route("/api/agent/list", methods=["GET"])
 def list_agents():
-    if not agents:
-        return jsonify({"agents": []}), 200
     agent_data = []
-    for agent_id, assistant in agents.items():
+    for record in agent_registry.list():
         agent_data.append({
-            "agent_id": agent_id,
-            "agent_name": assistant.agent_name,
-            "folder_id": assistant.get_folder_id(),
-            "personality": assistant.personality
+            "agent_id": record["agent_id"],
+            "agent_name": record["agent_name"],
+            "folder_id": record["folder_id"],
+            "personality": record["personality"]
         })
     return jsonify({"agents": agent_data}), 200
 
-@app.route("/api/upload", methods=["POST"])
-def upload_file():
-    if "file" not in request.files:
-        return jsonify({"error": "No file uploaded"}), 400
+def _run_async(coro):
+    """Run a coroutine on this thread's event loop (created on first use)."""
+    try:
+        loop = asyncio.get_event_loop()
+    except RuntimeError:
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+    return loop.run_until_complete(coro)
 
-    file = request.files["file"]
-    agent_id = request.form.get("agent_id")
 
-    if not agent_id or agent_id not in agents:
-        return jsonify({"error": "Missing or invalid agent_id"}), 400
+# Ingestion pipeline stages. Each takes the output of the previous one; the first
+# receives the upload payload built by /api/upload and the last returns the response.
+# Streaming uploads put an ``on_event(event, data)`` callback in the payload, which the
+# stages call with their partial results.
 
-    assistant = agents[agent_id]
+def _emit(upload: dict, event: str, data: dict):
+    on_event = upload.get("on_event")
+    if on_event is not None:
+        on_event(event, data)
 
-    # Save temp file
-    filename = file.filename or f"unnamed_{uuid.uuid4().hex[:6]}"
-    temp_path = os.path.join("/tmp", filename)
-    file.save(temp_path)
 
-    # Extract Markdown
+def convert_stage(upload: dict) -> dict:
+    """Extract Markdown from the saved upload, always removing the temp file."""
+    temp_path = upload["temp_path"]
     try:
-        result = markitdown.convert(temp_path)
-        markdown_text = result.text_content
+        markdown_text = document_converter.convert(temp_path)
+    except DocumentTooLargeError as e:
+        raise IngestionError(f"Error processing file: {e}", 413)
+    except ConversionTimeoutError as e:
+        raise IngestionError(f"Error processing file: {e}", 504)
     except Exception as e:
-        return jsonify({"error": f"Error processing file: {e}"}), 500
+        raise IngestionError(f"Error processing file: {e}", 500)
     finally:
         if os.path.exists(temp_path):
             os.remove(temp_path)
 
     if not markdown_text:
-        return jsonify({"error": "File has no readable text"}), 400
+        raise IngestionError("File has no readable text", 400)
+    upload["markdown_text"] = markdown_text
+    _emit(upload, "converted", {"markdown_chars": len(markdown_text)})
+    return upload
+
+
+def _summary_events(upload: dict):
+    """Summarizer callback keeping the deduplication counts and summary mode for the response, and forwarding every event."""
+    def on_event(event: str, data: dict):
+        if event == "dedup":
+            upload["dedup"] = data
+        elif event == "summary":
+            upload["summary_mode"] = data["mode"]
+            upload["summary_fallback"] = data["fallback"]
+        _emit(upload, event, data)
+    return on_event
 
-    # Summarize via LangChain map-reduce
-    try:
-        try:
-            loop = asyncio.get_event_loop()
-        except RuntimeError:
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
 
-        summary = loop.run_until_complete(map_reduce_summarize(markdown_text))
+def summarize_stage(upload: dict) -> dict:
+    """Summarize the Markdown via LangChain map-reduce."""
+    try:
+        upload["summary"] = _run_async(map_reduce_summarize(
+            upload["markdown_text"],
+            on_event=_summary_events(upload),
+            mode=upload.get("summary_mode")
+        ))
     except Exception as e:
-        return jsonify({"error": f"Summarization failed: {e}"}), 500
+        raise IngestionError(f"Summarization failed: {e}", 500)
+    return upload
 
-    # File names
-    base_name = os.path.splitext(filename)[0]
-    main_filename = f"{base_name}.md"
-    summary_filename = f"{base_name}_summary.md"
 
-    # Build summary with metadata header
+def _summary_document(filename: str, summary: str) -> tuple:
+    """
+    Letta file of the summary of ``filename``: (summary filename, content with a metadata
+    header, content hash). The header holds the upload date, so the summary is identified
+    by its text only and re-uploads of an unchanged document are deduplicated.
+    """
+    base_name = os.path.splitext(filename)[0]
     summary_with_header = (
         f"---\n"
         f"type: summary\n"
@@ -164,55 +379,640 @@ def upload_file():
         f"---\n\n"
         f"{summary}"
     )
-    print("**** main filename is:",main_filename)
+    content_hash = file_manifest.hash_content(f"{filename}\n{summary}".encode("utf-8"))
+    return f"{base_name}_summary.md", summary_with_header, content_hash
+
+
+def index_upload(
+    folder_id: str,
+    filename: str,
+    markdown_bytes: bytes,
+    file_id: str,
+    summary_filename: str,
+    summary: str,
+    summary_file_id: str
+):
+    """Add an uploaded document and its summary to the search index (runs on search_executor)."""
+    try:
+        with telemetry.span("search.index"):
+            search_index.index_document(
+                folder_id, filename, markdown_bytes.decode("utf-8"), file_id=file_id, kind="markdown"
+            )
+            search_index.index_document(folder_id, summary_filename, summary, file_id=summary_file_id, kind="summary")
+    except Exception as e:
+        log.warning(f"[Search] Could not index {filename} in folder {folder_id}: {e}")
+
+
+def folder_documents(client, folder_id: str, page_size: int = 20):
+    """
+    Yield the files of a Letta folder with their text, as documents for ``SearchIndex.reindex_folder``.
+
+    Summaries lose the metadata header added by ``_summary_document``.
+    """
+    after = None
+    while True:
+        page = client.folders.files.list(
+            folder_id=folder_id, order="asc", limit=page_size, after=after, include_content=True
+        )
+        for f in page:
+            name = getattr(f, "original_file_name", None) or getattr(f, "file_name", None)
+            text = f.content or ""
+            kind = "markdown"
+            if text.startswith("---\ntype: summary\n"):
+                kind = "summary"
+                end = text.find("\n---\n", 4)
+                text = text[end + 5:].lstrip("\n") if end >= 0 else text
+            if name and text:
+                yield {"filename": name, "text": text, "file_id": f.id, "kind": kind}
+        if len(page) < page_size:
+            break
+        after = page[-1].id
+
+
+def upload_stage(upload: dict) -> dict:
+    """Upload the Markdown and its summary to the agent's Letta folder."""
+    assistant = upload["assistant"]
+    filename = upload["filename"]
+    summary = upload["summary"]
+
+    # Keep only the UTF-8 bytes sent to Letta (plus the excerpt requested for the
+    # response, if any), so a large document is not held in memory several times.
+    markdown_text = upload.pop("markdown_text")
+    markdown_chars = len(markdown_text)
+    markdown_excerpt = None
+    if upload.get("include_markdown", True):
+        max_chars = upload.get("markdown_max_chars")
+        markdown_excerpt = markdown_text[:max_chars] if max_chars is not None else markdown_text
+    markdown_bytes = markdown_text.encode("utf-8")
+    del markdown_text
+
+    # File names
+    main_filename = f"{os.path.splitext(filename)[0]}.md"
+    summary_filename, summary_with_header, summary_hash = _summary_document(filename, summary)
+    log.debug(f"[Upload] Main filename is: {main_filename}")
 
     # Upload to Letta
     try:
-        main_file_info = assistant.upload_text_as_file(markdown_text, filename=main_filename)
-        summary_file_info = assistant.upload_text_as_file(summary_with_header, filename=summary_filename)
+        main_file_info = assistant.upload_text_as_file(markdown_bytes, filename=main_filename)
+        summary_file_info = assistant.upload_text_as_file(
+            summary_with_header,
+            filename=summary_filename,
+            content_hash=summary_hash
+        )
 
         file_id_markdown = main_file_info["file_id"]
         file_id_summary = summary_file_info["file_id"]
         folder_id = assistant.get_folder_id()
     except Exception as e:
-        return jsonify({"error": f"Upload to Letta failed: {e}"}), 500
+        raise IngestionError(f"Upload to Letta failed: {e}", 500)
+    search_executor.submit(
+        index_upload, folder_id, main_filename, markdown_bytes, file_id_markdown,
+        summary_filename, summary, file_id_summary
+    )
+    del markdown_bytes
 
-    # Response
-    return jsonify({
+    response = {
         "summary": summary,
-        "markdown_text": markdown_text,
         "file_id_summary": file_id_summary,
         "file_id_markdown": file_id_markdown,
         "folder_id": folder_id,
-        "agent_id": agent_id
+        "agent_id": upload["agent_id"],
+        "markdown_chars": markdown_chars,
+        "deduplicated": main_file_info["deduplicated"]
+    }
+    if upload.get("dedup") is not None:
+        response["dedup"] = upload["dedup"]
+    response["summary_mode"] = upload.get("summary_mode")
+    if upload.get("summary_fallback"):
+        response["summary_fallback"] = upload["summary_fallback"]
+    if markdown_excerpt is not None:
+        response["markdown_text"] = markdown_excerpt
+        response["markdown_truncated"] = len(markdown_excerpt) < markdown_chars
+    return response
+
+
+# Job-based ingestion: queue depth, worker count and per-stage concurrency are
+# shared by queued jobs and synchronous uploads.
+ingest_queue = IngestionJobQueue(
+    stages=[
+        ("convert", convert_stage),
+        ("summarize", summarize_stage),
+        ("upload", upload_stage),
+    ],
+    workers=int(os.environ.get("INGEST_WORKERS", 2)),
+    max_queue=int(os.environ.get("INGEST_MAX_QUEUE", 16)),
+    stage_concurrency={
+        "convert": int(os.environ.get("INGEST_CONVERT_CONCURRENCY", 2)),
+        "summarize": int(os.environ.get("INGEST_SUMMARIZE_CONCURRENCY", 2)),
+        "upload": int(os.environ.get("INGEST_UPLOAD_CONCURRENCY", 4)),
+    },
+    max_finished=int(os.environ.get("INGEST_MAX_FINISHED_JOBS", 100)),
+    # Finished jobs are kept for status queries: only their small fields, never the Markdown.
+    result_fields=(
+        "summary", "file_id_summary", "file_id_markdown", "folder_id", "agent_id",
+        "deduplicated", "summary_mode", "summary_fallback",
+    ),
+)
+
+
+def _form_flag(name: str, default: bool = False) -> bool:
+    """Interpret a form field such as async=true as a boolean."""
+    value = (request.form.get(name) or "").strip().lower()
+    if not value:
+        return default
+    return value in ("1", "true", "yes", "on")
+
+
+def _summary_mode():
+    """The summary_mode form field, checked against the summarizer; None if absent."""
+    mode = request.form.get("summary_mode")
+    return summarizer.check_mode(mode) if mode else None
+
+
+def _save_upload(file) -> tuple:
+    """
+    Stream an uploaded file to a unique temp path (keeping its extension, which
+    MarkItDown uses to pick a converter). Returns (filename, temp_path).
+    """
+    filename = file.filename or f"unnamed_{uuid.uuid4().hex[:6]}"
+    suffix = os.path.splitext(os.path.basename(filename))[1]
+    fd, temp_path = tempfile.mkstemp(prefix="upload_", suffix=suffix, dir=UPLOAD_TMP_DIR)
+    with os.fdopen(fd, "wb") as out:
+        file.save(out)
+    return filename, temp_path
+
+
+def _upload_payload() -> tuple:
+    """
+    Validate the form of a single-document upload and save its file.
+
+    Returns:
+        tuple: (upload payload, None), or (None, error response) when the form is invalid.
+    """
+    if "file" not in request.files:
+        return None, (jsonify({"error": "No file uploaded"}), 400)
+
+    file = request.files["file"]
+    agent_id = request.form.get("agent_id")
+
+    assistant = get_assistant(agent_id)
+    if assistant is None:
+        return None, (jsonify({"error": "Missing or invalid agent_id"}), 400)
+
+    markdown_max_chars = request.form.get("markdown_max_chars", type=int)
+    if markdown_max_chars is not None and markdown_max_chars < 0:
+        return None, (jsonify({"error": "markdown_max_chars must be >= 0"}), 400)
+
+    try:
+        summary_mode = _summary_mode()
+    except ValueError as e:
+        return None, (jsonify({"error": str(e)}), 400)
+
+    # Save temp file (unique per request, so concurrent uploads of one name don't collide)
+    filename, temp_path = _save_upload(file)
+
+    return {
+        "assistant": assistant,
+        "agent_id": agent_id,
+        "filename": filename,
+        "temp_path": temp_path,
+        "include_markdown": _form_flag("include_markdown", default=True),
+        "markdown_max_chars": markdown_max_chars,
+        "summary_mode": summary_mode,
+    }, None
+
+
+@app.route("/api/upload", methods=["POST"])
+def upload_file():
+    upload, error = _upload_payload()
+    if error is not None:
+        return error
+    agent_id, filename, temp_path = upload["agent_id"], upload["filename"], upload["temp_path"]
+
+    if _form_flag("async"):
+        # The job result doesn't keep the Markdown, don't build an excerpt of it.
+        upload["include_markdown"] = False
+        try:
+            job = ingest_queue.submit(upload, metadata={"agent_id": agent_id, "filename": filename})
+        except QueueFullError as e:
+            os.remove(temp_path)
+            return jsonify({"error": str(e)}), 503
+        return jsonify({
+            "job_id": job.job_id,
+            "status": job.status,
+            "status_url": f"/api/jobs/{job.job_id}"
+        }), 202
+
+    try:
+        with telemetry.span("upload_file", filename=filename):
+            response = ingest_queue.run(upload)
+    except IngestionError as e:
+        return jsonify({"error": str(e)}), e.status_code
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+    return jsonify(response), 200
+
+
+# Streamed uploads run their pipeline here rather than on the request thread, so they
+# complete after a disconnect; a pool of their own keeps them from queueing behind batches.
+stream_executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get("UPLOAD_STREAM_MAX_PARALLEL", 32)),
+    thread_name_prefix="stream-ingest",
+)
+
+@app.route("/api/upload/stream", methods=["POST"])
+def upload_file_stream():
+    """
+    /api/upload, streaming the partial results as they are produced: ``converted``,
+    ``chunks``, one ``chunk_summary`` per chunk (in completion order), ``summary``, then
+    ``done`` with the /api/upload response (file ids included) or ``error``. Sent as
+    Server-Sent Events, or as JSON lines ({"event", "data"}) with ``format=ndjson``.
+    """
+    upload, error = _upload_payload()
+    if error is not None:
+        return error
+    ndjson = (request.form.get("format") or "").strip().lower() in ("ndjson", "jsonl")
+    format_event = _ndjson if ndjson else _sse
+    events = queue.Queue()
+    upload["on_event"] = lambda event, data: events.put((event, data))
+    filename, temp_path = upload["filename"], upload["temp_path"]
+
+    def run():
+        # The upload completes even if the client disconnects.
+        try:
+            with telemetry.span("upload_file", filename=filename, streamed=True):
+                events.put(("done", ingest_queue.run(upload)))
+        except IngestionError as e:
+            events.put(("error", {"error": str(e), "status_code": e.status_code}))
+        except Exception as e:
+            events.put(("error", {"error": str(e), "status_code": 500}))
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    stream_executor.submit(run)
+
+    def generate():
+        while True:
+            try:
+                event, data = events.get(timeout=15)
+            except queue.Empty:
+                yield "\n" if ndjson else ": keep-alive\n\n"
+                continue
+            yield format_event(event, data)
+            if event in ("done", "error"):
+                return
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="application/x-ndjson" if ndjson else "text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+# Batch uploads run one pipeline per document on this pool; the stage limits of
+# ingest_queue still apply across every batch and single upload.
+BATCH_MAX_FILES = int(os.environ.get("BATCH_MAX_FILES", 100))
+BATCH_MAX_ARCHIVE_MB = int(os.environ.get("BATCH_MAX_ARCHIVE_MB", 500))
+batch_executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get("BATCH_MAX_PARALLEL", 8)),
+    thread_name_prefix="batch-ingest",
+)
+
+
+def _expand_archive(archive_path: str, max_files: int = None) -> list:
+    """
+    Extract the documents of a zip archive to unique temp paths.
+
+    Directories, hidden files and macOS metadata are skipped; member paths are
+    reduced to their base name so nothing is written outside the temp dir.
+
+    Args:
+        archive_path (str): The zip archive.
+        max_files (int, optional): Documents the batch still has room for; extraction stops
+            at ``max_files + 1`` documents, enough for the caller to see the limit is exceeded.
+
+    Returns:
+        list[tuple[str, str]]: (filename, temp_path) pairs.
+    """
+    extracted = []
+    # Bytes actually written, not the sizes the zip headers declare (which can be forged).
+    remaining = BATCH_MAX_ARCHIVE_MB * 2**20
+    try:
+        with zipfile.ZipFile(archive_path) as archive:
+            for member in archive.infolist():
+                name = os.path.basename(member.filename)
+                if member.is_dir() or not name or name.startswith(".") or member.filename.startswith("__MACOSX/"):
+                    continue
+                if max_files is not None and len(extracted) > max_files:
+                    break
+                suffix = os.path.splitext(name)[1]
+                fd, temp_path = tempfile.mkstemp(prefix="upload_", suffix=suffix, dir=UPLOAD_TMP_DIR)
+                extracted.append((name, temp_path))
+                with os.fdopen(fd, "wb") as out, archive.open(member) as src:
+                    while chunk := src.read(min(1024 * 1024, remaining + 1)):
+                        remaining -= len(chunk)
+                        if remaining < 0:
+                            raise IngestionError(f"Archive expands to more than {BATCH_MAX_ARCHIVE_MB} MB", 413)
+                        out.write(chunk)
+    except Exception:
+        for _, temp_path in extracted:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        raise
+    return extracted
+
+
+def _run_batch_item(upload: dict) -> dict:
+    """Run the pipeline for one document of a batch, returning its manifest entry."""
+    started = time.time()
+    try:
+        result = ingest_queue.run(upload)
+        entry = {"filename": upload["filename"], "status": "completed", **result}
+    except IngestionError as e:
+        entry = {"filename": upload["filename"], "status": "failed", "error": str(e), "status_code": e.status_code}
+    except Exception as e:
+        entry = {"filename": upload["filename"], "status": "failed", "error": str(e), "status_code": 500}
+    finally:
+        if os.path.exists(upload["temp_path"]):
+            os.remove(upload["temp_path"])
+    entry["elapsed_s"] = round(time.time() - started, 3)
+    return entry
+
+
+@app.route("/api/upload/batch", methods=["POST"])
+def upload_batch():
+    files = request.files.getlist("files") + request.files.getlist("file")
+    if not files:
+        return jsonify({"error": "No files uploaded"}), 400
+
+    agent_id = request.form.get("agent_id")
+    assistant = get_assistant(agent_id)
+    if assistant is None:
+        return jsonify({"error": "Missing or invalid agent_id"}), 400
+
+    markdown_max_chars = request.form.get("markdown_max_chars", type=int)
+    if markdown_max_chars is not None and markdown_max_chars < 0:
+        return jsonify({"error": "markdown_max_chars must be >= 0"}), 400
+
+    try:
+        summary_mode = _summary_mode()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    started = time.time()
+    documents = []
+    manifest = []
+    try:
+        for file in files:
+            filename, temp_path = _save_upload(file)
+            if not filename.lower().endswith(".zip"):
+                documents.append((filename, temp_path))
+            else:
+                try:
+                    documents.extend(_expand_archive(temp_path, BATCH_MAX_FILES - len(documents)))
+                except (zipfile.BadZipFile, IngestionError) as e:
+                    manifest.append({"filename": filename, "status": "failed", "error": f"Invalid archive: {e}"})
+                finally:
+                    os.remove(temp_path)
+            # Over the limit: don't save or expand the rest, the batch is rejected.
+            if len(documents) > BATCH_MAX_FILES:
+                break
+    except Exception:
+        for _, temp_path in documents:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        raise
+
+    if len(documents) > BATCH_MAX_FILES:
+        for _, temp_path in documents:
+            os.remove(temp_path)
+        return jsonify({"error": f"Too many documents in batch (max {BATCH_MAX_FILES})"}), 413
+
+    uploads = [
+        {
+            "assistant": assistant,
+            "agent_id": agent_id,
+            "filename": filename,
+            "temp_path": temp_path,
+            # The manifest of a large batch would otherwise echo every document.
+            "include_markdown": _form_flag("include_markdown", default=False),
+            "markdown_max_chars": markdown_max_chars,
+            "summary_mode": summary_mode,
+        }
+        for filename, temp_path in documents
+    ]
+
+    if _form_flag("async"):
+        for upload in uploads:
+            try:
+                job = ingest_queue.submit(upload, metadata={"agent_id": agent_id, "filename": upload["filename"]})
+                manifest.append({
+                    "filename": upload["filename"],
+                    "status": job.status,
+                    "job_id": job.job_id,
+                    "status_url": f"/api/jobs/{job.job_id}"
+                })
+            except QueueFullError as e:
+                os.remove(upload["temp_path"])
+                manifest.append({"filename": upload["filename"], "status": "failed", "error": str(e), "status_code": 503})
+        return jsonify({"agent_id": agent_id, "files": manifest}), 202
+
+    # Every document gets its own pipeline; conversion, summarization and uploads
+    # of different documents overlap, bounded by the per-stage limits.
+    manifest.extend(batch_executor.map(_run_batch_item, uploads))
+    failed = sum(1 for entry in manifest if entry["status"] == "failed")
+    return jsonify({
+        "agent_id": agent_id,
+        "folder_id": assistant.get_folder_id(),
+        "files": manifest,
+        "succeeded": len(manifest) - failed,
+        "failed": failed,
+        "elapsed_s": round(time.time() - started, 3)
     }), 200
 
 
+@app.route("/api/jobs", methods=["GET"])
+def list_jobs():
+    agent_id = request.args.get("agent_id")
+    jobs = ingest_queue.list_jobs(agent_id=agent_id) if agent_id else ingest_queue.list_jobs()
+    return jsonify({
+        "jobs": [job.to_dict() for job in jobs],
+        "queue": ingest_queue.stats()
+    }), 200
+
+
+@app.route("/api/jobs/<job_id>", methods=["GET"])
+def get_job(job_id):
+    job = ingest_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job_id"}), 404
+    return jsonify(job.to_dict()), 200
+
+
+def _letta_client(agent_id=None):
+    """Letta client of the given agent, or the shared client for LETTA_BASE."""
+    assistant = get_assistant(agent_id)
+    return assistant.client if assistant is not None else letta_pool.client(LETTA_BASE)
+
 @app.route("/api/upload/status", methods=["GET"])
 def check_upload_status():
     folder_id = request.args.get("folder_id")
     file_id = request.args.get("file_id")
     agent_id = request.args.get("agent_id")
-    if not folder_id or not file_id or not agent_id:
-        return jsonify({"error": "Missing folder_id, file_id, or agent_id"}), 400
-    if agent_id not in agents:
+    if not folder_id or not file_id:
+        return jsonify({"error": "Missing folder_id or file_id"}), 400
+    if agent_id and get_assistant(agent_id) is None:
         return jsonify({"error": "Unknown agent_id"}), 404
-    assistant = agents[agent_id]
-    try:
-        files = assistant.client.folders.files.list(
-            folder_id=folder_id,
-            order="desc",
-            limit=10
-        )
-        for f in files:
-            if f.id == file_id:
-                return jsonify({
-                    "file_id": file_id,
-                    "status": f.processing_status
-                }), 200
+
+    # Served from the tracker's table; Letta is only asked about files this
+    # process has never seen (e.g. uploaded through another worker).
+    entry = upload_tracker.get(file_id)
+    if entry is None:
+        try:
+            entry = upload_tracker.refresh(_letta_client(agent_id), folder_id, file_id)
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+    if entry is None:
         return jsonify({"error": "File not found"}), 404
+    return jsonify(entry), 200
+
+@app.route("/api/upload/status/stream", methods=["GET"])
+def stream_upload_status():
+    folder_id = request.args.get("folder_id")
+    agent_id = request.args.get("agent_id")
+    file_ids = {f for f in (request.args.get("file_id") or "").split(",") if f}
+    if not folder_id and not file_ids:
+        return jsonify({"error": "Missing folder_id or file_id"}), 400
+
+    def wanted(entry):
+        return (not folder_id or entry["folder_id"] == folder_id) and (not file_ids or entry["file_id"] in file_ids)
+
+    def generate():
+        events = upload_tracker.subscribe()
+        try:
+            finished = set()
+            for file_id in sorted(file_ids):
+                entry = upload_tracker.get(file_id)
+                if entry is None and folder_id:
+                    try:
+                        entry = upload_tracker.refresh(_letta_client(agent_id), folder_id, file_id)
+                    except Exception as e:
+                        yield _sse("error", {"file_id": file_id, "error": str(e)})
+                if entry is None:
+                    finished.add(file_id)
+                    yield _sse("error", {"file_id": file_id, "error": "File not found"})
+                    continue
+                yield _sse("status", entry)
+                if entry["status"] in UploadStatusTracker.TERMINAL_STATUSES:
+                    finished.add(file_id)
+
+            # Without file ids, follow the folder until the client disconnects.
+            while not file_ids or finished != file_ids:
+                try:
+                    entry = events.get(timeout=15)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+                    continue
+                if not wanted(entry):
+                    continue
+                yield _sse("status", entry)
+                if entry["status"] in UploadStatusTracker.TERMINAL_STATUSES:
+                    finished.add(entry["file_id"])
+            yield _sse("done", {"file_ids": sorted(finished)})
+        finally:
+            upload_tracker.unsubscribe(events)
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    return Response(telemetry.render(), mimetype="text/plain; version=0.0.4")
+
+@app.route("/api/agent/pool", methods=["GET"])
+def agent_pool_stats():
+    return jsonify(agent_pool.stats()), 200
+
+@app.route("/api/metadata/cache", methods=["GET"])
+def metadata_cache_stats():
+    return jsonify(letta_pool.metadata_cache.stats()), 200
+
+@app.route("/api/llm/rate-limit", methods=["GET"])
+def rate_limit_stats():
+    return jsonify(rate_limiter.stats()), 200
+
+@app.route("/api/summary/cache", methods=["GET"])
+def summary_cache_stats():
+    return jsonify(summary_cache.stats()), 200
+
+def _search_folder(args) -> tuple:
+    """
+    Folder of a search request, given by folder_id or agent_id.
+
+    Returns:
+        tuple: (folder_id, None), or (None, error response).
+    """
+    folder_id = args.get("folder_id")
+    agent_id = args.get("agent_id")
+    if folder_id:
+        return folder_id, None
+    if not agent_id:
+        return None, (jsonify({"error": "Missing agent_id or folder_id"}), 400)
+    record = agent_registry.get(agent_id)
+    if record is None:
+        return None, (jsonify({"error": "Unknown agent_id"}), 404)
+    return record["folder_id"], None
+
+@app.route("/api/search", methods=["GET"])
+def search():
+    folder_id, error = _search_folder(request.args)
+    if error:
+        return error
+    query = (request.args.get("q") or "").strip()
+    if not query:
+        return jsonify({"error": "Missing q"}), 400
+    limit = request.args.get("limit", default=10, type=int)
+    if not 1 <= limit <= 100:
+        return jsonify({"error": "limit must be between 1 and 100"}), 400
+    with telemetry.span("search.query"):
+        return jsonify(search_index.search(folder_id, query, limit=limit)), 200
+
+@app.route("/api/search/document", methods=["DELETE"])
+def delete_search_document():
+    folder_id, error = _search_folder(request.args)
+    if error:
+        return error
+    filename = request.args.get("filename")
+    if not filename:
+        return jsonify({"error": "Missing filename"}), 400
+    if not search_index.delete_document(folder_id, filename):
+        return jsonify({"error": "Document not indexed"}), 404
+    return jsonify({"folder_id": folder_id, "filename": filename, "deleted": True}), 200
+
+@app.route("/api/search/reindex", methods=["POST"])
+def reindex_search():
+    folder_id, error = _search_folder(request.get_json(silent=True) or request.args)
+    if error:
+        return error
+    started = time.time()
+    try:
+        # Waits for the uploads already queued for indexing, then rebuilds from Letta.
+        result = search_executor.submit(
+            lambda: search_index.reindex_folder(folder_id, folder_documents(letta_pool.client(LETTA_BASE), folder_id))
+        ).result()
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        return jsonify({"error": f"Reindex failed: {e}"}), 500
+    return jsonify({"folder_id": folder_id, **result, "elapsed_s": round(time.time() - started, 3)}), 200
+
+@app.route("/api/search/stats", methods=["GET"])
+def search_stats():
+    return jsonify(search_index.stats(request.args.get("folder_id"))), 200
 
 @app.route("/api/chat", methods=["POST"])
 def chat_with_agent():
@@ -220,15 +1020,64 @@ def chat_with_agent():
     if not data or "message" not in data or "agent_id" not in data:
         return jsonify({"error": "Missing 'message' or 'agent_id'"}), 400
     agent_id = data["agent_id"]
-    if agent_id not in agents:
+    assistant = get_assistant(agent_id)
+    if assistant is None:
         return jsonify({"error": "Unknown agent_id"}), 404
-    assistant = agents[agent_id]
     user_message = data["message"].strip()
+    only_new = bool(data.get("only_new", False))
     try:
-        chat_data = assistant.chat(user_message)
+        chat_data = assistant.chat(user_message, only_new=only_new)
         return jsonify(chat_data), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route("/api/chat/history", methods=["GET"])
+def chat_history():
+    agent_id = request.args.get("agent_id")
+    if not agent_id:
+        return jsonify({"error": "Missing agent_id"}), 400
+    assistant = get_assistant(agent_id)
+    if assistant is None:
+        return jsonify({"error": "Unknown agent_id"}), 404
+    try:
+        limit = min(max(int(request.args.get("limit", 50)), 1), 500)
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+    try:
+        history = assistant.get_history(before=request.args.get("before"), limit=limit)
+        return jsonify(history), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+def _sse(event: str, data: dict) -> str:
+    """Format one Server-Sent Events message."""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+def _ndjson(event: str, data: dict) -> str:
+    """Format one JSON-lines message."""
+    return json.dumps({"event": event, "data": data}, default=str) + "\n"
+
+@app.route("/api/chat/stream", methods=["POST"])
+def chat_with_agent_stream():
+    data = request.get_json(silent=True)
+    if not data or "message" not in data or "agent_id" not in data:
+        return jsonify({"error": "Missing 'message' or 'agent_id'"}), 400
+    agent_id = data["agent_id"]
+    assistant = get_assistant(agent_id)
+    if assistant is None:
+        return jsonify({"error": "Unknown agent_id"}), 404
+    user_message = data["message"].strip()
+    stream_tokens = bool(data.get("stream_tokens", True))
+
+    def generate():
+        for event, payload in assistant.stream_chat(user_message, stream_tokens=stream_tokens):
+            yield _sse(event, payload)
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=5000, debug=True)
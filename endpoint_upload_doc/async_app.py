@@ -0,0 +1,797 @@
+"""
+Asyncio entry point of the API, served by aiohttp.
+
+Same routes and responses as the Flask app for agents, uploads, upload status, search,
+chat and history, but every handler is a coroutine: Letta calls go through the
+AsyncLetta client, the map-reduce summarizer runs on the same event loop, and
+only the MarkItDown conversion (worker processes) and the SQL stores leave the
+loop. One process can therefore hold hundreds of slow chat or upload requests
+without a thread per request.
+
+Configuration and shared state (registry, manifest, caches, converter, upload
+tracker) come from app.py. Job-based uploads (async=true, /api/jobs) stay on the
+Flask app.
+
+Run with:
+    gunicorn async_app:web_app -k aiohttp.GunicornWebWorker -b 0.0.0.0:5000
+or:
+    python async_app.py
+"""
+import asyncio
+import json
+import logging
+import os
+import queue
+import tempfile
+import time
+import uuid
+
+from aiohttp import web
+
+from app import (
+    BATCH_MAX_FILES,
+    CONVERSATION_BUFFER_SIZE,
+    LETTA_BASE,
+    UPLOAD_TMP_DIR,
+    _expand_archive,
+    _summary_document,
+    _summary_events,
+    agent_pool,
+    agent_registry,
+    claim_pooled_agent,
+    convert_stage,
+    file_manifest,
+    folder_documents,
+    index_upload,
+    ingest_queue,
+    letta_pool,
+    rate_limiter,
+    search_executor,
+    search_index,
+    summarizer,
+    summary_cache,
+    telemetry,
+    upload_tracker,
+)
+from modules.AsyncAssistantWithFilesys import AsyncAssistantWithFilesys
+from modules.IngestionJobQueue import IngestionError
+from modules.UploadStatusTracker import UploadStatusTracker
+
+log = logging.getLogger(__name__)
+
+# Same per-stage limits as the Flask ingestion queue, enforced on the event loop.
+stage_limits = {
+    name: asyncio.Semaphore(ingest_queue.stage_concurrency.get(name, 2))
+    for name in ingest_queue.stage_names
+}
+
+# Multipart file parts are written to disk off the loop, in batches of this many bytes.
+FORM_FLUSH_BYTES = int(os.environ.get("FORM_FLUSH_BYTES", 1 << 20))
+
+# Strong references to fire-and-forget tasks (e.g. streamed uploads), which the loop keeps weakly.
+background_tasks = set()
+
+# Handles built in this process; the registry is shared with the Flask app.
+agents = {}
+_building = {}
+
+
+async def get_assistant(agent_id):
+    """
+    Return the AsyncAssistantWithFilesys handle for a registered agent, or None if unknown.
+
+    Concurrent first requests for one agent share a single rebuild.
+    """
+    if not agent_id:
+        return None
+    assistant = agents.get(agent_id)
+    if assistant is not None:
+        return assistant
+    task = _building.get(agent_id)
+    if task is None:
+        task = _building[agent_id] = asyncio.ensure_future(_build_assistant(agent_id))
+        task.add_done_callback(lambda _: _building.pop(agent_id, None))
+    return await asyncio.shield(task)
+
+
+async def _build_assistant(agent_id):
+    record = await asyncio.to_thread(agent_registry.get, agent_id)
+    if record is None:
+        return None
+    try:
+        assistant = await AsyncAssistantWithFilesys.create(
+            agent_name=record["agent_name"],
+            folder_name=record["folder_name"],
+            agent_id=record["agent_id"],
+            folder_id=record["folder_id"],
+            base_url=LETTA_BASE,
+            model=record["model"],
+            personality=record["personality"],
+            conversation_buffer_size=CONVERSATION_BUFFER_SIZE,
+            pool=letta_pool,
+            tracker=upload_tracker,
+            manifest=file_manifest
+        )
+    except Exception as e:
+        log.warning(f"[Registry] Could not rebuild agent {agent_id}: {e}")
+        return None
+    return agents.setdefault(agent_id, assistant)
+
+
+def _error(message: str, status: int) -> web.Response:
+    return web.json_response({"error": message}, status=status)
+
+
+def _json(data, status: int = 200) -> web.Response:
+    return web.json_response(data, status=status, dumps=lambda d: json.dumps(d, default=str))
+
+
+def _sse(event: str, data: dict) -> bytes:
+    """Format one Server-Sent Events message."""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n".encode("utf-8")
+
+
+def _ndjson(event: str, data: dict) -> bytes:
+    """Format one JSON-lines message."""
+    return (json.dumps({"event": event, "data": data}, default=str) + "\n").encode("utf-8")
+
+
+async def _event_stream(request: web.Request, content_type: str = "text/event-stream") -> web.StreamResponse:
+    response = web.StreamResponse(headers={
+        "Content-Type": content_type,
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+    })
+    await response.prepare(request)
+    return response
+
+
+def _flag(fields: dict, name: str, default: bool = False) -> bool:
+    value = (fields.get(name) or "").strip().lower()
+    if not value:
+        return default
+    return value in ("1", "true", "yes", "on")
+
+
+async def _read_form(request: web.Request, max_files: int = None) -> tuple:
+    """
+    Stream a multipart form: file parts go to unique temp paths (keeping their
+    extension), text parts are returned as strings.
+
+    Args:
+        request (web.Request): The multipart request.
+        max_files (int, optional): File parts allowed; reading stops at the first one beyond
+            it, with an ``IngestionError`` (413), before its body is written anywhere.
+
+    Returns:
+        tuple[dict, list[tuple[str, str]]]: (text fields, [(filename, temp_path)]).
+    """
+    fields = {}
+    files = []
+    reader = await request.multipart()
+    try:
+        async for part in reader:
+            if part.filename is None:
+                fields[part.name] = await part.text()
+                continue
+            if max_files is not None and len(files) >= max_files:
+                raise IngestionError(f"Too many documents in batch (max {max_files})", 413)
+            filename = part.filename or f"unnamed_{uuid.uuid4().hex[:6]}"
+            suffix = os.path.splitext(os.path.basename(filename))[1]
+            fd, temp_path = await asyncio.to_thread(
+                tempfile.mkstemp, prefix="upload_", suffix=suffix, dir=UPLOAD_TMP_DIR
+            )
+            files.append((filename, temp_path))
+            out = os.fdopen(fd, "wb")
+            try:
+                pending, pending_bytes = [], 0
+                while chunk := await part.read_chunk():
+                    pending.append(chunk)
+                    pending_bytes += len(chunk)
+                    if pending_bytes >= FORM_FLUSH_BYTES:
+                        await asyncio.to_thread(out.writelines, pending)
+                        pending, pending_bytes = [], 0
+                await asyncio.to_thread(out.writelines, pending)
+            finally:
+                await asyncio.to_thread(out.close)
+    except Exception:
+        _remove_all(files)
+        raise
+    return fields, files
+
+
+def _remove_all(documents: list):
+    for _, temp_path in documents:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def _markdown_max_chars(fields: dict):
+    """Parse markdown_max_chars; None if absent, raises ValueError if invalid."""
+    value = fields.get("markdown_max_chars")
+    if value in (None, ""):
+        return None
+    value = int(value)
+    if value < 0:
+        raise ValueError("markdown_max_chars must be >= 0")
+    return value
+
+
+def _summary_mode(fields: dict):
+    """The summary_mode field, checked against the summarizer; None if absent, raises ValueError if invalid."""
+    mode = fields.get("summary_mode")
+    return summarizer.check_mode(mode) if mode else None
+
+
+# ------------------------------------------------------------------ ingestion
+
+async def ingest(upload: dict) -> dict:
+    """Convert, summarize and upload one document, within the per-stage limits."""
+    async with stage_limits["convert"]:
+        with telemetry.span("ingest.convert"):
+            # Error mapping and temp file cleanup are shared with the Flask pipeline.
+            upload = await asyncio.to_thread(convert_stage, upload)
+
+    try:
+        async with stage_limits["summarize"]:
+            with telemetry.span("ingest.summarize"):
+                summary = await summarizer.summarize(
+                    upload["markdown_text"], on_event=_summary_events(upload), mode=upload.get("summary_mode")
+                )
+    except Exception as e:
+        raise IngestionError(f"Summarization failed: {e}", 500)
+
+    assistant = upload["assistant"]
+    filename = upload["filename"]
+    markdown_text = upload.pop("markdown_text")
+    markdown_chars = len(markdown_text)
+    markdown_excerpt = None
+    if upload.get("include_markdown", True):
+        max_chars = upload.get("markdown_max_chars")
+        markdown_excerpt = markdown_text[:max_chars] if max_chars is not None else markdown_text
+    markdown_bytes = markdown_text.encode("utf-8")
+    del markdown_text
+
+    main_filename = f"{os.path.splitext(filename)[0]}.md"
+    summary_filename, summary_with_header, summary_hash = _summary_document(filename, summary)
+    try:
+        async with stage_limits["upload"]:
+            with telemetry.span("ingest.upload"):
+                main_file_info, summary_file_info = await asyncio.gather(
+                    assistant.upload_text_as_file(markdown_bytes, filename=main_filename),
+                    assistant.upload_text_as_file(summary_with_header, filename=summary_filename, content_hash=summary_hash),
+                )
+    except Exception as e:
+        raise IngestionError(f"Upload to Letta failed: {e}", 500)
+    search_executor.submit(
+        index_upload, assistant.get_folder_id(), main_filename, markdown_bytes, main_file_info["file_id"],
+        summary_filename, summary, summary_file_info["file_id"]
+    )
+
+    response = {
+        "summary": summary,
+        "file_id_summary": summary_file_info["file_id"],
+        "file_id_markdown": main_file_info["file_id"],
+        "folder_id": assistant.get_folder_id(),
+        "agent_id": upload["agent_id"],
+        "markdown_chars": markdown_chars,
+        "deduplicated": main_file_info["deduplicated"]
+    }
+    if upload.get("dedup") is not None:
+        response["dedup"] = upload["dedup"]
+    response["summary_mode"] = upload.get("summary_mode")
+    if upload.get("summary_fallback"):
+        response["summary_fallback"] = upload["summary_fallback"]
+    if markdown_excerpt is not None:
+        response["markdown_text"] = markdown_excerpt
+        response["markdown_truncated"] = len(markdown_excerpt) < markdown_chars
+    return response
+
+
+async def _ingest_batch_item(upload: dict) -> dict:
+    """Run the pipeline for one document of a batch, returning its manifest entry."""
+    started = time.time()
+    try:
+        result = await ingest(upload)
+        entry = {"filename": upload["filename"], "status": "completed", **result}
+    except IngestionError as e:
+        entry = {"filename": upload["filename"], "status": "failed", "error": str(e), "status_code": e.status_code}
+    except Exception as e:
+        entry = {"filename": upload["filename"], "status": "failed", "error": str(e), "status_code": 500}
+    finally:
+        if os.path.exists(upload["temp_path"]):
+            os.remove(upload["temp_path"])
+    entry["elapsed_s"] = round(time.time() - started, 3)
+    return entry
+
+
+# --------------------------------------------------------------------- routes
+
+routes = web.RouteTableDef()
+
+
+@routes.get("/")
+async def index(request):
+    return web.FileResponse(os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates", "index.html"))
+
+
+@routes.post("/api/agent/create")
+async def create_agent(request):
+    try:
+        data = await request.json()
+    except ValueError:
+        data = {}
+    data = data or {}
+    agent_name = data.get("agent_name")
+    personality = data.get("personality", "helpful")
+    log.info(f"creating agent {agent_name}")
+    if not agent_name:
+        agent_name = f"no_name_{uuid.uuid4().hex[:8]}"
+    folder_name = f"{agent_name}_research_folder"
+    try:
+        claimed = await asyncio.to_thread(claim_pooled_agent, personality, agent_name, folder_name) or {}
+        assistant = await AsyncAssistantWithFilesys.create(
+            agent_name=agent_name,
+            folder_name=folder_name,
+            base_url=LETTA_BASE,
+            personality=personality,
+            conversation_buffer_size=CONVERSATION_BUFFER_SIZE,
+            pool=letta_pool,
+            tracker=upload_tracker,
+            manifest=file_manifest,
+            agent=claimed.get("agent"),
+            folder=claimed.get("folder")
+        )
+        agent_id = assistant.get_agent_id()
+        folder_id = assistant.get_folder_id()
+        await asyncio.to_thread(agent_registry.put, {
+            "agent_id": agent_id,
+            "agent_name": agent_name,
+            "folder_id": folder_id,
+            "folder_name": folder_name,
+            "personality": assistant.personality,
+            "model": assistant.model
+        })
+        agents[agent_id] = assistant
+        return _json({
+            "message": "Agent created successfully",
+            "agent_name": agent_name,
+            "agent_id": agent_id,
+            "folder_id": folder_id,
+            "personality": personality
+        })
+    except Exception as e:
+        return _error(str(e), 500)
+
+
+@routes.get("/api/agent/list")
+async def list_agents(request):
+    records = await asyncio.to_thread(agent_registry.list)
+    return _json({"agents": [
+        {
+            "agent_id": record["agent_id"],
+            "agent_name": record["agent_name"],
+            "folder_id": record["folder_id"],
+            "personality": record["personality"]
+        }
+        for record in records
+    ]})
+
+
+async def _upload_payload(request) -> tuple:
+    """
+    Read the form of a single-document upload, saving its file.
+
+    Returns:
+        tuple: (upload payload, form fields, None), or (None, None, error response) when the
+        form is invalid (the saved files are then removed).
+    """
+    fields, files = await _read_form(request)
+    if not files:
+        return None, None, _error("No file uploaded", 400)
+    filename, temp_path = files[0]
+    _remove_all(files[1:])
+    assistant = await get_assistant(fields.get("agent_id"))
+    if assistant is None:
+        _remove_all(files[:1])
+        return None, None, _error("Missing or invalid agent_id", 400)
+    try:
+        markdown_max_chars = _markdown_max_chars(fields)
+        summary_mode = _summary_mode(fields)
+    except ValueError as e:
+        _remove_all(files[:1])
+        return None, None, _error(str(e), 400)
+    return {
+        "assistant": assistant,
+        "agent_id": fields["agent_id"],
+        "filename": filename,
+        "temp_path": temp_path,
+        "include_markdown": _flag(fields, "include_markdown", default=True),
+        "markdown_max_chars": markdown_max_chars,
+        "summary_mode": summary_mode,
+    }, fields, None
+
+
+@routes.post("/api/upload")
+async def upload_file(request):
+    upload, _, error = await _upload_payload(request)
+    if error is not None:
+        return error
+    try:
+        with telemetry.span("upload_file", filename=upload["filename"]):
+            return _json(await ingest(upload))
+    except IngestionError as e:
+        return _error(str(e), e.status_code)
+    finally:
+        if os.path.exists(upload["temp_path"]):
+            os.remove(upload["temp_path"])
+
+
+@routes.post("/api/upload/stream")
+async def upload_file_stream(request):
+    """/api/upload streaming its partial results (same events as the Flask app)."""
+    upload, fields, error = await _upload_payload(request)
+    if error is not None:
+        return error
+    ndjson = (fields.get("format") or "").strip().lower() in ("ndjson", "jsonl")
+    format_event = _ndjson if ndjson else _sse
+    loop = asyncio.get_running_loop()
+    events = asyncio.Queue()
+    # Called from the loop and from the conversion thread.
+    upload["on_event"] = lambda event, data: loop.call_soon_threadsafe(events.put_nowait, (event, data))
+
+    async def run():
+        try:
+            with telemetry.span("upload_file", filename=upload["filename"], streamed=True):
+                events.put_nowait(("done", await ingest(upload)))
+        except IngestionError as e:
+            events.put_nowait(("error", {"error": str(e), "status_code": e.status_code}))
+        except Exception as e:
+            events.put_nowait(("error", {"error": str(e), "status_code": 500}))
+        finally:
+            if os.path.exists(upload["temp_path"]):
+                os.remove(upload["temp_path"])
+
+    # A task of its own, so the upload completes even if the client disconnects.
+    task = asyncio.create_task(run())
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+
+    response = await _event_stream(request, "application/x-ndjson" if ndjson else "text/event-stream")
+    while True:
+        try:
+            event, data = await asyncio.wait_for(events.get(), timeout=15)
+        except asyncio.TimeoutError:
+            await response.write(b"\n" if ndjson else b": keep-alive\n\n")
+            continue
+        await response.write(format_event(event, data))
+        if event in ("done", "error"):
+            return response
+
+
+@routes.post("/api/upload/batch")
+async def upload_batch(request):
+    try:
+        fields, files = await _read_form(request, max_files=BATCH_MAX_FILES)
+    except IngestionError as e:
+        return _error(str(e), e.status_code)
+    if not files:
+        return _error("No files uploaded", 400)
+
+    documents = []
+    manifest = []
+    try:
+        assistant = await get_assistant(fields.get("agent_id"))
+        if assistant is None:
+            _remove_all(files)
+            return _error("Missing or invalid agent_id", 400)
+        try:
+            markdown_max_chars = _markdown_max_chars(fields)
+            summary_mode = _summary_mode(fields)
+        except ValueError as e:
+            _remove_all(files)
+            return _error(str(e), 400)
+
+        started = time.time()
+        for filename, temp_path in files:
+            if not filename.lower().endswith(".zip"):
+                documents.append((filename, temp_path))
+            else:
+                try:
+                    documents.extend(
+                        await asyncio.to_thread(_expand_archive, temp_path, BATCH_MAX_FILES - len(documents))
+                    )
+                except Exception as e:
+                    manifest.append({"filename": filename, "status": "failed", "error": f"Invalid archive: {e}"})
+                finally:
+                    os.remove(temp_path)
+            # Over the limit: don't expand the rest, the batch is rejected.
+            if len(documents) > BATCH_MAX_FILES:
+                break
+    except Exception:
+        _remove_all(documents + files)
+        raise
+
+    if len(documents) > BATCH_MAX_FILES:
+        _remove_all(documents + files)
+        return _error(f"Too many documents in batch (max {BATCH_MAX_FILES})", 413)
+
+    uploads = [
+        {
+            "assistant": assistant,
+            "agent_id": fields["agent_id"],
+            "filename": filename,
+            "temp_path": temp_path,
+            "include_markdown": _flag(fields, "include_markdown", default=False),
+            "markdown_max_chars": markdown_max_chars,
+            "summary_mode": summary_mode,
+        }
+        for filename, temp_path in documents
+    ]
+    manifest.extend(await asyncio.gather(*(_ingest_batch_item(upload) for upload in uploads)))
+    failed = sum(1 for entry in manifest if entry["status"] == "failed")
+    return _json({
+        "agent_id": fields["agent_id"],
+        "folder_id": assistant.get_folder_id(),
+        "files": manifest,
+        "succeeded": len(manifest) - failed,
+        "failed": failed,
+        "elapsed_s": round(time.time() - started, 3)
+    })
+
+
+@routes.get("/api/upload/status")
+async def check_upload_status(request):
+    folder_id = request.query.get("folder_id")
+    file_id = request.query.get("file_id")
+    if not folder_id or not file_id:
+        return _error("Missing folder_id or file_id", 400)
+
+    entry = upload_tracker.get(file_id)
+    if entry is None:
+        try:
+            entry = await asyncio.to_thread(upload_tracker.refresh, letta_pool.client(LETTA_BASE), folder_id, file_id)
+        except Exception as e:
+            return _error(str(e), 500)
+    if entry is None:
+        return _error("File not found", 404)
+    return _json(entry)
+
+
+@routes.get("/api/upload/status/stream")
+async def stream_upload_status(request):
+    folder_id = request.query.get("folder_id")
+    file_ids = {f for f in (request.query.get("file_id") or "").split(",") if f}
+    if not folder_id and not file_ids:
+        return _error("Missing folder_id or file_id", 400)
+
+    def wanted(entry):
+        return (not folder_id or entry["folder_id"] == folder_id) and (not file_ids or entry["file_id"] in file_ids)
+
+    response = await _event_stream(request)
+    events = upload_tracker.subscribe()
+    try:
+        finished = set()
+        for file_id in sorted(file_ids):
+            entry = upload_tracker.get(file_id)
+            if entry is None and folder_id:
+                try:
+                    entry = await asyncio.to_thread(
+                        upload_tracker.refresh, letta_pool.client(LETTA_BASE), folder_id, file_id
+                    )
+                except Exception as e:
+                    await response.write(_sse("error", {"file_id": file_id, "error": str(e)}))
+            if entry is None:
+                finished.add(file_id)
+                await response.write(_sse("error", {"file_id": file_id, "error": "File not found"}))
+                continue
+            await response.write(_sse("status", entry))
+            if entry["status"] in UploadStatusTracker.TERMINAL_STATUSES:
+                finished.add(file_id)
+
+        # The tracker publishes from its own thread: drain its queue without blocking the loop.
+        idle_since = time.monotonic()
+        while not file_ids or finished != file_ids:
+            try:
+                entry = events.get_nowait()
+            except queue.Empty:
+                if time.monotonic() - idle_since > 15:
+                    await response.write(b": keep-alive\n\n")
+                    idle_since = time.monotonic()
+                await asyncio.sleep(0.25)
+                continue
+            idle_since = time.monotonic()
+            if not wanted(entry):
+                continue
+            await response.write(_sse("status", entry))
+            if entry["status"] in UploadStatusTracker.TERMINAL_STATUSES:
+                finished.add(entry["file_id"])
+        await response.write(_sse("done", {"file_ids": sorted(finished)}))
+    finally:
+        upload_tracker.unsubscribe(events)
+    return response
+
+
+@routes.get("/metrics")
+async def metrics(request):
+    return web.Response(text=telemetry.render(), content_type="text/plain")
+
+
+@routes.get("/api/agent/pool")
+async def agent_pool_stats(request):
+    return _json(agent_pool.stats())
+
+
+@routes.get("/api/metadata/cache")
+async def metadata_cache_stats(request):
+    return _json(letta_pool.metadata_cache.stats())
+
+
+@routes.get("/api/llm/rate-limit")
+async def rate_limit_stats(request):
+    return _json(await asyncio.to_thread(rate_limiter.stats))
+
+
+@routes.get("/api/summary/cache")
+async def summary_cache_stats(request):
+    return _json(await asyncio.to_thread(summary_cache.stats))
+
+
+async def _search_folder(params) -> tuple:
+    """Folder of a search request, given by folder_id or agent_id: (folder_id, error response)."""
+    folder_id = params.get("folder_id")
+    agent_id = params.get("agent_id")
+    if folder_id:
+        return folder_id, None
+    if not agent_id:
+        return None, _error("Missing agent_id or folder_id", 400)
+    record = await asyncio.to_thread(agent_registry.get, agent_id)
+    if record is None:
+        return None, _error("Unknown agent_id", 404)
+    return record["folder_id"], None
+
+
+@routes.get("/api/search")
+async def search(request):
+    folder_id, error = await _search_folder(request.query)
+    if error:
+        return error
+    query = (request.query.get("q") or "").strip()
+    if not query:
+        return _error("Missing q", 400)
+    try:
+        limit = int(request.query.get("limit") or 10)
+    except ValueError:
+        return _error("limit must be an integer", 400)
+    if not 1 <= limit <= 100:
+        return _error("limit must be between 1 and 100", 400)
+    with telemetry.span("search.query"):
+        return _json(await asyncio.to_thread(search_index.search, folder_id, query, limit=limit))
+
+
+@routes.delete("/api/search/document")
+async def delete_search_document(request):
+    folder_id, error = await _search_folder(request.query)
+    if error:
+        return error
+    filename = request.query.get("filename")
+    if not filename:
+        return _error("Missing filename", 400)
+    if not await asyncio.to_thread(search_index.delete_document, folder_id, filename):
+        return _error("Document not indexed", 404)
+    return _json({"folder_id": folder_id, "filename": filename, "deleted": True})
+
+
+@routes.post("/api/search/reindex")
+async def reindex_search(request):
+    try:
+        data = await request.json()
+    except ValueError:
+        data = None
+    folder_id, error = await _search_folder(data or request.query)
+    if error:
+        return error
+    started = time.time()
+    try:
+        # Waits for the uploads already queued for indexing, then rebuilds from Letta.
+        result = await asyncio.wrap_future(search_executor.submit(
+            lambda: search_index.reindex_folder(folder_id, folder_documents(letta_pool.client(LETTA_BASE), folder_id))
+        ))
+    except Exception as e:
+        return _error(f"Reindex failed: {e}", 500)
+    return _json({"folder_id": folder_id, **result, "elapsed_s": round(time.time() - started, 3)})
+
+
+@routes.get("/api/search/stats")
+async def search_stats(request):
+    return _json(await asyncio.to_thread(search_index.stats, request.query.get("folder_id")))
+
+
+async def _chat_request(request) -> tuple:
+    """Parse a chat request body: (data, assistant, error response)."""
+    try:
+        data = await request.json()
+    except ValueError:
+        data = None
+    if not data or "message" not in data or "agent_id" not in data:
+        return None, None, _error("Missing 'message' or 'agent_id'", 400)
+    assistant = await get_assistant(data["agent_id"])
+    if assistant is None:
+        return None, None, _error("Unknown agent_id", 404)
+    return data, assistant, None
+
+
+@routes.post("/api/chat")
+async def chat_with_agent(request):
+    data, assistant, error = await _chat_request(request)
+    if error is not None:
+        return error
+    try:
+        chat_data = await assistant.chat(data["message"].strip(), only_new=bool(data.get("only_new", False)))
+        return _json(chat_data)
+    except Exception as e:
+        return _error(str(e), 500)
+
+
+@routes.get("/api/chat/history")
+async def chat_history(request):
+    agent_id = request.query.get("agent_id")
+    if not agent_id:
+        return _error("Missing agent_id", 400)
+    assistant = await get_assistant(agent_id)
+    if assistant is None:
+        return _error("Unknown agent_id", 404)
+    try:
+        limit = min(max(int(request.query.get("limit", 50)), 1), 500)
+    except ValueError:
+        return _error("limit must be an integer", 400)
+    try:
+        return _json(await assistant.get_history(before=request.query.get("before"), limit=limit))
+    except Exception as e:
+        return _error(str(e), 500)
+
+
+@routes.post("/api/chat/stream")
+async def chat_with_agent_stream(request):
+    data, assistant, error = await _chat_request(request)
+    if error is not None:
+        return error
+    response = await _event_stream(request)
+    stream_tokens = bool(data.get("stream_tokens", True))
+    async for event, payload in assistant.stream_chat(data["message"].strip(), stream_tokens=stream_tokens):
+        await response.write(_sse(event, payload))
+    return response
+
+
+@web.middleware
+async def cors_preflight(request, handler):
+    """Answer CORS preflight requests, like flask_cors' defaults on the Flask app."""
+    if request.method != "OPTIONS":
+        return await handler(request)
+    return web.Response(headers={
+        "Access-Control-Allow-Methods": "GET, POST, OPTIONS",
+        "Access-Control-Allow-Headers": request.headers.get("Access-Control-Request-Headers", "*"),
+    })
+
+
+async def _add_cors_headers(request, response):
+    # Set before the headers are sent, so streamed (SSE) responses get it too.
+    response.headers["Access-Control-Allow-Origin"] = "*"
+
+
+async def _close_letta_clients(app):
+    await letta_pool.aclose()
+
+
+def create_app() -> web.Application:
+    app = web.Application(middlewares=[cors_preflight])
+    app.add_routes(routes)
+    app.on_response_prepare.append(_add_cors_headers)
+    app.on_cleanup.append(_close_letta_clients)
+    return app
+
+
+web_app = create_app()
+
+if __name__ == "__main__":
+    web.run_app(web_app, host="0.0.0.0", port=5000)
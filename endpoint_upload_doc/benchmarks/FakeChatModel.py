@@ -0,0 +1,85 @@
+import asyncio
+import hashlib
+import random
+import time
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+
+class InjectedLLMError(RuntimeError):
+    """Failure injected by :class:`FakeChatModel`, looking like a provider rate limit (HTTP 429)."""
+
+    status_code = 429
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Deterministic LangChain chat model standing in for ``init_chat_model`` in benchmarks.
+
+    The reply to a prompt is a fixed number of words derived from a hash of the prompt,
+    so runs are repeatable and the summary cache behaves as it would with a real model.
+    Calls wait ``latency`` seconds (plus up to ``jitter``, plus ``latency_per_1k_tokens``
+    for every thousand prompt tokens) and fail with probability ``error_rate``. Token
+    usage is reported in ``usage_metadata`` like the OpenAI models.
+
+    Example:
+        >>> summarizer.llm = FakeChatModel(latency=0.4, error_rate=0.02)
+    """
+
+    latency: float = 0.0
+    jitter: float = 0.0
+    latency_per_1k_tokens: float = 0.0
+    error_rate: float = 0.0
+    output_words: int = 60
+    seed: int = 0
+    calls: int = 0
+    errors: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-benchmark"
+
+    def _prompt(self, messages) -> str:
+        return "\n".join(str(m.content) for m in messages)
+
+    def _delay(self, prompt: str, rng: random.Random) -> float:
+        input_tokens = len(prompt) // 4
+        return self.latency + rng.uniform(0, self.jitter) + self.latency_per_1k_tokens * input_tokens / 1000
+
+    def _result(self, prompt: str, rng: random.Random) -> ChatResult:
+        self.calls += 1
+        if self.error_rate and rng.random() < self.error_rate:
+            self.errors += 1
+            raise InjectedLLMError("Injected LLM error")
+        digest = hashlib.sha256(f"{self.seed}:{prompt}".encode("utf-8")).hexdigest()
+        words = [digest[(i * 7) % 60:(i * 7) % 60 + 5] for i in range(self.output_words)]
+        content = " ".join(words)
+        input_tokens = len(prompt) // 4
+        output_tokens = len(content) // 4
+        message = AIMessage(
+            content=content,
+            usage_metadata={
+                "input_tokens": input_tokens,
+                "output_tokens": output_tokens,
+                "total_tokens": input_tokens + output_tokens,
+            },
+        )
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _rng(self) -> random.Random:
+        # Seeded per call count, so latency and failures repeat across runs of one scenario.
+        return random.Random(f"{self.seed}:{self.calls}")
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        prompt = self._prompt(messages)
+        rng = self._rng()
+        time.sleep(self._delay(prompt, rng))
+        return self._result(prompt, rng)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        prompt = self._prompt(messages)
+        rng = self._rng()
+        await asyncio.sleep(self._delay(prompt, rng))
+        return self._result(prompt, rng)
@@ -0,0 +1,508 @@
+import asyncio
+import json
+import logging
+import random
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+from aiohttp import web
+
+log = logging.getLogger(__name__)
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _new_id(prefix: str) -> str:
+    return f"{prefix}-{uuid.uuid4()}"
+
+
+class FakeLettaServer:
+    """
+    Local stand-in for the Letta REST endpoints used by ``AssistantWithFilesys``.
+
+    Serves agents (list/create/retrieve/modify/delete, folder attach), folders (list/
+    create/retrieve/modify/delete), folder files (upload, list, delete), LLM and embedding models and agent
+    messages (create, list, SSE stream) from memory, with responses shaped like the
+    Letta API so the real ``letta_client`` parses them. Uploaded files report
+    ``pending`` and turn ``completed`` after ``processing_time`` seconds; their text is
+    kept and listed with ``include_content=true``.
+
+    Every request waits ``latency`` seconds (plus up to ``jitter``, or the value of
+    ``route_latency`` for its route) and then fails with a 500 with probability
+    ``error_rate``. Replies are deterministic for a given seed and message.
+
+    Args:
+        latency (float): Base delay of every request, in seconds.
+        jitter (float): Extra random delay of up to this many seconds.
+        error_rate (float): Probability (0-1) that a request fails with a 500.
+        route_latency (dict, optional): Base delay per route name ("agents", "folders",
+            "files", "upload", "models", "messages", "stream"), overriding ``latency``.
+        processing_time (float): Seconds until an uploaded file is reported as completed.
+        reply_words (int): Words in each assistant reply.
+        token_delay (float): Delay between the tokens of a streamed reply, in seconds.
+        seed (int): Seed of the latency, error and reply generators.
+        echo_user_message (bool): Return the stored user message in the response of a message
+            create, before the reply.
+
+    Example:
+        >>> server = FakeLettaServer(latency=0.02, error_rate=0.01)
+        >>> base_url = server.start()
+        >>> client = Letta(base_url=base_url)
+        >>> server.stop()
+    """
+
+    WORDS = (
+        "the agent reviewed your documents and found relevant evidence in the summary "
+        "of the uploaded paper which cites several sources on this research question"
+    ).split()
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        route_latency: dict = None,
+        processing_time: float = 0.5,
+        reply_words: int = 40,
+        token_delay: float = 0.0,
+        seed: int = 0,
+        echo_user_message: bool = False
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.route_latency = route_latency or {}
+        self.processing_time = processing_time
+        self.reply_words = reply_words
+        self.token_delay = token_delay
+        self.seed = seed
+        self.echo_user_message = echo_user_message
+        self._random = random.Random(seed)
+        self.agents = {}
+        self.folders = {}
+        self.files = {}
+        self.contents = {}
+        self.messages = {}
+        self.requests = 0
+        self.errors = 0
+        self._loop = None
+        self._thread = None
+        self._runner = None
+        self.base_url = None
+
+    # ------------------------------------------------------------ app
+
+    def build_app(self) -> web.Application:
+        app = web.Application(middlewares=[self._inject], client_max_size=1024 ** 3)
+        route = app.router.add_route
+        route("GET", "/v1/agents/", self._list_agents, name="agents")
+        route("POST", "/v1/agents/", self._create_agent, name="agents.create")
+        route("GET", "/v1/agents/{agent_id}", self._get_agent, name="agents.retrieve")
+        route("PATCH", "/v1/agents/{agent_id}", self._modify_agent, name="agents.modify")
+        route("DELETE", "/v1/agents/{agent_id}", self._delete_agent, name="agents.delete")
+        route("PATCH", "/v1/agents/{agent_id}/folders/attach/{folder_id}", self._attach_folder, name="agents.attach")
+        route("GET", "/v1/agents/{agent_id}/messages", self._list_messages, name="messages.list")
+        route("POST", "/v1/agents/{agent_id}/messages", self._create_message, name="messages.create")
+        route("POST", "/v1/agents/{agent_id}/messages/stream", self._stream_message, name="stream")
+        route("GET", "/v1/folders/", self._list_folders, name="folders")
+        route("POST", "/v1/folders/", self._create_folder, name="folders.create")
+        route("GET", "/v1/folders/{folder_id}", self._get_folder, name="folders.retrieve")
+        route("PATCH", "/v1/folders/{folder_id}", self._modify_folder, name="folders.modify")
+        route("DELETE", "/v1/folders/{folder_id}", self._delete_folder, name="folders.delete")
+        route("POST", "/v1/folders/{folder_id}/upload", self._upload_file, name="upload")
+        route("GET", "/v1/folders/{folder_id}/files", self._list_files, name="files")
+        route("DELETE", "/v1/folders/{folder_id}/{file_id}", self._delete_file, name="files.delete")
+        route("GET", "/v1/models/", self._list_models, name="models.llm")
+        route("GET", "/v1/models/embedding", self._list_embeddings, name="models")
+        return app
+
+    @web.middleware
+    async def _inject(self, request, handler):
+        """Delay every request and fail some of them, as configured."""
+        self.requests += 1
+        name = request.match_info.route.name or ""
+        delay = self.route_latency.get(name.split(".")[0], self.latency)
+        if self.jitter:
+            delay += self._random.uniform(0, self.jitter)
+        if delay:
+            await asyncio.sleep(delay)
+        if self.error_rate and self._random.random() < self.error_rate:
+            self.errors += 1
+            return web.json_response({"detail": "Injected error"}, status=500)
+        return await handler(request)
+
+    @staticmethod
+    def _not_found(kind: str, item_id: str):
+        return web.json_response({"detail": f"{kind} {item_id} not found"}, status=404)
+
+    @staticmethod
+    def _page(items: list, params) -> list:
+        """
+        Apply the after/before/limit/order query parameters to items in creation order:
+        the first ``limit`` items after the ``after`` cursor, otherwise the last ``limit``
+        items (before the ``before`` cursor, if given).
+        """
+        ids = [item["id"] for item in items]
+        limit = int(params.get("limit") or 0) or len(items)
+        if params.get("after") in ids:
+            items = items[ids.index(params["after"]) + 1:][:limit]
+        else:
+            if params.get("before") in ids:
+                items = items[:ids.index(params["before"])]
+            items = items[-limit:] if limit < len(items) else items
+        return items[::-1] if params.get("order") == "desc" else items
+
+    # ------------------------------------------------------------ agents
+
+    async def _list_agents(self, request):
+        name = request.query.get("name")
+        agents = [a for a in self.agents.values() if not name or a["name"] == name]
+        return web.json_response(self._page(agents, request.query))
+
+    async def _create_agent(self, request):
+        body = await request.json()
+        agent = {
+            "id": _new_id("agent"),
+            "name": body.get("name") or _new_id("agent"),
+            "agent_type": "memgpt_v2_agent",
+            "model": body.get("model"),
+            "embedding": body.get("embedding"),
+            "memory": {"blocks": body.get("memory_blocks") or []},
+            "tools": [{"name": tool} for tool in body.get("tools") or []],
+            "sources": [],
+            "tags": body.get("tags") or [],
+            "created_at": _now(),
+        }
+        self.agents[agent["id"]] = agent
+        self.messages[agent["id"]] = []
+        return web.json_response(agent)
+
+    async def _get_agent(self, request):
+        agent = self.agents.get(request.match_info["agent_id"])
+        if agent is None:
+            return self._not_found("Agent", request.match_info["agent_id"])
+        return web.json_response(agent)
+
+    async def _modify_agent(self, request):
+        agent = self.agents.get(request.match_info["agent_id"])
+        if agent is None:
+            return self._not_found("Agent", request.match_info["agent_id"])
+        body = await request.json()
+        agent.update({k: v for k, v in body.items() if k in ("name", "tags", "description", "model")})
+        return web.json_response(agent)
+
+    async def _delete_agent(self, request):
+        agent_id = request.match_info["agent_id"]
+        if self.agents.pop(agent_id, None) is None:
+            return self._not_found("Agent", agent_id)
+        self.messages.pop(agent_id, None)
+        return web.json_response({})
+
+    async def _attach_folder(self, request):
+        agent = self.agents.get(request.match_info["agent_id"])
+        folder = self.folders.get(request.match_info["folder_id"])
+        if agent is None or folder is None:
+            return self._not_found("Agent or folder", request.match_info["agent_id"])
+        if folder["id"] not in [s["id"] for s in agent["sources"]]:
+            agent["sources"].append({"id": folder["id"], "name": folder["name"]})
+        return web.json_response(agent)
+
+    # ------------------------------------------------------------ folders
+
+    async def _list_folders(self, request):
+        name = request.query.get("name")
+        folders = [f for f in self.folders.values() if not name or f["name"] == name]
+        return web.json_response(folders)
+
+    async def _create_folder(self, request):
+        body = await request.json()
+        folder = {
+            "id": _new_id("source"),
+            "name": body.get("name") or _new_id("folder"),
+            "embedding_config": body.get("embedding_config"),
+            "created_at": _now(),
+        }
+        self.folders[folder["id"]] = folder
+        self.files[folder["id"]] = {}
+        return web.json_response(folder)
+
+    async def _get_folder(self, request):
+        folder = self.folders.get(request.match_info["folder_id"])
+        if folder is None:
+            return self._not_found("Folder", request.match_info["folder_id"])
+        return web.json_response(folder)
+
+    async def _modify_folder(self, request):
+        folder = self.folders.get(request.match_info["folder_id"])
+        if folder is None:
+            return self._not_found("Folder", request.match_info["folder_id"])
+        body = await request.json()
+        folder.update({k: v for k, v in body.items() if k in ("name", "description", "instructions")})
+        return web.json_response(folder)
+
+    async def _delete_folder(self, request):
+        folder_id = request.match_info["folder_id"]
+        if self.folders.pop(folder_id, None) is None:
+            return self._not_found("Folder", folder_id)
+        for file_id in self.files.pop(folder_id, {}):
+            self.contents.pop(file_id, None)
+        return web.json_response({})
+
+    # ------------------------------------------------------------ files
+
+    def _file_view(self, f: dict) -> dict:
+        """The file with its processing status as of now."""
+        done = time.time() - f["uploaded_at"] >= self.processing_time
+        view = {k: v for k, v in f.items() if k != "uploaded_at"}
+        view["processing_status"] = "completed" if done else "pending"
+        view["chunks_embedded"] = f["total_chunks"] if done else 0
+        return view
+
+    async def _upload_file(self, request):
+        folder_id = request.match_info["folder_id"]
+        files = self.files.get(folder_id)
+        if files is None:
+            return self._not_found("Folder", folder_id)
+        reader = await request.multipart()
+        content = bytearray()
+        filename = None
+        async for part in reader:
+            if part.name == "file":
+                filename = part.filename
+                while chunk := await part.read_chunk():
+                    content += chunk
+        size = len(content)
+        name = request.query.get("name") or filename
+        existing = [f for f in files.values() if f["original_file_name"] == name]
+        if existing:
+            handling = request.query.get("duplicate_handling") or "suffix"
+            if handling == "error":
+                return web.json_response({"detail": f"File {name} already exists"}, status=409)
+            if handling == "skip":
+                return web.json_response(self._file_view(existing[0]))
+            if handling == "replace":
+                for f in existing:
+                    files.pop(f["id"], None)
+                    self.contents.pop(f["id"], None)
+        f = {
+            "id": _new_id("file"),
+            "source_id": folder_id,
+            "file_name": name,
+            "original_file_name": name,
+            "file_type": "text/markdown",
+            "file_size": size,
+            "total_chunks": max(1, size // 2000),
+            "error_message": None,
+            "created_at": _now(),
+            "uploaded_at": time.time(),
+        }
+        files[f["id"]] = f
+        self.contents[f["id"]] = content.decode("utf-8", errors="replace")
+        return web.json_response(self._file_view(f))
+
+    async def _list_files(self, request):
+        folder_id = request.match_info["folder_id"]
+        files = self.files.get(folder_id)
+        if files is None:
+            return self._not_found("Folder", folder_id)
+        query = dict(request.query)
+        page = list(files.values())
+        if query.get("order") == "desc":
+            page = page[::-1]
+            query.pop("order")
+        ids = [f["id"] for f in page]
+        if query.get("after") in ids:
+            page = page[ids.index(query["after"]) + 1:]
+        page = page[:int(query.get("limit") or 1000)]
+        views = [self._file_view(f) for f in page]
+        if query.get("include_content") == "true":
+            for view in views:
+                view["content"] = self.contents.get(view["id"])
+        return web.json_response(views)
+
+    async def _delete_file(self, request):
+        folder_id = request.match_info["folder_id"]
+        if self.files.get(folder_id, {}).pop(request.match_info["file_id"], None) is None:
+            return self._not_found("File", request.match_info["file_id"])
+        self.contents.pop(request.match_info["file_id"], None)
+        return web.json_response({})
+
+    async def _list_models(self, request):
+        return web.json_response([
+            {
+                "model": model,
+                "model_endpoint_type": "openai",
+                "context_window": 128000,
+                "handle": f"openai/{model}",
+            }
+            for model in ("gpt-4o-mini", "gpt-4o", "gpt-4.1")
+        ])
+
+    async def _list_embeddings(self, request):
+        return web.json_response([
+            {
+                "embedding_endpoint_type": "openai",
+                "embedding_model": model,
+                "embedding_dim": dim,
+                "embedding_chunk_size": 300,
+                "handle": f"openai/{model}",
+            }
+            for model, dim in (("text-embedding-3-small", 1536), ("text-embedding-ada-002", 1536), ("text-embedding-3-large", 3072))
+        ])
+
+    # ------------------------------------------------------------ messages
+
+    def _message(self, message_type: str, content: str) -> dict:
+        return {
+            "id": _new_id("message"),
+            "message_type": message_type,
+            "date": _now(),
+            "content": content,
+        }
+
+    def _reply(self, text: str) -> str:
+        """A deterministic reply to ``text``."""
+        rng = random.Random(f"{self.seed}:{text}")
+        return " ".join(rng.choice(self.WORDS) for _ in range(self.reply_words))
+
+    @staticmethod
+    def _user_text(body: dict) -> str:
+        messages = body.get("messages") or [{}]
+        content = messages[-1].get("content", "")
+        if isinstance(content, list):
+            return "".join(part.get("text", "") for part in content)
+        return content
+
+    def _usage(self, user_text: str, reply: str) -> dict:
+        prompt_tokens = len(user_text.split()) + 500
+        completion_tokens = len(reply.split())
+        return {
+            "message_type": "usage_statistics",
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "step_count": 1,
+        }
+
+    async def _create_message(self, request):
+        agent_id = request.match_info["agent_id"]
+        if agent_id not in self.agents:
+            return self._not_found("Agent", agent_id)
+        user_text = self._user_text(await request.json())
+        reply = self._reply(user_text)
+        user_message = self._message("user_message", user_text)
+        assistant_message = self._message("assistant_message", reply)
+        self.messages[agent_id].extend([user_message, assistant_message])
+        return web.json_response({
+            "messages": [user_message, assistant_message] if self.echo_user_message else [assistant_message],
+            "stop_reason": {"message_type": "stop_reason", "stop_reason": "end_turn"},
+            "usage": self._usage(user_text, reply),
+        })
+
+    async def _list_messages(self, request):
+        agent_id = request.match_info["agent_id"]
+        if agent_id not in self.agents:
+            return self._not_found("Agent", agent_id)
+        return web.json_response(self._page(self.messages[agent_id], request.query))
+
+    async def _stream_message(self, request):
+        agent_id = request.match_info["agent_id"]
+        if agent_id not in self.agents:
+            return self._not_found("Agent", agent_id)
+        body = await request.json()
+        user_text = self._user_text(body)
+        reply = self._reply(user_text)
+        self.messages[agent_id].append(self._message("user_message", user_text))
+        assistant_message = self._message("assistant_message", reply)
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+        await response.prepare(request)
+        if body.get("stream_tokens"):
+            pieces = [word + " " for word in reply.split()]
+        else:
+            pieces = [reply]
+        for piece in pieces:
+            if self.token_delay:
+                await asyncio.sleep(self.token_delay)
+            chunk = dict(assistant_message, content=piece)
+            await response.write(f"data: {json.dumps(chunk)}\n\n".encode())
+        for event in (
+            {"message_type": "stop_reason", "stop_reason": "end_turn"},
+            self._usage(user_text, reply),
+        ):
+            await response.write(f"data: {json.dumps(event)}\n\n".encode())
+        await response.write(b"data: [DONE]\n\n")
+        self.messages[agent_id].append(assistant_message)
+        await response.write_eof()
+        return response
+
+    # ------------------------------------------------------------ lifecycle
+
+    def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """
+        Serve on a background thread with its own event loop.
+
+        Args:
+            host (str): Interface to bind.
+            port (int): Port to bind; 0 picks a free one.
+
+        Returns:
+            str: Base URL of the server, e.g. "http://127.0.0.1:40123/".
+        """
+        started = threading.Event()
+
+        def serve():
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+            self._runner = web.AppRunner(self.build_app(), access_log=None)
+            self._loop.run_until_complete(self._runner.setup())
+            site = web.TCPSite(self._runner, host, port)
+            self._loop.run_until_complete(site.start())
+            bound_port = site._server.sockets[0].getsockname()[1]
+            self.base_url = f"http://{host}:{bound_port}/"
+            started.set()
+            self._loop.run_forever()
+            self._loop.run_until_complete(self._runner.cleanup())
+            self._loop.close()
+
+        self._thread = threading.Thread(target=serve, name="fake-letta", daemon=True)
+        self._thread.start()
+        started.wait()
+        log.info(f"[FakeLetta] Serving on {self.base_url}")
+        return self.base_url
+
+    def stop(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(timeout=10)
+            self._loop = None
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Serve a fake Letta REST API for benchmarks.")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8283)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--processing-time", type=float, default=0.5)
+    parser.add_argument("--token-delay", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    server = FakeLettaServer(
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        processing_time=args.processing_time,
+        token_delay=args.token_delay,
+        seed=args.seed,
+    )
+    web.run_app(server.build_app(), host=args.host, port=args.port)
@@ -0,0 +1,96 @@
+"""
+Compare two benchmark result files written by ``benchmarks.run``.
+
+    python -m benchmarks.compare baseline.json candidate.json [--threshold 0.1] [--json]
+
+Prints the change of each metric per scenario case, and exits with status 1 when a
+latency percentile grew, or the throughput dropped, by more than ``--threshold``.
+"""
+import argparse
+import json
+import sys
+
+# Metric -> True when higher is better.
+METRICS = {
+    "rps": True,
+    "p50_ms": False,
+    "p95_ms": False,
+    "p99_ms": False,
+    "ttft_p50_ms": False,
+    "ttft_p95_ms": False,
+    "error_rate": False,
+}
+
+
+def compare(baseline: dict, candidate: dict, threshold: float = 0.1) -> list:
+    """
+    Per scenario case and metric: baseline value, candidate value, relative change and
+    whether it is a regression beyond ``threshold``.
+
+    Returns:
+        list[dict]: {"scenario", "case", "metric", "baseline", "candidate", "change", "regression"}
+    """
+    rows = []
+    for scenario, cases in candidate.get("scenarios", {}).items():
+        for case, stats in cases.items():
+            base = baseline.get("scenarios", {}).get(scenario, {}).get(case)
+            if base is None:
+                continue
+            for metric, higher_is_better in METRICS.items():
+                old, new = base.get(metric), stats.get(metric)
+                if old is None or new is None:
+                    continue
+                change = (new - old) / old if old else (0.0 if new == old else None)
+                if metric == "error_rate":
+                    regression = new > old
+                elif change is None:
+                    regression = False
+                else:
+                    regression = -change > threshold if higher_is_better else change > threshold
+                rows.append({
+                    "scenario": scenario,
+                    "case": case,
+                    "metric": metric,
+                    "baseline": old,
+                    "candidate": new,
+                    "change": round(change, 4) if change is not None else None,
+                    "regression": regression,
+                })
+    return rows
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files.")
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=0.1, help="Relative change counted as a regression.")
+    parser.add_argument("--json", action="store_true", help="Print the comparison as JSON.")
+    args = parser.parse_args(argv)
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+    rows = compare(baseline, candidate, args.threshold)
+
+    if args.json:
+        print(json.dumps({
+            "baseline_commit": baseline.get("commit"),
+            "candidate_commit": candidate.get("commit"),
+            "rows": rows,
+        }, indent=2))
+    else:
+        print(f"baseline {(baseline.get('commit') or '?')[:12]}  ->  candidate {(candidate.get('commit') or '?')[:12]}")
+        print(f"{'scenario':<14} {'case':<12} {'metric':<12} {'baseline':>12} {'candidate':>12} {'change':>9}")
+        for row in rows:
+            change = f"{row['change'] * 100:+.1f}%" if row["change"] is not None else "n/a"
+            flag = "  REGRESSION" if row["regression"] else ""
+            print(
+                f"{row['scenario']:<14} {row['case']:<12} {row['metric']:<12} "
+                f"{row['baseline']:>12} {row['candidate']:>12} {change:>9}{flag}"
+            )
+    return 1 if any(row["regression"] for row in rows) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
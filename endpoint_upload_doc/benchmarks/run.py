@@ -0,0 +1,514 @@
+"""
+Benchmark scenarios for the upload and chat services, against a fake Letta server and LLM.
+
+Run from ``endpoint_upload_doc``:
+
+    python -m benchmarks.run --scenario upload-sweep chat-load agent-storm search-load --output results.json
+    python -m benchmarks.compare baseline.json results.json
+
+Each scenario reports, per case, the request count, errors, requests per second and
+p50/p95/p99/mean/max latencies as JSON, together with the git commit and parameters of
+the run, so results of two commits can be compared.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import httpx
+
+from .FakeChatModel import FakeChatModel
+from .FakeLettaServer import FakeLettaServer
+
+log = logging.getLogger(__name__)
+
+SCENARIOS = ("upload-sweep", "chat-load", "agent-storm", "search-load")
+
+VOCABULARY = (
+    "model data results method analysis study sample effect research paper evidence "
+    "measure baseline training error variance signal network layer protein gene cell "
+    "market price policy growth climate energy carbon theory proof lemma bound graph"
+).split()
+
+
+def percentile(sorted_values: list, q: float) -> float:
+    """Linearly interpolated ``q``-th percentile (0-100) of an ascending list."""
+    if not sorted_values:
+        return None
+    position = (len(sorted_values) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def summarize(samples: list, wall_s: float) -> dict:
+    """
+    Latency and throughput statistics of one case.
+
+    Args:
+        samples (list[dict]): One {"ok", "latency_s", ...} dict per request.
+        wall_s (float): Wall-clock duration of the case.
+
+    Returns:
+        dict: count, errors, error_rate, rps and p50/p95/p99/mean/max latencies in ms
+        (plus the same for time to first token, when the samples have ``ttft_s``).
+    """
+    latencies = sorted(s["latency_s"] * 1000 for s in samples)
+    errors = sum(1 for s in samples if not s["ok"])
+    stats = {
+        "count": len(samples),
+        "errors": errors,
+        "error_rate": round(errors / len(samples), 4) if samples else 0,
+        "wall_s": round(wall_s, 3),
+        "rps": round(len(samples) / wall_s, 3) if wall_s else None,
+    }
+    stats.update(_latency_stats(latencies, ""))
+    ttft = sorted(s["ttft_s"] * 1000 for s in samples if s.get("ttft_s") is not None)
+    if ttft:
+        stats.update(_latency_stats(ttft, "ttft_"))
+    return stats
+
+
+def _latency_stats(latencies: list, prefix: str) -> dict:
+    if not latencies:
+        return {}
+    return {
+        f"{prefix}p50_ms": round(percentile(latencies, 50), 2),
+        f"{prefix}p95_ms": round(percentile(latencies, 95), 2),
+        f"{prefix}p99_ms": round(percentile(latencies, 99), 2),
+        f"{prefix}mean_ms": round(sum(latencies) / len(latencies), 2),
+        f"{prefix}max_ms": round(latencies[-1], 2),
+    }
+
+
+def drive(calls: list, concurrency: int) -> dict:
+    """
+    Run ``calls`` (callables returning a sample dict without the latency) with
+    ``concurrency`` threads and summarize them.
+    """
+    def timed(call):
+        started = time.perf_counter()
+        try:
+            sample = call(started)
+        except Exception as e:
+            sample = {"ok": False, "error": str(e)}
+        sample["latency_s"] = time.perf_counter() - started
+        return sample
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        samples = list(executor.map(timed, calls))
+    stats = summarize(samples, time.perf_counter() - started)
+    first_error = next((s.get("error") for s in samples if not s["ok"] and s.get("error")), None)
+    if first_error:
+        stats["first_error"] = first_error[:200]
+    return stats
+
+
+def document(size_bytes: int, seed: str) -> bytes:
+    """A plain-text document of about ``size_bytes`` bytes, unique for each seed."""
+    rng = random.Random(seed)
+    lines = []
+    total = 0
+    while total < size_bytes:
+        line = " ".join(rng.choice(VOCABULARY) for _ in range(12)) + ".\n"
+        lines.append(line)
+        total += len(line)
+    return "".join(lines).encode("utf-8")
+
+
+def parse_size(size: str) -> int:
+    size = size.strip().lower()
+    for suffix, factor in (("mb", 2**20), ("kb", 2**10), ("b", 1)):
+        if size.endswith(suffix):
+            return int(float(size[:-len(suffix)]) * factor)
+    return int(size)
+
+
+# ---------------------------------------------------------------- scenarios
+
+def create_agent(client: httpx.Client, name: str) -> str:
+    response = client.post("/api/agent/create", json={"agent_name": name, "personality": "helpful"})
+    response.raise_for_status()
+    return response.json()["agent_id"]
+
+
+def upload_sweep(client: httpx.Client, args, run_id: str) -> dict:
+    """
+    ``--requests`` uploads of fresh documents at each of ``--sizes``, plain and/or streamed
+    (``<size>_stream``, whose ttft is the time to the first chunk summary).
+    """
+    agent_id = create_agent(client, f"bench_{run_id}_upload")
+    form = {"agent_id": agent_id, "include_markdown": "false"}
+    if args.summary_mode:
+        form["summary_mode"] = args.summary_mode
+
+    def upload(size, size_bytes, index):
+        def call(started):
+            content = document(size_bytes, f"{run_id}:{size}:{index}")
+            response = client.post(
+                "/api/upload",
+                data=form,
+                files={"file": (f"doc_{size}_{index}.txt", content, "text/plain")},
+            )
+            return {"ok": response.status_code == 200, "error": None if response.status_code == 200 else response.text}
+        return call
+
+    def stream(size, size_bytes, index):
+        def call(started):
+            sample = {"ok": False, "ttft_s": None, "error": None}
+            content = document(size_bytes, f"{run_id}:{size}:stream:{index}")
+            with client.stream(
+                "POST",
+                "/api/upload/stream",
+                data={**form, "format": "ndjson"},
+                files={"file": (f"doc_{size}_stream_{index}.txt", content, "text/plain")},
+            ) as response:
+                if response.status_code != 200:
+                    response.read()
+                    return {**sample, "error": response.text}
+                for line in response.iter_lines():
+                    if not line.strip():
+                        continue
+                    message = json.loads(line)
+                    if message["event"] == "chunk_summary" and sample["ttft_s"] is None:
+                        sample["ttft_s"] = time.perf_counter() - started
+                    elif message["event"] == "done":
+                        sample["ok"] = True
+                    elif message["event"] == "error":
+                        sample["error"] = message["data"].get("error")
+            return sample
+        return call
+
+    results = {}
+    for size in args.sizes:
+        size_bytes = parse_size(size)
+        if args.upload_mode in ("plain", "both"):
+            results[size] = drive([upload(size, size_bytes, i) for i in range(args.requests)], args.concurrency)
+            results[size]["bytes"] = size_bytes
+            log.info(f"[Bench] upload {size}: {results[size]}")
+        if args.upload_mode in ("stream", "both"):
+            case = f"{size}_stream"
+            results[case] = drive([stream(size, size_bytes, i) for i in range(args.requests)], args.concurrency)
+            results[case]["bytes"] = size_bytes
+            log.info(f"[Bench] upload {case}: {results[case]}")
+    return results
+
+
+def chat_load(client: httpx.Client, args, run_id: str) -> dict:
+    """``--requests`` chats with one agent, ``--concurrency`` at a time, plain and streamed."""
+    agent_id = create_agent(client, f"bench_{run_id}_chat")
+
+    def chat(index):
+        def call(started):
+            response = client.post("/api/chat", json={
+                "agent_id": agent_id,
+                "message": f"Question {index}: what do the documents say?",
+                "only_new": args.only_new,
+            })
+            reply = response.json().get("reply", "") if response.status_code == 200 else ""
+            ok = response.status_code == 200 and not reply.startswith("[Letta] Chat failed")
+            return {"ok": ok, "error": None if ok else (reply or response.text)}
+        return call
+
+    def stream(index):
+        def call(started):
+            sample = {"ok": False, "ttft_s": None, "error": None}
+            with client.stream("POST", "/api/chat/stream", json={
+                "agent_id": agent_id,
+                "message": f"Streamed question {index}: summarize the findings.",
+            }) as response:
+                for line in response.iter_lines():
+                    if line == "event: token" and sample["ttft_s"] is None:
+                        sample["ttft_s"] = time.perf_counter() - started
+                    elif line == "event: done":
+                        sample["ok"] = True
+                    elif line == "event: error":
+                        sample["error"] = "error event"
+                    elif line.startswith("data:") and sample["error"] == "error event":
+                        sample["error"] = line[5:].strip()
+            return sample
+        return call
+
+    results = {}
+    if args.chat_mode in ("plain", "both"):
+        results["chat"] = drive([chat(i) for i in range(args.requests)], args.concurrency)
+        log.info(f"[Bench] chat: {results['chat']}")
+    if args.chat_mode in ("stream", "both"):
+        results["chat_stream"] = drive([stream(i) for i in range(args.requests)], args.concurrency)
+        log.info(f"[Bench] chat stream: {results['chat_stream']}")
+    return results
+
+
+def wait_for_agent_pool(client: httpx.Client, timeout: float = 120):
+    """Wait until the agent pool has finished provisioning, so a storm starts from a full pool."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        stats = client.get("/api/agent/pool").json()
+        if all(p["provisioning"] == 0 for p in stats["personalities"].values()):
+            return stats
+        time.sleep(0.2)
+    return None
+
+
+def agent_storm(client: httpx.Client, args, run_id: str) -> dict:
+    """``--agents`` agent creations, ``--concurrency`` at a time, starting from a full agent pool."""
+    wait_for_agent_pool(client)
+    def create(index):
+        def call(started):
+            response = client.post("/api/agent/create", json={
+                "agent_name": f"bench_{run_id}_storm_{index}",
+                "personality": "helpful",
+            })
+            return {"ok": response.status_code == 200, "error": None if response.status_code == 200 else response.text}
+        return call
+
+    results = {"create": drive([create(i) for i in range(args.agents)], args.concurrency)}
+    log.info(f"[Bench] agent storm: {results['create']}")
+    return results
+
+
+def search_load(client: httpx.Client, args, run_id: str) -> dict:
+    """
+    ``--search-docs`` uploads, then ``--requests`` searches of their folder once indexed,
+    and one reindex of the folder from Letta.
+    """
+    agent_id = create_agent(client, f"bench_{run_id}_search")
+    form = {"agent_id": agent_id, "include_markdown": "false"}
+    if args.summary_mode:
+        form["summary_mode"] = args.summary_mode
+    size_bytes = parse_size(args.sizes[0])
+    folder_id = None
+    for index in range(args.search_docs):
+        response = client.post(
+            "/api/upload",
+            data=form,
+            files={"file": (f"doc_search_{index}.txt", document(size_bytes, f"{run_id}:search:{index}"), "text/plain")},
+        )
+        response.raise_for_status()
+        folder_id = response.json()["folder_id"]
+
+    # Uploads are indexed in the background: wait for the document and summary of each.
+    started = time.perf_counter()
+    deadline = time.monotonic() + 120
+    while client.get("/api/search/stats", params={"folder_id": folder_id}).json()["documents"] < 2 * args.search_docs:
+        if time.monotonic() > deadline:
+            raise RuntimeError("Uploads were not indexed within 120s")
+        time.sleep(0.05)
+    results = {"index_wait_s": round(time.perf_counter() - started, 3)}
+
+    rng = random.Random(args.seed)
+
+    def search(index):
+        query = " ".join(rng.sample(VOCABULARY, 2))
+
+        def call(started):
+            response = client.get("/api/search", params={"agent_id": agent_id, "q": query, "limit": 10})
+            ok = response.status_code == 200 and bool(response.json()["documents"])
+            return {"ok": ok, "error": None if ok else response.text}
+        return call
+
+    results["search"] = drive([search(i) for i in range(args.requests)], args.concurrency)
+    log.info(f"[Bench] search: {results['search']}")
+    response = client.post("/api/search/reindex", json={"agent_id": agent_id})
+    response.raise_for_status()
+    results["reindex"] = response.json()
+    log.info(f"[Bench] reindex: {results['reindex']}")
+    return results
+
+
+SCENARIO_FUNCTIONS = {
+    "upload-sweep": upload_sweep,
+    "chat-load": chat_load,
+    "agent-storm": agent_storm,
+    "search-load": search_load,
+}
+
+
+# ---------------------------------------------------------------- service
+
+def _serve_flask(flask_app) -> tuple:
+    from werkzeug.serving import make_server
+
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    server = make_server("127.0.0.1", 0, flask_app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, name="bench-flask", daemon=True)
+    thread.start()
+    return f"http://127.0.0.1:{server.server_port}", server.shutdown
+
+
+def _serve_aiohttp(web_app) -> tuple:
+    from aiohttp import web
+
+    loop = asyncio.new_event_loop()
+    runner = web.AppRunner(web_app, access_log=None)
+    loop.run_until_complete(runner.setup())
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    loop.run_until_complete(site.start())
+    port = site._server.sockets[0].getsockname()[1]
+    thread = threading.Thread(target=loop.run_forever, name="bench-aiohttp", daemon=True)
+    thread.start()
+
+    def stop():
+        asyncio.run_coroutine_threadsafe(runner.cleanup(), loop).result(timeout=30)
+        loop.call_soon_threadsafe(loop.stop)
+
+    return f"http://127.0.0.1:{port}", stop
+
+
+def start_service(args, letta_url: str, data_dir: str) -> tuple:
+    """
+    Import the service configured against the fake Letta server, with the fake LLM as
+    the summarizer model, and serve it on a free local port.
+
+    Returns:
+        tuple: (base URL, stop callable, fake LLM)
+    """
+    os.environ["LETTA_BASE_URL"] = letta_url
+    os.environ["DATA_DIR"] = data_dir
+    os.environ["AGENT_REGISTRY_URL"] = "memory"
+    os.environ["FILE_MANIFEST_URL"] = "memory"
+    os.environ["SUMMARY_CACHE_PATH"] = os.path.join(data_dir, "summary_cache.sqlite3")
+    os.environ["SEARCH_INDEX_PATH"] = os.path.join(data_dir, "search_index.sqlite3")
+    os.environ["AGENT_POOL_SIZE"] = str(args.agent_pool_size)
+    os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+    # Injected LLM errors are retried; keep the backoff short so runs stay quick.
+    os.environ.setdefault("LLM_BACKOFF_BASE", "0.05")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+    import app as flask_module
+
+    fake_llm = FakeChatModel(
+        latency=args.llm_latency,
+        jitter=args.llm_jitter,
+        latency_per_1k_tokens=args.llm_latency_per_1k_tokens,
+        error_rate=args.llm_error_rate,
+        seed=args.seed,
+    )
+    flask_module.llm = fake_llm
+    flask_module.summarizer.llm = fake_llm
+    # The pool is opt-in and lazy: fill it now so agent-storm starts from a full pool.
+    flask_module.start_agent_pool()
+
+    if args.app == "async":
+        import async_app
+
+        url, stop = _serve_aiohttp(async_app.web_app)
+    else:
+        url, stop = _serve_flask(flask_module.app)
+
+    def stop_service():
+        stop()
+        # Delete the pooled agents while the fake Letta server still runs.
+        flask_module.agent_pool.shutdown()
+
+    return url, stop_service, fake_llm
+
+
+def git_commit() -> dict:
+    """Commit of the working tree, and whether it has uncommitted changes."""
+    def git(*command):
+        return subprocess.run(
+            ["git", *command], capture_output=True, text=True, timeout=30,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+
+    try:
+        return {"commit": git("rev-parse", "HEAD") or None, "dirty": bool(git("status", "--porcelain", "--untracked-files=no"))}
+    except (OSError, subprocess.SubprocessError):
+        return {"commit": None, "dirty": None}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the research assistant against a fake Letta server and LLM.")
+    parser.add_argument("--scenario", nargs="+", choices=SCENARIOS + ("all",), default=["all"])
+    parser.add_argument("--app", choices=("flask", "async"), default="flask", help="Entry point to benchmark.")
+    parser.add_argument("--output", help="Write the JSON results here (default: stdout).")
+    parser.add_argument("--requests", type=int, default=50, help="Requests per case.")
+    parser.add_argument("--concurrency", type=int, default=8, help="Requests in flight.")
+    parser.add_argument("--sizes", nargs="+", default=["4kb", "64kb", "512kb"], help="Upload sizes of the sweep.")
+    parser.add_argument("--agents", type=int, default=50, help="Agents created by the storm.")
+    parser.add_argument("--search-docs", type=int, default=20, help="Documents (of the first --sizes) uploaded before searching.")
+    parser.add_argument("--agent-pool-size", type=int, default=2, help="Idle pooled agents per personality (AGENT_POOL_SIZE).")
+    parser.add_argument("--upload-mode", choices=("plain", "stream", "both"), default="plain")
+    parser.add_argument("--summary-mode", choices=("abstractive", "hybrid", "extractive"), help="summary_mode of the uploads.")
+    parser.add_argument("--chat-mode", choices=("plain", "stream", "both"), default="both")
+    parser.add_argument("--only-new", action="store_true", help="Chat with only_new (no history round trip).")
+    parser.add_argument("--letta-latency", type=float, default=0.02)
+    parser.add_argument("--letta-jitter", type=float, default=0.01)
+    parser.add_argument("--letta-error-rate", type=float, default=0.0)
+    parser.add_argument("--letta-processing-time", type=float, default=0.5)
+    parser.add_argument("--letta-token-delay", type=float, default=0.005)
+    parser.add_argument("--llm-latency", type=float, default=0.3)
+    parser.add_argument("--llm-jitter", type=float, default=0.1)
+    parser.add_argument("--llm-latency-per-1k-tokens", type=float, default=0.01)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    if "all" in args.scenario:
+        args.scenario = list(SCENARIOS)
+    return args
+
+
+def main(argv=None) -> dict:
+    args = parse_args(argv)
+    logging.basicConfig(level=os.environ.get("BENCH_LOG_LEVEL", "INFO").upper(), format="%(asctime)s %(message)s")
+
+    letta = FakeLettaServer(
+        latency=args.letta_latency,
+        jitter=args.letta_jitter,
+        error_rate=args.letta_error_rate,
+        processing_time=args.letta_processing_time,
+        token_delay=args.letta_token_delay,
+        seed=args.seed,
+    )
+    letta_url = letta.start()
+    data_dir = tempfile.mkdtemp(prefix="bench_")
+    url, stop, fake_llm = start_service(args, letta_url, data_dir)
+    run_id = uuid.uuid4().hex[:8]
+
+    results = {
+        **git_commit(),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "params": {k: v for k, v in vars(args).items() if k != "output"},
+        "scenarios": {},
+    }
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    try:
+        with httpx.Client(base_url=url, timeout=600, limits=limits) as client:
+            for scenario in args.scenario:
+                log.info(f"[Bench] Running {scenario}...")
+                results["scenarios"][scenario] = SCENARIO_FUNCTIONS[scenario](client, args, run_id)
+    finally:
+        stop()
+        letta.stop()
+
+    results["fakes"] = {
+        "letta_requests": letta.requests,
+        "letta_injected_errors": letta.errors,
+        "llm_calls": fake_llm.calls,
+        "llm_injected_errors": fake_llm.errors,
+    }
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+        log.info(f"[Bench] Results written to {args.output}")
+    else:
+        print(output)
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+import logging
+import threading
+import uuid
+from collections import deque
+
+from .AssistantWithFilesys import AssistantWithFilesys
+from .FileManifest import FileManifest
+from .LettaClientPool import LettaClientPool
+from .UploadStatusTracker import UploadStatusTracker
+
+log = logging.getLogger(__name__)
+
+
+class AgentPool:
+    """
+    Background pool of pre-provisioned Letta agent + folder pairs for each personality.
+
+    Setting up an assistant takes six or more serial Letta calls (agent lookup and
+    creation, folder lookup, embedding configs, folder creation, attachment). The pool
+    does that work ahead of time on the shared background executor, under placeholder
+    names, and keeps ``size`` idle pairs per personality. ``take`` claims one by renaming
+    the agent, the only call it waits for; the folder rename and the pool top-up follow
+    in the background. Building the assistant of a claimed pair also reconciles the
+    folder's manifest: a folder listing, skipped when the manifest already reconciled
+    that folder while provisioning it (the same ``manifest`` instance, as in the app).
+
+    Nothing is provisioned until ``start`` is called, explicitly or by the first
+    ``take``. Idle pairs belong to this process: they are deleted from Letta by
+    ``shutdown`` (registered at exit by the app), so each worker holds its own ``size``
+    pairs per personality. Pairs left behind by a process that died without running
+    its exit handlers are named ``pool-<personality>-<hex>``.
+
+    Args:
+        base_url (str): URL of the Letta server.
+        size (int): Idle pairs to keep per personality; 0 (the default) disables the pool.
+        personalities (list[str], optional): Personalities to provision. Defaults to every
+            key of ``AssistantWithFilesys.PERSONALITY_PROFILES``.
+        model (str, optional): Model of the pooled agents.
+        pool (LettaClientPool, optional): Source of the Letta client and background executor.
+        tracker (UploadStatusTracker, optional): Passed to the provisioning assistants.
+        manifest (FileManifest, optional): Manifest the new folders are registered in; should be
+            the one of the assistants built from claimed pairs.
+
+    Example:
+        >>> agent_pool = AgentPool("http://letta_server:8283", size=2)
+        >>> agent_pool.start()
+        >>> claimed = agent_pool.take("casual", "my_agent", "my_agent_research_folder")
+        >>> if claimed:
+        ...     assistant = AssistantWithFilesys("my_agent", "my_agent_research_folder",
+        ...                                      agent=claimed["agent"], folder=claimed["folder"])
+    """
+
+    NAME_PREFIX = "pool"
+
+    def __init__(
+        self,
+        base_url: str,
+        size: int = 0,
+        personalities: list = None,
+        model: str = "openai/gpt-4o-mini",
+        pool: LettaClientPool = None,
+        tracker: UploadStatusTracker = None,
+        manifest: FileManifest = None
+    ):
+        self.base_url = base_url
+        self.size = size
+        self.personalities = list(personalities or AssistantWithFilesys.PERSONALITY_PROFILES)
+        self.model = model
+        self.pool = pool or LettaClientPool.default()
+        self.client = self.pool.client(base_url)
+        self.telemetry = self.pool.telemetry
+        self.metadata_cache = self.pool.metadata_cache
+        self.tracker = tracker
+        self.manifest = manifest
+        self._idle = {p: deque() for p in self.personalities}
+        self._provisioning = {p: 0 for p in self.personalities}
+        self._claimed = 0
+        self._failed = 0
+        self._lock = threading.Lock()
+        self._closed = False
+        self._started = False
+
+    def start(self):
+        """Start provisioning the idle pairs of every personality in the background (once)."""
+        with self._lock:
+            if self._started or self.size <= 0:
+                return
+            self._started = True
+        for personality in self.personalities:
+            self._top_up(personality)
+
+    def _top_up(self, personality: str):
+        with self._lock:
+            if self._closed:
+                return
+            missing = self.size - len(self._idle[personality]) - self._provisioning[personality]
+            if missing <= 0:
+                return
+            self._provisioning[personality] += missing
+        for _ in range(missing):
+            self.pool.executor.submit(self._provision, personality)
+
+    def _provision(self, personality: str):
+        """Set up one agent + folder pair under a placeholder name and add it to the pool."""
+        name = f"{self.NAME_PREFIX}-{personality}-{uuid.uuid4().hex[:12]}"
+        try:
+            with self.telemetry.span("agent_pool.provision", personality=personality):
+                assistant = AssistantWithFilesys(
+                    agent_name=name,
+                    folder_name=f"{name}_research_folder",
+                    base_url=self.base_url,
+                    model=self.model,
+                    personality=personality,
+                    pool=self.pool,
+                    tracker=self.tracker,
+                    manifest=self.manifest
+                )
+        except Exception as e:
+            # Not retried here: the next ``take`` tops the pool up again.
+            with self._lock:
+                self._provisioning[personality] -= 1
+                self._failed += 1
+            log.warning(f"[AgentPool] Could not provision a '{personality}' agent: {e}")
+            return
+
+        with self._lock:
+            self._provisioning[personality] -= 1
+            closed = self._closed
+            if not closed:
+                self._idle[personality].append({"agent": assistant.agent, "folder": assistant.folder})
+        if closed:
+            self._delete({"agent": assistant.agent, "folder": assistant.folder})
+        else:
+            log.debug(f"[AgentPool] Provisioned '{personality}' agent {assistant.agent.id}.")
+
+    def take(self, personality: str, agent_name: str, folder_name: str):
+        """
+        Claim an idle pair for ``personality``, renamed to ``agent_name`` / ``folder_name``.
+
+        Only the agent rename is waited for; the folder is renamed in the background.
+
+        Returns:
+            dict | None: {"agent": AgentState, "folder": Folder, "personality": str}, or None
+            when the pool has no idle pair for this personality (the caller then sets the
+            agent up itself).
+        """
+        personality = (personality or "helpful").strip().lower()
+        if self.size <= 0 or personality not in self._idle:
+            return None
+        # Lazy start: the first claim finds the pool empty and starts filling it.
+        self.start()
+        with self._lock:
+            slot = self._idle[personality].popleft() if self._idle[personality] else None
+        self._top_up(personality)
+        if slot is None:
+            return None
+
+        try:
+            with self.telemetry.span("agent_pool.claim", personality=personality):
+                agent = self.client.agents.modify(agent_id=slot["agent"].id, name=agent_name)
+        except Exception as e:
+            log.warning(f"[AgentPool] Could not claim agent {slot['agent'].id}, dropping it: {e}")
+            self.pool.executor.submit(self._delete, slot)
+            return None
+
+        folder = slot["folder"].model_copy(update={"name": folder_name})
+        self.pool.executor.submit(self._rename_folder, folder.id, folder_name)
+        with self._lock:
+            self._claimed += 1
+        # Lookups by the new names find the claimed pair, even before the folder rename is done.
+        self._forget_names(slot)
+        self.metadata_cache.put("agent_by_name", self._name_key(agent_name), agent)
+        self.metadata_cache.put("folder_by_name", self._name_key(folder_name), folder)
+        return {"agent": agent, "folder": folder, "personality": personality}
+
+    def _name_key(self, name: str) -> tuple:
+        return (self.base_url.rstrip("/"), name)
+
+    def _forget_names(self, slot: dict):
+        """Drop the placeholder names of a pooled pair from the metadata cache."""
+        self.metadata_cache.invalidate("agent_by_name", self._name_key(slot["agent"].name))
+        self.metadata_cache.invalidate("folder_by_name", self._name_key(slot["folder"].name))
+
+    def _rename_folder(self, folder_id: str, folder_name: str):
+        try:
+            self.client.folders.modify(folder_id=folder_id, name=folder_name)
+        except Exception as e:
+            log.warning(f"[AgentPool] Could not rename folder {folder_id} to '{folder_name}': {e}")
+
+    def _delete(self, slot: dict):
+        """Delete a pooled agent and its folder from Letta (best effort)."""
+        self._forget_names(slot)
+        for kind, delete, item in (
+            ("agent", self.client.agents.delete, slot["agent"]),
+            ("folder", self.client.folders.delete, slot["folder"]),
+        ):
+            try:
+                delete(item.id)
+            except Exception as e:
+                log.warning(f"[AgentPool] Could not delete pooled {kind} {item.id}: {e}")
+
+    def stats(self) -> dict:
+        """Idle and in-progress pairs per personality, plus claim and failure counts."""
+        with self._lock:
+            return {
+                "size": self.size,
+                "started": self._started,
+                "personalities": {
+                    p: {"idle": len(self._idle[p]), "provisioning": self._provisioning[p]}
+                    for p in self.personalities
+                },
+                "claimed": self._claimed,
+                "failed": self._failed,
+            }
+
+    def shutdown(self):
+        """Stop topping up and delete the idle pairs from Letta."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            slots = [slot for idle in self._idle.values() for slot in idle]
+            for idle in self._idle.values():
+                idle.clear()
+        for slot in slots:
+            self._delete(slot)
+        if slots:
+            log.info(f"[AgentPool] Deleted {len(slots)} idle pooled agent(s).")
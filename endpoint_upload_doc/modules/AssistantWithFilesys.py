@@ -1,16 +1,23 @@
+import logging
 import os
-import tempfile
+import threading
 import uuid
+from datetime import datetime, timezone
 
 from dotenv import load_dotenv
-from concurrent.futures import ThreadPoolExecutor
-from letta_client import Letta
+
+from .ConversationBuffer import ConversationBuffer
+from .FileManifest import FileManifest
+from .LettaClientPool import LettaClientPool
+from .UploadStatusTracker import UploadStatusTracker
 
 # Load environment variables if not already set. Letta client needs this.
 if "OPENAI_API_KEY" not in os.environ:
     load_dotenv()
 import time
 
+log = logging.getLogger(__name__)
+
 
 
 
@@ -29,17 +36,36 @@ class AssistantWithFilesys:
         base_url (str, optional): URL of the Letta server. Defaults to "http://letta_server:8283".
         model (str, optional): Model name used when creating a new agent. Defaults to "openai/gpt-4o-mini".
         personality (str, optional): One of {"helpful", "formal", "casual"}. Determines the agent's tone and behavior.
+        conversation_buffer_size (int, optional): Messages kept in the in-process conversation buffer. Defaults to 200.
+        agent_id (str, optional): Id of an existing agent. Together with ``folder_id``, the agent and
+            folder are retrieved by id and no setup (creation or attachment) is done.
+        folder_id (str, optional): Id of the existing folder attached to ``agent_id``.
+        agent (AgentState, optional): An agent already set up, e.g. claimed from ``AgentPool``.
+            Together with ``folder``, both are used as they are, without any call to Letta.
+        folder (Folder, optional): The folder attached to ``agent``.
+        pool (LettaClientPool, optional): Source of the Letta client and background executor.
+            Defaults to the process-wide pool, shared by every assistant.
+        tracker (UploadStatusTracker, optional): Tracker following the processing status of uploads.
+            Defaults to the process-wide tracker.
+        manifest (FileManifest, optional): Content-hash manifest of the uploaded files, used to skip
+            redundant uploads. Defaults to an in-memory manifest for this assistant.
 
     Attributes:
         base_url (str): Base URL of the connected Letta server.
-        client (Letta): Instance of the Letta API client.
+        client (Letta): Letta API client, shared with the other assistants of the pool.
         agent_name (str): Name of the managed agent.
         folder_name (str): Name of the managed folder.
         model (str): Model used for the agent.
         personality (str): Personality type for the agent.
         agent (AgentState): The retrieved or newly created Letta agent.
         folder (FolderState): The retrieved or newly created Letta folder.
-        executor (ThreadPoolExecutor): Thread pool for background upload jobs.
+        executor (ThreadPoolExecutor): Shared thread pool for background jobs.
+        tracker (UploadStatusTracker): Tracker of the processing status of uploaded files.
+        telemetry (Telemetry): Timed spans of uploads, chats and conversation fetches (the pool's).
+        metadata_cache (MetadataCache): TTL cache of name lookups and server configs (the pool's).
+        rate_limiter (RateLimiter): LLM budget and retry policy chat messages are sent within (the pool's).
+        conversation (ConversationBuffer): Recent conversation, refreshed incrementally from Letta.
+        manifest (FileManifest): filename -> content hash -> file_id of the folder's files.
 
     Example:
         >>> assistant = AssistantWithFilesys(
@@ -65,35 +91,67 @@ class AssistantWithFilesys:
         ),
     }
 
+    # Tokens reserved from the LLM budget per chat message until Letta reports the usage
+    # (the agent's context window makes a step far larger than the message itself).
+    chat_tokens_estimate = 4000
+
+    _upload_locks = {}
+    _upload_locks_lock = threading.Lock()
+
     def __init__(
         self,
         agent_name: str,
         folder_name: str,
         base_url: str = "http://letta_server:8283",
         model: str = "openai/gpt-4o-mini",
-        personality: str = "helpful"
+        personality: str = "helpful",
+        conversation_buffer_size: int = 200,
+        agent_id: str = None,
+        folder_id: str = None,
+        pool: LettaClientPool = None,
+        tracker: UploadStatusTracker = None,
+        manifest: FileManifest = None,
+        agent=None,
+        folder=None
     ):
         """Initialize the Letta client, ensure the agent and folder exist, and attach them."""
         self.base_url = base_url
-        self.client = Letta(base_url=self.base_url)
+        self.pool = pool or LettaClientPool.default()
+        self.client = self.pool.client(self.base_url)
         self.agent_name = agent_name
         self.folder_name = folder_name
         self.model = model
         self.personality = self._validate_personality(personality)
         self.agent = None
         self.folder = None
-        self.executor = ThreadPoolExecutor(max_workers=3)
-
-        # Automatically set up on init
-        self.agent = self._ensure_agent_exists()
-        self.folder = self._ensure_folder_exists()
-        self._attach_folder_to_agent()
+        self.executor = self.pool.executor
+        self.telemetry = self.pool.telemetry
+        self.metadata_cache = self.pool.metadata_cache
+        self.rate_limiter = self.pool.rate_limiter
+        self.tracker = tracker or UploadStatusTracker.default()
+        self.conversation = ConversationBuffer(maxlen=conversation_buffer_size)
+        self.manifest = manifest or FileManifest()
+
+        if agent is not None and folder is not None:
+            # Pre-provisioned agent and folder (e.g. from the agent pool)
+            self.agent = agent
+            self.folder = folder
+        elif agent_id and folder_id:
+            # Rebuilding a handle for an agent set up earlier (e.g. by another worker)
+            self.agent = self.client.agents.retrieve(agent_id=agent_id)
+            self.folder = self.client.folders.retrieve(folder_id=folder_id)
+        else:
+            # Automatically set up on init
+            self.agent = self._ensure_agent_exists()
+            self.folder = self._ensure_folder_exists()
+            self._attach_folder_to_agent()
+        self._reconcile_manifest()
 
     def _validate_personality(self, personality: str) -> str:
         """Normalize and validate personality, with fallback to 'helpful'."""
         p = personality.strip().lower() if personality else "helpful"
         if p not in self.PERSONALITY_PROFILES:
-            print(f" personality '{personality}'Not available. Defaulting to 'helpful'.")
+            log.warning(f" personality '{personality}'Not available. Defaulting to 'helpful'.")
             return "helpful"
         return p
 
@@ -101,14 +159,22 @@ class AssistantWithFilesys:
         """Return the text for the chosen personality (defaults to 'helpful')."""
         return self.PERSONALITY_PROFILES.get(self.personality, self.PERSONALITY_PROFILES["helpful"])
 
+    def _name_key(self, name: str) -> tuple:
+        """Metadata cache key of an agent or folder name on this server."""
+        return (self.base_url.rstrip("/"), name)
+
     def _ensure_agent_exists(self):
-        """Retrieve or create a Letta agent."""
-        agents = self.client.agents.list(name=self.agent_name)
-        if agents:
-            print(f"[Letta] Agent '{self.agent_name}' already exists, retrieving.")
-            agent = agents[0]
+        """Retrieve (through the metadata cache) or create a Letta agent."""
+        agent = self.metadata_cache.get_or_load(
+            "agent_by_name",
+            self._name_key(self.agent_name),
+            lambda: next(iter(self.client.agents.list(name=self.agent_name)), None)
+        )
+        if agent is not None:
+            log.info(f"[Letta] Agent '{self.agent_name}' already exists, retrieving.")
         else:
-            print(f"[Letta] Creating new agent '{self.agent_name}' using model '{self.model}' and personality '{self.personality}'...")
+            self._check_model_available(self.list_models())
+            log.info(f"[Letta] Creating new agent '{self.agent_name}' using model '{self.model}' and personality '{self.personality}'...")
             agent = self.client.agents.create(
                 name=self.agent_name,
                 model=self.model,
@@ -123,17 +189,21 @@ class AssistantWithFilesys:
                 ],
                 tools=["web_search"],
             )
+            self.metadata_cache.put("agent_by_name", self._name_key(self.agent_name), agent)
         return agent
 
     def _ensure_folder_exists(self):
-        """Retrieve or create a Letta folder for document uploads."""
-        folders = self.client.folders.list(name=self.folder_name)
-        if folders:
-            print(f"[Letta] Folder '{self.folder_name}' already exists, retrieving.")
-            folder = folders[0]
+        """Retrieve (through the metadata cache) or create a Letta folder for document uploads."""
+        folder = self.metadata_cache.get_or_load(
+            "folder_by_name",
+            self._name_key(self.folder_name),
+            lambda: next(iter(self.client.folders.list(name=self.folder_name)), None)
+        )
+        if folder is not None:
+            log.info(f"[Letta] Folder '{self.folder_name}' already exists, retrieving.")
         else:
-            print(f"[Letta] Folder '{self.folder_name}' not found, creating.")
-            embedding_configs = self.client.models.embeddings.list()
+            log.info(f"[Letta] Folder '{self.folder_name}' not found, creating.")
+            embedding_configs = self.list_embedding_configs()
             if not embedding_configs:
                 raise RuntimeError("No embedding configurations available from Letta server.")
             embedding_config = embedding_configs[-2] if len(embedding_configs) >= 2 else embedding_configs[-1]
@@ -142,111 +212,188 @@ class AssistantWithFilesys:
                 name=self.folder_name,
                 embedding_config=embedding_config
             )
+            self.metadata_cache.put("folder_by_name", self._name_key(self.folder_name), folder)
         return folder
 
+    def list_embedding_configs(self) -> list:
+        """Embedding configs of the Letta server (cached; empty lists are not)."""
+        return self.metadata_cache.get_or_load(
+            "embedding_configs",
+            self.base_url.rstrip("/"),
+            lambda: self.client.models.embeddings.list() or None
+        ) or []
+
+    def list_models(self) -> list:
+        """LLM configs of the models available on the Letta server (cached)."""
+        return self.metadata_cache.get_or_load(
+            "llm_models",
+            self.base_url.rstrip("/"),
+            lambda: self.client.models.list() or None
+        ) or []
+
+    def _check_model_available(self, models: list):
+        """Raise ValueError if the server lists its models and ``self.model`` is not one of them."""
+        handles = {getattr(m, "handle", None) for m in models} - {None}
+        if handles and self.model not in handles:
+            raise ValueError(f"Model '{self.model}' is not available on the Letta server.")
+
     def _attach_folder_to_agent(self):
         """Attach the folder to the agent (if not already attached)."""
         try:
-            print(f"[Letta] Attaching folder '{self.folder_name}' to agent '{self.agent_name}'...")
+            log.info(f"[Letta] Attaching folder '{self.folder_name}' to agent '{self.agent_name}'...")
             self.client.agents.folders.attach(agent_id=self.agent.id, folder_id=self.folder.id)
         except Exception as e:
-            print(f"[Letta] Folder may already be attached: {e}")
+            log.warning(f"[Letta] Folder may already be attached: {e}")
+
+    def _reconcile_manifest(self):
+        """Register the folder's pre-existing files in the manifest (once per folder and process)."""
+        try:
+            self.manifest.reconcile(self.client, self.folder.id)
+        except Exception as e:
+            log.warning(f"[Manifest] Could not reconcile folder '{self.folder_name}': {e}")
+
+    @classmethod
+    def _upload_lock(cls, folder_id: str, filename: str) -> threading.Lock:
+        """Serialize uploads of one filename to one folder, so concurrent duplicates upload once."""
+        with cls._upload_locks_lock:
+            return cls._upload_locks.setdefault((folder_id, filename), threading.Lock())
 
-    def upload_text_as_file(self, text_content: str, filename: str) -> dict:
+    def upload_text_as_file(self, text_content, filename: str, content_hash: str = None) -> dict:
         """
         Uploads text content (e.g., parsed Markdown) as a file to the agent's folder.
         Returns the real Letta file_id and folder_id immediately after upload.
-        Background polling continues for processing status.
+        The processing status is then followed by the shared UploadStatusTracker.
+
+        The content is sent straight from memory, without a temporary file.
+
+        Uploads are checked against the folder's content-hash manifest: a file the folder
+        already holds with the same name and content is not uploaded again and the
+        existing file_id is returned, and changed content under an existing name replaces
+        the old file instead of adding a copy. Either way Letta only chunks and embeds
+        what is new.
+
+        Args:
+            text_content (str | bytes | BinaryIO): The content; strings are sent UTF-8 encoded.
+            filename (str): Name the file is stored under in Letta.
+            content_hash (str, optional): Identity of the content, when it should ignore parts
+                of the bytes that change on every upload (e.g. a timestamp header).
+                Defaults to the sha256 of the content.
+
+        Returns:
+            dict: {"file_id": str, "folder_id": str, "deduplicated": bool}
         """
         if not self.folder:
             raise RuntimeError("Folder not initialized for this assistant.")
 
         folder_id = self.folder.id
 
-        # Write text content to a temporary Markdown file
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".md", mode="w", encoding="utf-8") as tmp_file:
-            tmp_file.write(text_content)
-            tmp_file_path = tmp_file.name
-
-        print(f"[Upload] Created temporary file for upload: {tmp_file_path}")
-
-        try:
-            # Upload synchronously to get real Letta file_id
-            with open(tmp_file_path, "rb") as f:
+        if isinstance(text_content, str):
+            text_content = text_content.encode("utf-8")
+        elif not isinstance(text_content, (bytes, bytearray)):
+            text_content = text_content.read()
+        content_hash = content_hash or self.manifest.hash_content(text_content)
+
+        with self._upload_lock(folder_id, filename):
+            existing = self.manifest.get(folder_id, filename)
+            # Only the same name counts: a file id shared by two names would be lost when
+            # either of them is replaced.
+            if (
+                existing is not None and existing["content_hash"] == content_hash
+                and not self._upload_failed(existing["file_id"])
+            ):
+                log.info(f"[Upload] '{filename}' is already in the folder as file {existing['file_id']}, skipping upload.")
+                return {"file_id": existing["file_id"], "folder_id": folder_id, "deduplicated": True}
+
+            # Upload synchronously to get real Letta file_id. Changed content replaces
+            # the file of the same name rather than being stored next to it.
+            with self.telemetry.span("letta.upload", filename=filename, bytes=len(text_content)):
                 file_obj = self.client.folders.files.upload(
                     folder_id=folder_id,
-                    file=f,
-                    name=filename  # <-- use the real filename here
+                    file=(filename, text_content, "text/markdown"),
+                    name=filename,  # <-- use the real filename here
+                    duplicate_handling="replace" if existing else None
                 )
 
             file_id = file_obj.id
-            print(f"[Upload] File created with ID: {file_id}")
-
-            # Start background polling for completion
-            def _poll_file():
-                try:
-                    print(f"[Upload] Polling processing status for file: {file_id}")
-                    while True:
-                        files = self.client.folders.files.list(
-                            folder_id=folder_id,
-                            order="desc",
-                            limit=10
-                        )
-                        for f in files:
-                            if f.id == file_id:
-                                status = getattr(f, "processing_status", None)
-                                if status == "completed":
-                                    print(f"[Upload] Completed: {filename}")
-                                    return
-                                elif status == "failed":
-                                    print(f"[Upload] Failed: {filename}")
-                                    return
-                                else:
-                                    print(f"[Upload] Processing status: {status}")
-                        time.sleep(1)
-                except Exception as e:
-                    print(f"[Upload] Polling error for {file_id}: {e}")
+            self.metadata_cache.invalidate("folder_files", folder_id)
+            self.manifest.put({
+                "folder_id": folder_id,
+                "filename": filename,
+                "content_hash": content_hash,
+                "file_id": file_id,
+                "size": len(text_content),
+            })
+        if existing:
+            log.info(f"[Upload] File '{filename}' changed, replaced {existing['file_id']} with ID: {file_id}")
+            # The replaced file is gone from Letta: stop waiting for it to finish processing.
+            self.tracker.untrack(existing["file_id"])
+        else:
+            log.info(f"[Upload] File created with ID: {file_id}")
 
-            self.executor.submit(_poll_file)
+        # Processing status is followed by the shared tracker (one poller for all files)
+        self.tracker.track(
+            self.client,
+            folder_id=folder_id,
+            file_id=file_id,
+            filename=filename,
+            status=getattr(file_obj, "processing_status", None)
+        )
 
-        finally:
-            # Clean up temporary file
-            os.remove(tmp_file_path)
-            print(f"[Upload] Deleted temporary file: {tmp_file_path}")
+        return {"file_id": file_id, "folder_id": folder_id, "deduplicated": False}
 
-        return {"file_id": file_id, "folder_id": folder_id}
+    def _upload_failed(self, file_id: str) -> bool:
+        """True if Letta failed to process ``file_id``, so identical content must be uploaded again."""
+        entry = self.tracker.get(file_id)
+        return entry is not None and entry["status"] == "error"
 
 
 
 
 
 
-    def chat(self, message: str) -> dict:
+    def chat(self, message: str, only_new: bool = False) -> dict:
         """
         Send a message to this agent and return the assistant's latest reply
         plus the current conversation history.
 
         Args:
             message (str): The user's message text.
+            only_new (bool): Return only the messages of this turn (the user message and the
+                agent replies) instead of the conversation history.
+
+        The turn is appended to the conversation buffer straight from the response, so the
+        returned history doesn't cost another round trip to Letta once the buffer is loaded.
 
         Returns:
             dict: {
                 "reply": str,
                 "conversation": list[dict]
             }
+            or, with ``only_new``: {
+                "reply": str,
+                "messages": list[dict]
+            }
         """
         if not self.agent:
             raise RuntimeError("Agent not initialized.")
 
+        history_key = "messages" if only_new else "conversation"
         try:
-            print(f"[Letta] Sending message to agent '{self.agent.name}'...")
-
-            response = self.client.agents.messages.create(
-                agent_id=self.agent.id,
-                messages=[
-                    {"role": "user", "content": message}
-                ]
-            )
+            log.info(f"[Letta] Sending message to agent '{self.agent.name}'...")
+
+            with self.telemetry.span("chat", agent_id=self.agent.id):
+                # Not idempotent: Letta may have stored the message before failing.
+                response = self.rate_limiter.call_sync(
+                    lambda: self.client.agents.messages.create(
+                        agent_id=self.agent.id,
+                        messages=[
+                            {"role": "user", "content": message}
+                        ]
+                    ),
+                    tokens=self.chat_tokens_estimate,
+                    idempotent=False
+                )
+            self._settle_usage(getattr(response.usage, "total_tokens", None))
 
             reply_text = None
             for msg in response.messages:
@@ -257,7 +404,29 @@ class AssistantWithFilesys:
             if not reply_text:
                 reply_text = "[Letta] No assistant response found."
 
-            conversation = self.get_conversation(limit=50)
+            turn, newest_id = self._normalize_messages(response.messages)
+            if not any(m["role"] == "user" for m in turn):
+                # Letta didn't return the stored user message: answer with a local copy (no
+                # id), which is never buffered, so the next refresh fetches the real one.
+                turn.insert(0, {
+                    "id": None,
+                    "role": "user",
+                    "content": message,
+                    "timestamp": datetime.now(timezone.utc)
+                })
+            with self.conversation.lock:
+                buffered = self._buffer_turn(turn, newest_id)
+
+            if only_new:
+                return {
+                    "reply": reply_text,
+                    "messages": turn
+                }
+
+            if buffered and self.conversation.maxlen >= 50:
+                conversation = self.conversation.recent(50)
+            else:
+                conversation = self.get_conversation(limit=50)
 
             return {
                 "reply": reply_text,
@@ -265,14 +434,210 @@ class AssistantWithFilesys:
             }
 
         except Exception as e:
-            print(f"[Letta] Chat error: {e}")
-            return {"reply": f"[Letta] Chat failed: {e}", "conversation": []}
+            log.warning(f"[Letta] Chat error: {e}")
+            return {"reply": f"[Letta] Chat failed: {e}", history_key: []}
+
+
+    @staticmethod
+    def _content_to_text(content) -> str:
+        """Flatten Letta message content (a string or a list of text parts) to a string."""
+        if isinstance(content, str):
+            return content
+        if isinstance(content, list):
+            return "".join(getattr(part, "text", "") or "" for part in content)
+        return str(content) if content is not None else ""
+
+    def _stream_event(self, chunk):
+        """Translate one Letta stream item to an (event, data) pair, or None to skip it."""
+        message_type = getattr(chunk, "message_type", None)
+        if message_type == "assistant_message":
+            return "token", {"id": chunk.id, "content": self._content_to_text(chunk.content)}
+        if message_type == "reasoning_message":
+            return "reasoning", {"id": chunk.id, "reasoning": chunk.reasoning, "hidden": False}
+        if message_type == "hidden_reasoning_message":
+            return "reasoning", {"id": chunk.id, "reasoning": chunk.hidden_reasoning, "hidden": True}
+        if message_type == "tool_call_message":
+            tool_call = chunk.tool_call
+            return "tool_call", {
+                "id": chunk.id,
+                "name": getattr(tool_call, "name", None),
+                "arguments": getattr(tool_call, "arguments", None),
+                "tool_call_id": getattr(tool_call, "tool_call_id", None)
+            }
+        if message_type == "tool_return_message":
+            return "tool_return", {
+                "id": chunk.id,
+                "name": chunk.name,
+                "status": chunk.status,
+                "tool_return": chunk.tool_return,
+                "tool_call_id": chunk.tool_call_id
+            }
+        if message_type == "stop_reason":
+            return "stop", {"stop_reason": chunk.stop_reason}
+        if message_type == "usage_statistics":
+            return "usage", {
+                "prompt_tokens": chunk.prompt_tokens,
+                "completion_tokens": chunk.completion_tokens,
+                "total_tokens": chunk.total_tokens,
+                "step_count": chunk.step_count
+            }
+        return None
+
+    def stream_chat(self, message: str, stream_tokens: bool = True):
+        """
+        Send a message to this agent and stream its response as it is produced.
+
+        Letta's step/token stream is translated into (event, data) pairs:
 
+        - ``token``: a piece of the assistant reply (``{"id", "content"}``)
+        - ``reasoning``: agent reasoning (``{"id", "reasoning", "hidden"}``)
+        - ``tool_call``: a tool invocation, possibly partial when streaming tokens
+          (``{"id", "name", "arguments", "tool_call_id"}``)
+        - ``tool_return``: the result of a tool call (``{"id", "name", "status", "tool_return", "tool_call_id"}``)
+        - ``stop``: why the agent stopped (``{"stop_reason"}``)
+        - ``usage``: token usage of the run
+        - ``done``: always last on success, with the full ``reply``
+        - ``error``: emitted instead of ``done`` when the request fails
+
+        Args:
+            message (str): The user's message text.
+            stream_tokens (bool): Stream individual tokens (True) or whole steps only (False).
+
+        Yields:
+            tuple[str, dict]: (event type, JSON-serializable payload)
+        """
+        if not self.agent:
+            raise RuntimeError("Agent not initialized.")
+
+        log.info(f"[Letta] Streaming message to agent '{self.agent.name}'...")
+        reply_parts = []
+        started = time.perf_counter()
+        try:
+            self.rate_limiter.acquire_sync(self.chat_tokens_estimate)
+            with self.telemetry.span("chat.stream", agent_id=self.agent.id):
+                stream = self.client.agents.messages.create_stream(
+                    agent_id=self.agent.id,
+                    messages=[
+                        {"role": "user", "content": message}
+                    ],
+                    stream_tokens=stream_tokens
+                )
+                for chunk in stream:
+                    event = self._stream_event(chunk)
+                    if event is None:
+                        continue
+                    if event[0] == "token":
+                        if not reply_parts:
+                            self._observe_first_token(started)
+                        reply_parts.append(event[1]["content"])
+                    elif event[0] == "usage":
+                        self._settle_usage(event[1]["total_tokens"])
+                    yield event
+        except Exception as e:
+            log.warning(f"[Letta] Chat stream error: {e}")
+            yield "error", {"error": f"[Letta] Chat failed: {e}"}
+            return
+
+        reply_text = "".join(reply_parts) or "[Letta] No assistant response found."
+        yield "done", {"reply": reply_text}
+
+    def _observe_first_token(self, started: float):
+        self.telemetry.stage_duration.observe(time.perf_counter() - started, stage="chat.first_token", status="ok")
+
+    def _settle_usage(self, total_tokens):
+        """Correct the chat reservation in the LLM budget with the tokens Letta reported."""
+        self.rate_limiter.settle(self.chat_tokens_estimate, total_tokens)
+
+    def _normalize_messages(self, messages) -> tuple:
+        """
+        Keep the user and assistant messages of a Letta message list.
+
+        Returns:
+            tuple[list[dict], str | None]: conversation messages sorted oldest → newest,
+            and the id of the newest Letta message of any type (the next ``after`` cursor).
+        """
+        conversation = []
+        for m in messages:
+            if m.message_type == "user_message":
+                role = "user"
+            elif m.message_type == "assistant_message":
+                role = "assistant"
+            else:
+                continue
+
+            conversation.append({
+                "id": getattr(m, "id", None),
+                "role": role,
+                "content": self._content_to_text(m.content),
+                "timestamp": getattr(m, "date", None)
+            })
+
+        # Sort from oldest to newest
+        conversation = sorted(conversation, key=lambda x: x["timestamp"])
+        dated = [m for m in messages if getattr(m, "date", None) is not None]
+        newest_id = max(dated, key=lambda m: m.date).id if dated else None
+        return conversation, newest_id
+
+    def _buffer_turn(self, turn: list, newest_id: str) -> bool:
+        """
+        Append a chat turn (the user message, then the replies) to the conversation buffer
+        and move its cursor to ``newest_id``, the newest message of the chat response.
+
+        Called with the buffer locked. Only done when every message of the turn has its
+        Letta id (Letta returned the stored user message), the buffer is loaded and the turn
+        is newer than everything in it; otherwise (first chat of the agent, or a refresh
+        that already fetched the turn) nothing is buffered and the next refresh fetches the
+        turn from Letta. Messages another worker adds to the agent meanwhile are skipped.
+
+        Returns:
+            bool: Whether the turn was buffered.
+        """
+        buffer = self.conversation
+        if buffer.last_id is None or newest_id is None:
+            return False
+        if any(m["id"] is None or m["timestamp"] is None for m in turn):
+            return False
+        newest = buffer.recent(1)
+        if newest and (newest[0]["timestamp"] is None or newest[0]["timestamp"] >= turn[0]["timestamp"]):
+            return False
+        buffer.extend(turn, last_id=newest_id)
+        return True
+
+    def _sync_conversation(self):
+        """Fetch only the messages newer than the last one seen into the conversation buffer."""
+        buffer = self.conversation
+        with buffer.lock:
+            if buffer.last_id is None:
+                messages = self.client.agents.messages.list(
+                    agent_id=self.agent.id,
+                    limit=buffer.maxlen,
+                    use_assistant_message=True
+                )
+                conversation, newest_id = self._normalize_messages(messages)
+                buffer.extend(conversation, last_id=newest_id, complete=len(messages) < buffer.maxlen)
+                return
+
+            while True:
+                messages = self.client.agents.messages.list(
+                    agent_id=self.agent.id,
+                    after=buffer.last_id,
+                    limit=buffer.maxlen,
+                    use_assistant_message=True
+                )
+                if not messages:
+                    return
+                conversation, newest_id = self._normalize_messages(messages)
+                buffer.extend(conversation, last_id=newest_id)
+                if len(messages) < buffer.maxlen:
+                    return
 
     def get_conversation(self, limit: int = 50) -> list:
         """
         Retrieve the recent user and assistant messages for this agent.
 
+        Served from the in-process conversation buffer, which only fetches messages
+        newer than the last one seen. Requests larger than the buffer go to Letta.
+
         Args:
             limit (int): Maximum number of messages to fetch (default=50).
 
@@ -283,35 +648,67 @@ class AssistantWithFilesys:
             raise RuntimeError("Agent not initialized.")
 
         try:
+            with self.telemetry.span("get_conversation", limit=limit):
+                if limit > self.conversation.maxlen:
+                    messages = self.client.agents.messages.list(
+                        agent_id=self.agent.id,
+                        limit=limit,
+                        use_assistant_message=True
+                    )
+                    conversation, _ = self._normalize_messages(messages)
+                    return conversation
+
+                self._sync_conversation()
+                return self.conversation.recent(limit)
+
+        except Exception as e:
+            log.warning(f"[Letta] Conversation fetch error: {e}")
+            return []
+
+    def get_history(self, before: str = None, limit: int = 50) -> dict:
+        """
+        Page backwards through the conversation history.
+
+        Args:
+            before (str, optional): Message id cursor; only messages older than it are returned.
+                Omit to get the most recent page.
+            limit (int): Maximum number of messages per page (default=50).
+
+        Returns:
+            dict: {
+                "messages": list[dict],   # oldest → newest
+                "next_cursor": str | None # pass as ``before`` to get the previous page
+            }
+        """
+        if not self.agent:
+            raise RuntimeError("Agent not initialized.")
+
+        buffer = self.conversation
+        page = None
+        if before is None:
+            self._sync_conversation()
+            recent = buffer.recent(limit)
+            if len(recent) == limit or buffer.complete:
+                page = recent
+        else:
+            page = buffer.page_before(before, limit)
+
+        if page is not None:
+            exhausted = buffer.complete and (not page or buffer.oldest() is page[0])
+        else:
             messages = self.client.agents.messages.list(
                 agent_id=self.agent.id,
+                before=before,
                 limit=limit,
                 use_assistant_message=True
             )
+            page, _ = self._normalize_messages(messages)
+            exhausted = len(messages) < limit
 
-            conversation = []
-            for m in messages:
-                if m.message_type == "user_message":
-                    role = "user"
-                elif m.message_type == "assistant_message":
-                    role = "assistant"
-                else:
-                    continue
-
-                content = m.content if isinstance(m.content, str) else str(m.content)
-                conversation.append({
-                    "role": role,
-                    "content": content,
-                    "timestamp": getattr(m, "date", None)
-                })
-
-            # Sort from oldest to newest
-            conversation = sorted(conversation, key=lambda x: x["timestamp"])
-            return conversation
-
-        except Exception as e:
-            print(f"[Letta] Conversation fetch error: {e}")
-            return []
+        # A message without an id can't be a cursor: page from the oldest one that has one.
+        cursor = next((m["id"] for m in page if m.get("id")), None)
+        next_cursor = cursor if not exhausted else None
+        return {"messages": page, "next_cursor": next_cursor}
 
 
 
@@ -0,0 +1,434 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timezone
+
+from .AssistantWithFilesys import AssistantWithFilesys
+from .ConversationBuffer import ConversationBuffer
+from .FileManifest import FileManifest
+from .LettaClientPool import LettaClientPool
+from .UploadStatusTracker import UploadStatusTracker
+
+log = logging.getLogger(__name__)
+
+
+class AsyncAssistantWithFilesys(AssistantWithFilesys):
+    """
+    Asyncio variant of ``AssistantWithFilesys`` built on the ``AsyncLetta`` client.
+
+    Every Letta call is awaited on the caller's event loop instead of blocking a
+    thread, so one process can hold many slow chat and upload requests at once.
+    The public methods have the same names, arguments and results as in
+    ``AssistantWithFilesys`` but are coroutines (``stream_chat`` is an async
+    generator). Handles are built with ``await AsyncAssistantWithFilesys.create(...)``
+    since setting up the agent and folder needs the loop.
+
+    Upload statuses are still followed by the shared ``UploadStatusTracker`` (one
+    background thread, using the pool's sync client), and the content-hash manifest
+    is shared with the sync assistants.
+
+    Args:
+        Same as ``AssistantWithFilesys``.
+
+    Attributes:
+        client (AsyncLetta): Async Letta API client, shared with the other async assistants of the pool.
+
+    Example:
+        >>> assistant = await AsyncAssistantWithFilesys.create(
+        ...     agent_name="research_helper",
+        ...     folder_name="uploaded_docs",
+        ...     personality="casual"
+        ... )
+        >>> result = await assistant.chat("Hi!")
+    """
+
+    def __init__(
+        self,
+        agent_name: str,
+        folder_name: str,
+        base_url: str = "http://letta_server:8283",
+        model: str = "openai/gpt-4o-mini",
+        personality: str = "helpful",
+        conversation_buffer_size: int = 200,
+        pool: LettaClientPool = None,
+        tracker: UploadStatusTracker = None,
+        manifest: FileManifest = None
+    ):
+        """Set the attributes only; use ``create`` to get a handle that is set up."""
+        self.base_url = base_url
+        self.pool = pool or LettaClientPool.default()
+        self.client = self.pool.async_client(self.base_url)
+        self.agent_name = agent_name
+        self.folder_name = folder_name
+        self.model = model
+        self.personality = self._validate_personality(personality)
+        self.agent = None
+        self.folder = None
+        self.executor = self.pool.executor
+        self.telemetry = self.pool.telemetry
+        self.metadata_cache = self.pool.metadata_cache
+        self.rate_limiter = self.pool.rate_limiter
+        self.tracker = tracker or UploadStatusTracker.default()
+        self.conversation = ConversationBuffer(maxlen=conversation_buffer_size)
+        self.manifest = manifest or FileManifest()
+        self._sync_lock = asyncio.Lock()
+        self._upload_locks = {}
+
+    @classmethod
+    async def create(
+        cls,
+        agent_name: str,
+        folder_name: str,
+        agent_id: str = None,
+        folder_id: str = None,
+        agent=None,
+        folder=None,
+        **kwargs
+    ):
+        """
+        Build a handle and, like ``AssistantWithFilesys.__init__``, use the given agent and
+        folder states, retrieve them by id (when both are given) or ensure they exist and
+        are attached.
+        """
+        self = cls(agent_name, folder_name, **kwargs)
+        if agent is not None and folder is not None:
+            self.agent, self.folder = agent, folder
+        elif agent_id and folder_id:
+            self.agent, self.folder = await asyncio.gather(
+                self.client.agents.retrieve(agent_id=agent_id),
+                self.client.folders.retrieve(folder_id=folder_id),
+            )
+        else:
+            self.agent, self.folder = await asyncio.gather(
+                self._ensure_agent_exists(),
+                self._ensure_folder_exists(),
+            )
+            await self._attach_folder_to_agent()
+        await self._reconcile_manifest()
+        return self
+
+    async def _find_by_name(self, list_call, name: str):
+        return next(iter(await list_call(name=name)), None)
+
+    async def _ensure_agent_exists(self):
+        """Retrieve (through the metadata cache) or create a Letta agent."""
+        agent = await self.metadata_cache.aget_or_load(
+            "agent_by_name",
+            self._name_key(self.agent_name),
+            lambda: self._find_by_name(self.client.agents.list, self.agent_name)
+        )
+        if agent is not None:
+            log.info(f"[Letta] Agent '{self.agent_name}' already exists, retrieving.")
+            return agent
+        self._check_model_available(await self.list_models())
+        log.info(f"[Letta] Creating new agent '{self.agent_name}' using model '{self.model}' and personality '{self.personality}'...")
+        agent = await self.client.agents.create(
+            name=self.agent_name,
+            model=self.model,
+            embedding="openai/text-embedding-3-small",
+            memory_blocks=[
+                {"label": "human", "limit": 2000,
+                 "value": "Occupation: Researcher."},
+                {"label": "persona", "limit": 2000, "read_only": True,
+                 "value": self._get_personality_text()},
+                {"label": "personality growth", "limit": 2000,
+                 "value": "I should cite my sources. I should adapt my responses to the user's needs."},
+            ],
+            tools=["web_search"],
+        )
+        self.metadata_cache.put("agent_by_name", self._name_key(self.agent_name), agent)
+        return agent
+
+    async def _ensure_folder_exists(self):
+        """Retrieve (through the metadata cache) or create a Letta folder for document uploads."""
+        folder = await self.metadata_cache.aget_or_load(
+            "folder_by_name",
+            self._name_key(self.folder_name),
+            lambda: self._find_by_name(self.client.folders.list, self.folder_name)
+        )
+        if folder is not None:
+            log.info(f"[Letta] Folder '{self.folder_name}' already exists, retrieving.")
+            return folder
+        log.info(f"[Letta] Folder '{self.folder_name}' not found, creating.")
+        embedding_configs = await self.list_embedding_configs()
+        if not embedding_configs:
+            raise RuntimeError("No embedding configurations available from Letta server.")
+        embedding_config = embedding_configs[-2] if len(embedding_configs) >= 2 else embedding_configs[-1]
+        folder = await self.client.folders.create(
+            name=self.folder_name,
+            embedding_config=embedding_config
+        )
+        self.metadata_cache.put("folder_by_name", self._name_key(self.folder_name), folder)
+        return folder
+
+    async def _list_or_none(self, list_call):
+        return await list_call() or None
+
+    async def list_embedding_configs(self) -> list:
+        """Async ``AssistantWithFilesys.list_embedding_configs``."""
+        return await self.metadata_cache.aget_or_load(
+            "embedding_configs",
+            self.base_url.rstrip("/"),
+            lambda: self._list_or_none(self.client.models.embeddings.list)
+        ) or []
+
+    async def list_models(self) -> list:
+        """Async ``AssistantWithFilesys.list_models``."""
+        return await self.metadata_cache.aget_or_load(
+            "llm_models",
+            self.base_url.rstrip("/"),
+            lambda: self._list_or_none(self.client.models.list)
+        ) or []
+
+    async def _attach_folder_to_agent(self):
+        """Attach the folder to the agent (if not already attached)."""
+        try:
+            log.info(f"[Letta] Attaching folder '{self.folder_name}' to agent '{self.agent_name}'...")
+            await self.client.agents.folders.attach(agent_id=self.agent.id, folder_id=self.folder.id)
+        except Exception as e:
+            log.warning(f"[Letta] Folder may already be attached: {e}")
+
+    async def _reconcile_manifest(self):
+        """Register the folder's pre-existing files in the manifest (once per folder and process)."""
+        try:
+            # Once per folder and process: the manifest backend is sync, run it off the loop.
+            await asyncio.to_thread(self.manifest.reconcile, self.pool.client(self.base_url), self.folder.id)
+        except Exception as e:
+            log.warning(f"[Manifest] Could not reconcile folder '{self.folder_name}': {e}")
+
+    async def upload_text_as_file(self, text_content, filename: str, content_hash: str = None) -> dict:
+        """Async ``AssistantWithFilesys.upload_text_as_file``, with the same manifest checks."""
+        if not self.folder:
+            raise RuntimeError("Folder not initialized for this assistant.")
+
+        folder_id = self.folder.id
+        if isinstance(text_content, str):
+            text_content = text_content.encode("utf-8")
+        elif not isinstance(text_content, (bytes, bytearray)):
+            text_content = text_content.read()
+        content_hash = content_hash or self.manifest.hash_content(text_content)
+
+        lock = self._upload_locks.setdefault((folder_id, filename), asyncio.Lock())
+        async with lock:
+            existing = await asyncio.to_thread(self.manifest.get, folder_id, filename)
+            # Only the same name counts: a file id shared by two names would be lost when
+            # either of them is replaced.
+            if (
+                existing is not None and existing["content_hash"] == content_hash
+                and not self._upload_failed(existing["file_id"])
+            ):
+                log.info(f"[Upload] '{filename}' is already in the folder as file {existing['file_id']}, skipping upload.")
+                return {"file_id": existing["file_id"], "folder_id": folder_id, "deduplicated": True}
+
+            with self.telemetry.span("letta.upload", filename=filename, bytes=len(text_content)):
+                file_obj = await self.client.folders.files.upload(
+                    folder_id=folder_id,
+                    file=(filename, text_content, "text/markdown"),
+                    name=filename,
+                    duplicate_handling="replace" if existing else None
+                )
+            file_id = file_obj.id
+            self.metadata_cache.invalidate("folder_files", folder_id)
+            await asyncio.to_thread(self.manifest.put, {
+                "folder_id": folder_id,
+                "filename": filename,
+                "content_hash": content_hash,
+                "file_id": file_id,
+                "size": len(text_content),
+            })
+        if existing:
+            log.info(f"[Upload] File '{filename}' changed, replaced {existing['file_id']} with ID: {file_id}")
+            # The replaced file is gone from Letta: stop waiting for it to finish processing.
+            self.tracker.untrack(existing["file_id"])
+        else:
+            log.info(f"[Upload] File created with ID: {file_id}")
+
+        self.tracker.track(
+            self.pool.client(self.base_url),
+            folder_id=folder_id,
+            file_id=file_id,
+            filename=filename,
+            status=getattr(file_obj, "processing_status", None)
+        )
+        return {"file_id": file_id, "folder_id": folder_id, "deduplicated": False}
+
+    async def chat(self, message: str, only_new: bool = False) -> dict:
+        """Async ``AssistantWithFilesys.chat``."""
+        if not self.agent:
+            raise RuntimeError("Agent not initialized.")
+
+        history_key = "messages" if only_new else "conversation"
+        try:
+            log.info(f"[Letta] Sending message to agent '{self.agent.name}'...")
+            with self.telemetry.span("chat", agent_id=self.agent.id):
+                response = await self.rate_limiter.call(
+                    lambda: self.client.agents.messages.create(
+                        agent_id=self.agent.id,
+                        messages=[
+                            {"role": "user", "content": message}
+                        ]
+                    ),
+                    tokens=self.chat_tokens_estimate,
+                    idempotent=False
+                )
+            self._settle_usage(getattr(response.usage, "total_tokens", None))
+
+            reply_text = None
+            for msg in response.messages:
+                if msg.message_type == "assistant_message":
+                    reply_text = msg.content
+                    break
+            if not reply_text:
+                reply_text = "[Letta] No assistant response found."
+
+            turn, newest_id = self._normalize_messages(response.messages)
+            if not any(m["role"] == "user" for m in turn):
+                # Letta didn't return the stored user message: answer with a local copy (no
+                # id), which is never buffered, so the next refresh fetches the real one.
+                turn.insert(0, {
+                    "id": None,
+                    "role": "user",
+                    "content": message,
+                    "timestamp": datetime.now(timezone.utc)
+                })
+            async with self._sync_lock:
+                buffered = self._buffer_turn(turn, newest_id)
+
+            if only_new:
+                return {
+                    "reply": reply_text,
+                    "messages": turn
+                }
+
+            if buffered and self.conversation.maxlen >= 50:
+                conversation = self.conversation.recent(50)
+            else:
+                conversation = await self.get_conversation(limit=50)
+            return {
+                "reply": reply_text,
+                "conversation": conversation
+            }
+
+        except Exception as e:
+            log.warning(f"[Letta] Chat error: {e}")
+            return {"reply": f"[Letta] Chat failed: {e}", history_key: []}
+
+    async def stream_chat(self, message: str, stream_tokens: bool = True):
+        """Async generator version of ``AssistantWithFilesys.stream_chat`` (same events)."""
+        if not self.agent:
+            raise RuntimeError("Agent not initialized.")
+
+        log.info(f"[Letta] Streaming message to agent '{self.agent.name}'...")
+        reply_parts = []
+        started = time.perf_counter()
+        try:
+            await self.rate_limiter.acquire(self.chat_tokens_estimate)
+            with self.telemetry.span("chat.stream", agent_id=self.agent.id):
+                stream = self.client.agents.messages.create_stream(
+                    agent_id=self.agent.id,
+                    messages=[
+                        {"role": "user", "content": message}
+                    ],
+                    stream_tokens=stream_tokens
+                )
+                async for chunk in stream:
+                    event = self._stream_event(chunk)
+                    if event is None:
+                        continue
+                    if event[0] == "token":
+                        if not reply_parts:
+                            self._observe_first_token(started)
+                        reply_parts.append(event[1]["content"])
+                    elif event[0] == "usage":
+                        self._settle_usage(event[1]["total_tokens"])
+                    yield event
+        except Exception as e:
+            log.warning(f"[Letta] Chat stream error: {e}")
+            yield "error", {"error": f"[Letta] Chat failed: {e}"}
+            return
+
+        reply_text = "".join(reply_parts) or "[Letta] No assistant response found."
+        yield "done", {"reply": reply_text}
+
+    async def _sync_conversation(self):
+        """Fetch only the messages newer than the last one seen into the conversation buffer."""
+        buffer = self.conversation
+        async with self._sync_lock:
+            if buffer.last_id is None:
+                messages = await self.client.agents.messages.list(
+                    agent_id=self.agent.id,
+                    limit=buffer.maxlen,
+                    use_assistant_message=True
+                )
+                conversation, newest_id = self._normalize_messages(messages)
+                buffer.extend(conversation, last_id=newest_id, complete=len(messages) < buffer.maxlen)
+                return
+
+            while True:
+                messages = await self.client.agents.messages.list(
+                    agent_id=self.agent.id,
+                    after=buffer.last_id,
+                    limit=buffer.maxlen,
+                    use_assistant_message=True
+                )
+                if not messages:
+                    return
+                conversation, newest_id = self._normalize_messages(messages)
+                buffer.extend(conversation, last_id=newest_id)
+                if len(messages) < buffer.maxlen:
+                    return
+
+    async def get_conversation(self, limit: int = 50) -> list:
+        """Async ``AssistantWithFilesys.get_conversation``."""
+        if not self.agent:
+            raise RuntimeError("Agent not initialized.")
+
+        try:
+            with self.telemetry.span("get_conversation", limit=limit):
+                if limit > self.conversation.maxlen:
+                    messages = await self.client.agents.messages.list(
+                        agent_id=self.agent.id,
+                        limit=limit,
+                        use_assistant_message=True
+                    )
+                    conversation, _ = self._normalize_messages(messages)
+                    return conversation
+
+                await self._sync_conversation()
+                return self.conversation.recent(limit)
+
+        except Exception as e:
+            log.warning(f"[Letta] Conversation fetch error: {e}")
+            return []
+
+    async def get_history(self, before: str = None, limit: int = 50) -> dict:
+        """Async ``AssistantWithFilesys.get_history``."""
+        if not self.agent:
+            raise RuntimeError("Agent not initialized.")
+
+        buffer = self.conversation
+        page = None
+        if before is None:
+            await self._sync_conversation()
+            recent = buffer.recent(limit)
+            if len(recent) == limit or buffer.complete:
+                page = recent
+        else:
+            page = buffer.page_before(before, limit)
+
+        if page is not None:
+            exhausted = buffer.complete and (not page or buffer.oldest() is page[0])
+        else:
+            messages = await self.client.agents.messages.list(
+                agent_id=self.agent.id,
+                before=before,
+                limit=limit,
+                use_assistant_message=True
+            )
+            page, _ = self._normalize_messages(messages)
+            exhausted = len(messages) < limit
+
+        # A message without an id can't be a cursor: page from the oldest one that has one.
+        cursor = next((m["id"] for m in page if m.get("id")), None)
+        next_cursor = cursor if not exhausted else None
+        return {"messages": page, "next_cursor": next_cursor}
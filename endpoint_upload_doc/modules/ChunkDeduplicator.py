@@ -0,0 +1,211 @@
+import logging
+import re
+
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+# Largest Mersenne prime below 2**64: (a * x + b) mod p is a universal hash family, and
+# a, x < 2**31 keeps a * x + b within uint64.
+_MERSENNE_61 = np.uint64((1 << 61) - 1)
+_WORD = re.compile(r"\w+")
+_DIGITS = re.compile(r"\d+")
+_SPACES = re.compile(r"\s+")
+# Lines whose numbers are page numbers: "12", "- 12 -", "Page 3 of 20", "3/20", and running
+# headers/footers with a page number set apart ("Journal of X | 12", "12 · Smith et al.").
+_PAGE_NUMBER = re.compile(
+    r"^(?:page\s*)?[-\u2013\u2014(\[]?\s*\d+\s*[-\u2013\u2014)\]]?(?:\s*(?:of|/)\s*\d+)?$"
+    r"|\bpage\s+\d+(?:\s*(?:of|/)\s*\d+)?$"
+    r"|^\d+\s*[|\u00b7\u2022\u2013\u2014]\s*\S"
+    r"|\S\s*[|\u00b7\u2022\u2013\u2014]\s*\d+$",
+    re.IGNORECASE,
+)
+# Content that is never boilerplate, however often it repeats: list items, table rows,
+# headings, quotes and code fences.
+_CONTENT_LINE = re.compile(r"^(?:[-*+\u2022>#|]|\d+[.)]\s|```|~~~)")
+
+
+class ChunkDeduplicator:
+    """
+    Drops repeated boilerplate lines and near-duplicate chunks before summarization.
+
+    Converted PDFs repeat the same running headers, footers and page numbers on every
+    page, and often hold the same reference list or appendix twice. Two passes remove
+    them before the text reaches the LLM:
+
+    - ``strip_boilerplate``: short lines that sit at the edge of a page (first/last lines
+      between form feeds, or a paragraph of their own) at least ``min_line_repeats`` times,
+      spread at least ``min_gap_lines`` apart, are kept only where they first appear. They
+      are compared lowercased, with page numbers masked, so "Page 3 of 20" matches "Page 4
+      of 20". List items, table rows, headings, quotes and code fences are never touched.
+    - ``drop_near_duplicates``: every chunk gets a MinHash signature of its ``shingle_words``
+      word shingles, computed with NumPy for all shingles and hash functions at once; a
+      chunk whose estimated Jaccard similarity with an earlier kept chunk is at least
+      ``threshold`` is dropped.
+
+    Args:
+        threshold (float): Estimated Jaccard similarity from which a chunk counts as a duplicate.
+        num_perm (int): Hash functions of the MinHash signatures (precision of the estimate).
+        shingle_words (int): Words per shingle.
+        min_line_repeats (int): Occurrences from which a line counts as boilerplate.
+        max_line_chars (int): Longer lines are never treated as boilerplate.
+        edge_lines (int): Lines at the top and at the bottom of a page where headers and footers can be.
+        min_gap_lines (int): Boilerplate repeats no closer than this many lines apart.
+        seed (int): Seed of the hash functions, so results are repeatable.
+
+    Example:
+        >>> deduplicator = ChunkDeduplicator(threshold=0.85)
+        >>> text, removed_lines = deduplicator.strip_boilerplate(markdown_text)
+        >>> chunks, dropped = deduplicator.drop_near_duplicates(splitter.split_text(text))
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.85,
+        num_perm: int = 128,
+        shingle_words: int = 5,
+        min_line_repeats: int = 3,
+        max_line_chars: int = 200,
+        edge_lines: int = 2,
+        min_gap_lines: int = 5,
+        seed: int = 1
+    ):
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.shingle_words = max(1, shingle_words)
+        self.min_line_repeats = max(2, min_line_repeats)
+        self.max_line_chars = max_line_chars
+        self.edge_lines = max(1, edge_lines)
+        self.min_gap_lines = max(1, min_gap_lines)
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, 1 << 31, size=num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, 1 << 31, size=num_perm, dtype=np.uint64)
+
+    # ---------------------------------------------------------- boilerplate
+
+    def _edge_lines(self, lines: list) -> np.ndarray:
+        """
+        Where running headers and footers can be: the first and last ``edge_lines`` non-empty
+        lines of each page when the text has form-feed page breaks, else lines that form a
+        paragraph of their own.
+        """
+        edge = np.zeros(len(lines), dtype=bool)
+        if sum(line.count("\f") for line in lines) >= self.min_line_repeats - 1:
+            page = []
+            for i, line in enumerate(lines + ["\f"]):
+                if "\f" in line:
+                    edge[page[:self.edge_lines] + page[-self.edge_lines:]] = True
+                    page = []
+                if line.replace("\f", "").strip() and i < len(lines):
+                    page.append(i)
+            return edge
+        blank = np.array([not line.strip() for line in lines] + [True], dtype=bool)
+        before = np.concatenate(([True], blank[:-2]))
+        return ~blank[:-1] & before & blank[1:]
+
+    def _line_key(self, line: str):
+        """Comparison key of a boilerplate candidate, or None for lines never removed."""
+        stripped = line.replace("\f", "").strip()
+        if not stripped or len(stripped) > self.max_line_chars or _CONTENT_LINE.match(stripped):
+            return None
+        if not any(c.isalnum() for c in stripped):
+            return None
+        key = _SPACES.sub(" ", stripped.lower())
+        # Only page numbers are masked, so "Page 3 of 20" matches "Page 4 of 20" but
+        # "Step 3" never matches "Step 4".
+        return _DIGITS.sub("#", key) if _PAGE_NUMBER.search(key) else key
+
+    def strip_boilerplate(self, text: str) -> tuple:
+        """
+        Remove every occurrence but the first of running headers, footers and page numbers.
+
+        A line counts as one when it sits at the edge of a page (see ``_edge_lines``) at least
+        ``min_line_repeats`` times, never closer than ``min_gap_lines`` lines to its previous
+        occurrence.
+
+        Returns:
+            tuple[str, list[str]]: (text without the repeats, removed lines)
+        """
+        lines = text.split("\n")
+        edge = self._edge_lines(lines)
+        keys = [self._line_key(line) if at_edge else None for line, at_edge in zip(lines, edge)]
+        candidates = np.array([key is not None for key in keys], dtype=bool)
+        if candidates.sum() < self.min_line_repeats:
+            return text, []
+
+        _, first, inverse, counts = np.unique(
+            np.array([key or "" for key in keys]), return_index=True, return_inverse=True, return_counts=True
+        )
+        inverse = inverse.reshape(-1)
+        # Smallest distance between two occurrences of each key: content repeated close
+        # together (a refrain, a repeated caption) is not page furniture.
+        positions = np.nonzero(candidates)[0]
+        order = positions[np.argsort(inverse[positions], kind="stable")]
+        same = inverse[order][1:] == inverse[order][:-1]
+        min_gap = np.full(len(counts), np.iinfo(np.int64).max)
+        np.minimum.at(min_gap, inverse[order][1:][same], np.diff(order)[same])
+
+        repeated = candidates & (counts[inverse] >= self.min_line_repeats) & (min_gap[inverse] >= self.min_gap_lines)
+        remove = repeated & (np.arange(len(lines)) != first[inverse])
+        if not remove.any():
+            return text, []
+        removed = [line for line, drop in zip(lines, remove) if drop]
+        kept = [line for line, drop in zip(lines, remove) if not drop]
+        return "\n".join(kept), removed
+
+    # ------------------------------------------------------- near-duplicates
+
+    def _shingle_hashes(self, chunks: list) -> list:
+        """Per chunk, the 31-bit hashes of its word shingles (an empty array for empty chunks)."""
+        words = [_WORD.findall(chunk.lower()) for chunk in chunks]
+        _, ids = np.unique(np.array([w for chunk_words in words for w in chunk_words] or [""]), return_inverse=True)
+        ids = ids.reshape(-1).astype(np.uint64)
+        hashes, start = [], 0
+        for chunk_words in words:
+            chunk_ids = ids[start:start + len(chunk_words)]
+            start += len(chunk_words)
+            if len(chunk_ids) == 0:
+                hashes.append(np.empty(0, dtype=np.uint64))
+                continue
+            k = min(self.shingle_words, len(chunk_ids))
+            count = len(chunk_ids) - k + 1
+            # Polynomial hash of each window of k word ids (wrapping uint64 arithmetic).
+            h = np.zeros(count, dtype=np.uint64)
+            for j in range(k):
+                h = h * np.uint64(1_000_003) + chunk_ids[j:j + count]
+            hashes.append(np.unique((h ^ (h >> np.uint64(29))) & np.uint64(0x7FFFFFFF)))
+        return hashes
+
+    def signatures(self, chunks: list) -> np.ndarray:
+        """MinHash signatures, one row of ``num_perm`` values per chunk (all max for empty chunks)."""
+        signatures = np.full((len(chunks), self.num_perm), np.iinfo(np.uint64).max, dtype=np.uint64)
+        for i, shingles in enumerate(self._shingle_hashes(chunks)):
+            if len(shingles):
+                permuted = (self._a[:, None] * shingles[None, :] + self._b[:, None]) % _MERSENNE_61
+                signatures[i] = permuted.min(axis=1)
+        return signatures
+
+    def drop_near_duplicates(self, chunks: list) -> tuple:
+        """
+        Drop the chunks that are near-duplicates of an earlier chunk, and empty chunks.
+
+        Returns:
+            tuple[list[str], list[int]]: (kept chunks in order, indices of the dropped chunks)
+        """
+        if len(chunks) < 2:
+            return list(chunks), []
+        signatures = self.signatures(chunks)
+        empty = (signatures == np.iinfo(np.uint64).max).all(axis=1)
+        kept, dropped = [], []
+        for i in range(len(chunks)):
+            if empty[i]:
+                dropped.append(i)
+                continue
+            if kept:
+                similarity = (signatures[kept] == signatures[i]).mean(axis=1)
+                if similarity.max() >= self.threshold:
+                    log.debug(f"[Dedup] Chunk {i} ~ chunk {kept[int(similarity.argmax())]} ({similarity.max():.2f}), dropped.")
+                    dropped.append(i)
+                    continue
+            kept.append(i)
+        return [chunks[i] for i in kept], dropped
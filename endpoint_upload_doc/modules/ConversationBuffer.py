@@ -0,0 +1,91 @@
+import threading
+from collections import OrderedDict
+
+
+class ConversationBuffer:
+    """
+    Bounded, in-process ring buffer of an agent's most recent conversation messages.
+
+    Messages are the normalized dicts returned by ``AssistantWithFilesys.get_conversation``
+    (``id``, ``role``, ``content``, ``timestamp``). The buffer remembers the id of the
+    newest Letta message it has seen (of any type), which is used as the ``after``
+    cursor so each refresh only fetches messages that are actually new.
+
+    The buffered messages are always a contiguous slice of the most recent history.
+
+    Args:
+        maxlen (int): Maximum number of conversation messages kept.
+    """
+
+    def __init__(self, maxlen: int = 200):
+        self.maxlen = max(1, maxlen)
+        self.last_id = None
+        self.complete = False
+        self._messages = OrderedDict()
+        self._lock = threading.RLock()
+
+    @property
+    def lock(self):
+        """Lock held by callers while fetching and extending, so refreshes don't overlap."""
+        return self._lock
+
+    def __len__(self):
+        return len(self._messages)
+
+    def extend(self, messages: list, last_id: str = None, complete: bool = None):
+        """
+        Add messages (oldest → newest), skipping ones already buffered, and evict the oldest
+        beyond ``maxlen``.
+
+        Args:
+            messages (list[dict]): Normalized conversation messages.
+            last_id (str, optional): Newest Letta message id seen, used as the next cursor.
+            complete (bool, optional): Whether the buffer now starts at the very first message.
+        """
+        with self._lock:
+            for message in messages:
+                key = (message.get("id"), message["role"])
+                if key not in self._messages:
+                    self._messages[key] = message
+            while len(self._messages) > self.maxlen:
+                self._messages.popitem(last=False)
+                self.complete = False
+            if last_id is not None:
+                self.last_id = last_id
+            if complete is not None and len(self._messages) < self.maxlen:
+                self.complete = complete
+
+    def recent(self, limit: int) -> list:
+        """The newest ``limit`` messages, oldest → newest."""
+        with self._lock:
+            messages = list(self._messages.values())
+        return messages[-limit:] if limit > 0 else []
+
+    def oldest(self):
+        """The oldest buffered message, or None when empty."""
+        with self._lock:
+            return next(iter(self._messages.values()), None)
+
+    def page_before(self, message_id: str, limit: int):
+        """
+        Up to ``limit`` messages older than ``message_id``, oldest → newest.
+
+        Returns:
+            list[dict] | None: The page, or None if the buffer can't answer it (unknown
+            cursor, or not enough buffered history) and Letta must be queried.
+        """
+        with self._lock:
+            messages = list(self._messages.values())
+        ids = [m.get("id") for m in messages]
+        if message_id not in ids:
+            return None
+        older = messages[:ids.index(message_id)]
+        if len(older) < limit and not self.complete:
+            return None
+        return older[-limit:] if limit > 0 else []
+
+    def clear(self):
+        with self._lock:
+            self._messages.clear()
+            self.last_id = None
+            self.complete = False
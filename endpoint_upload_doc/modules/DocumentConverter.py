@@ -0,0 +1,223 @@
+import logging
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+log = logging.getLogger(__name__)
+
+
+class ConversionError(Exception):
+    """A document could not be converted to Markdown."""
+
+
+class DocumentTooLargeError(ConversionError):
+    """The document is larger than the configured maximum size."""
+
+
+class ConversionTimeoutError(ConversionError):
+    """The conversion took longer than the configured wall-clock limit."""
+
+
+# ---------------------------------------------------------------- worker side
+
+_markitdown = None
+
+
+def _rss_bytes() -> int:
+    """Resident set size of the current process."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        import psutil
+        return psutil.Process().memory_info().rss
+
+
+def _watch_memory(max_rss_bytes: int, interval: float = 0.2):
+    """Kill this worker as soon as its RSS goes over the limit (RLIMIT_RSS is not enforced by Linux)."""
+    while True:
+        rss = _rss_bytes()
+        if rss > max_rss_bytes:
+            log.error(f"[Convert] Worker {os.getpid()} over memory limit ({rss // 2**20} MB), exiting.")
+            os._exit(70)
+        time.sleep(interval)
+
+
+def _init_worker(max_rss_bytes: int):
+    global _markitdown
+    from markitdown import MarkItDown
+
+    # The API process handles termination; workers only convert.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    _markitdown = MarkItDown()
+    if max_rss_bytes:
+        threading.Thread(target=_watch_memory, args=(max_rss_bytes,), daemon=True).start()
+
+
+def _on_alarm(signum, frame):
+    raise TimeoutError("conversion time limit exceeded")
+
+
+def _root_cause(error: BaseException, types: tuple):
+    """The first exception of ``types`` in the cause/context chain of ``error``, or None."""
+    seen = set()
+    while error is not None and id(error) not in seen:
+        if isinstance(error, types):
+            return error
+        seen.add(id(error))
+        error = error.__cause__ or error.__context__
+    return None
+
+
+def _convert_in_worker(path: str, timeout: float) -> str:
+    signal.signal(signal.SIGALRM, _on_alarm)
+    if timeout:
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        return _markitdown.convert(path).text_content
+    except Exception as e:
+        # MarkItDown wraps converter errors in its own exceptions: look for the alarm or
+        # memory error underneath.
+        cause = _root_cause(e, (TimeoutError, MemoryError))
+        if isinstance(cause, TimeoutError):
+            raise ConversionTimeoutError(f"Conversion exceeded the {timeout:.0f}s time limit") from None
+        if isinstance(cause, MemoryError):
+            raise ConversionError("Conversion ran out of memory") from None
+        raise
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+
+
+# ---------------------------------------------------------------- API side
+
+class DocumentConverter:
+    """
+    Converts documents to Markdown with MarkItDown in a set of isolated worker processes.
+
+    Each worker is a single-process pool that converts one document at a time, so a
+    huge or malformed file can only take down its own worker, never the API process or
+    the conversions running next to it: each worker is killed when its resident memory
+    goes over ``max_rss_mb``, each conversion is interrupted after ``timeout`` seconds
+    (and its worker killed if it does not respond), and workers are recycled after
+    ``max_tasks_per_child`` conversions to return fragmented memory to the OS. Up to
+    ``workers`` uploads are converted in parallel; further conversions wait for a free
+    worker.
+
+    Args:
+        workers (int): Number of worker processes.
+        max_rss_mb (int): Resident memory limit per worker, in MB (0 disables it).
+        timeout (float): Wall-clock limit per conversion, in seconds.
+        max_tasks_per_child (int): Conversions handled by a worker before it is replaced.
+        max_file_mb (int): Documents larger than this are rejected without being converted.
+
+    Example:
+        >>> converter = DocumentConverter(workers=2)
+        >>> markdown = converter.convert("/tmp/paper.pdf")
+    """
+
+    def __init__(
+        self,
+        workers: int = 2,
+        max_rss_mb: int = 2048,
+        timeout: float = 300.0,
+        max_tasks_per_child: int = 20,
+        max_file_mb: int = 100
+    ):
+        self.workers = max(1, workers)
+        self.max_rss_bytes = max(0, max_rss_mb) * 2**20
+        self.timeout = timeout
+        self.max_tasks_per_child = max(1, max_tasks_per_child)
+        self.max_file_bytes = max_file_mb * 2**20
+        # Idle workers (None: not started yet); a conversion takes one out while it runs.
+        self._idle = queue.LifoQueue()
+        for _ in range(self.workers):
+            self._idle.put(None)
+        self._started = set()
+        self._lock = threading.Lock()
+
+    def _context(self):
+        """Forkserver (or spawn) workers don't inherit the API process' threads and locks."""
+        methods = multiprocessing.get_all_start_methods()
+        if "forkserver" in methods:
+            ctx = multiprocessing.get_context("forkserver")
+            # Don't re-import the application's __main__ in the fork server.
+            ctx.set_forkserver_preload([__name__])
+            return ctx
+        return multiprocessing.get_context("spawn")
+
+    def _start_worker(self) -> ProcessPoolExecutor:
+        worker = ProcessPoolExecutor(
+            max_workers=1,
+            mp_context=self._context(),
+            initializer=_init_worker,
+            initargs=(self.max_rss_bytes,),
+            max_tasks_per_child=self.max_tasks_per_child,
+        )
+        with self._lock:
+            self._started.add(worker)
+        return worker
+
+    def _discard_worker(self, worker: ProcessPoolExecutor, kill: bool = False):
+        """Drop a broken or stuck worker; its slot starts a fresh one on next use."""
+        with self._lock:
+            self._started.discard(worker)
+        if kill:
+            for process in list((getattr(worker, "_processes", None) or {}).values()):
+                process.kill()
+        worker.shutdown(wait=False, cancel_futures=True)
+
+    def convert(self, path: str) -> str:
+        """
+        Convert the document at ``path`` to Markdown in a worker process of its own.
+
+        Raises:
+            DocumentTooLargeError: The file is over ``max_file_mb``.
+            ConversionTimeoutError: The conversion took longer than ``timeout``.
+            ConversionError: The conversion failed, or the worker died (e.g. memory limit).
+        """
+        size = os.path.getsize(path)
+        if size > self.max_file_bytes:
+            raise DocumentTooLargeError(
+                f"Document is {size / 2**20:.1f} MB, the limit is {self.max_file_bytes / 2**20:.0f} MB"
+            )
+
+        worker = self._idle.get()
+        try:
+            if worker is None:
+                worker = self._start_worker()
+            try:
+                future = worker.submit(_convert_in_worker, path, self.timeout)
+            except BrokenProcessPool:
+                # The idle worker died since its last conversion (e.g. killed from outside).
+                self._discard_worker(worker)
+                worker = self._start_worker()
+                future = worker.submit(_convert_in_worker, path, self.timeout)
+
+            try:
+                # The worker interrupts itself at `timeout`; the grace period covers code
+                # that can't be interrupted (e.g. stuck in a C extension).
+                return future.result(timeout=self.timeout + 10 if self.timeout else None)
+            except FutureTimeoutError:
+                log.warning(f"[Convert] Worker did not stop after {self.timeout:.0f}s, killing it.")
+                self._discard_worker(worker, kill=True)
+                worker = None
+                raise ConversionTimeoutError(f"Conversion exceeded the {self.timeout:.0f}s time limit")
+            except BrokenProcessPool:
+                self._discard_worker(worker)
+                worker = None
+                limit = f" of {self.max_rss_bytes // 2**20} MB" if self.max_rss_bytes else ""
+                raise ConversionError(f"Conversion worker died (memory limit{limit} exceeded or crash)")
+        finally:
+            self._idle.put(worker)
+
+    def shutdown(self):
+        with self._lock:
+            workers, self._started = self._started, set()
+        for worker in workers:
+            worker.shutdown(wait=False, cancel_futures=True)
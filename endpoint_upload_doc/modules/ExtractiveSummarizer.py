@@ -0,0 +1,173 @@
+import logging
+import re
+
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+_WORD = re.compile(r"[^\W\d_]{3,}")
+# End of a sentence: . ! or ? (optionally closed by a quote/bracket) at the end of a line,
+# or followed by a capital or digit.
+_SENTENCE_END = re.compile(r"(?<=[.!?])[\"')\]]*(?:[ \t]*\n\s*|\s+(?=[\"'(\[]?[A-Z0-9]))")
+_MARKUP_LINE = re.compile(r"^\s*(#|\||```|~~~|<|!\[|---|\*\*\*|===)")
+_LIST_MARKER = re.compile(r"^\s*(?:[-*+]|\d+[.)])\s+")
+
+
+class ExtractiveSummarizer:
+    """
+    Local TextRank summarizer: picks the most central sentences of a text, no LLM needed.
+
+    Sentences become TF-IDF vectors (words hashed into ``features`` dimensions, built
+    with NumPy), the cosine similarities between them form a graph, and PageRank on that
+    graph scores each sentence by how much of the rest of the text it sums up. The best
+    sentences are returned in document order. A summary takes milliseconds, so it serves
+    as a fast summary mode, as the fallback when the LLM is unavailable, and to shrink
+    chunks before an abstractive reduce.
+
+    Long inputs are ranked in blocks of at most ``max_block_sentences`` sentences (the
+    similarity matrix is quadratic); the best sentences of every block are then ranked
+    together.
+
+    Args:
+        max_sentences (int): Sentences of a summary.
+        min_words (int): Shorter sentences (headings, captions, stray fragments) are never picked.
+        damping (float): PageRank damping factor.
+        max_iterations (int): PageRank iterations at most.
+        tolerance (float): PageRank stops once the scores move less than this (L1).
+        features (int): Dimensions words are hashed into.
+        max_block_sentences (int): Sentences ranked together at most.
+        max_sentence_words (int): Longer runs without sentence punctuation (OCR output, lists
+            run together) are cut into pieces of this many words.
+
+    Example:
+        >>> extractive = ExtractiveSummarizer(max_sentences=12)
+        >>> summary = extractive.summarize(markdown_text)
+        >>> shorter_chunk = extractive.summarize(chunk, max_sentences=6)
+    """
+
+    def __init__(
+        self,
+        max_sentences: int = 15,
+        min_words: int = 5,
+        damping: float = 0.85,
+        max_iterations: int = 100,
+        tolerance: float = 1e-6,
+        features: int = 4096,
+        max_block_sentences: int = 1500,
+        max_sentence_words: int = 80
+    ):
+        self.max_sentences = max(1, max_sentences)
+        self.min_words = min_words
+        self.damping = damping
+        self.max_iterations = max_iterations
+        self.tolerance = tolerance
+        self.features = features
+        self.max_block_sentences = max(2, max_block_sentences)
+        self.max_sentence_words = max(self.min_words, max_sentence_words)
+
+    def split_sentences(self, text: str) -> list:
+        """Sentences of the prose in ``text``; Markdown headings, tables, code and rules are skipped."""
+        sentences = []
+        in_code = False
+        for paragraph in re.split(r"\n\s*\n", text):
+            lines = []
+            for line in paragraph.split("\n"):
+                if line.lstrip().startswith(("```", "~~~")):
+                    in_code = not in_code
+                    continue
+                if in_code or _MARKUP_LINE.match(line):
+                    continue
+                lines.append(_LIST_MARKER.sub("", line).strip())
+            prose = "\n".join(line for line in lines if line)
+            for sentence in _SENTENCE_END.split(prose):
+                words = sentence.split()
+                for start in range(0, len(words), self.max_sentence_words):
+                    sentences.append(" ".join(words[start:start + self.max_sentence_words]))
+        return sentences
+
+    def _vectors(self, sentences: list) -> np.ndarray:
+        """L2-normalized TF-IDF rows, one per sentence."""
+        words = [_WORD.findall(sentence.lower()) for sentence in sentences]
+        lengths = np.array([len(w) for w in words])
+        flat = [w for sentence_words in words for w in sentence_words]
+        vectors = np.zeros((len(sentences), min(self.features, max(1, len(set(flat))))), dtype=np.float32)
+        if not flat:
+            return vectors
+        _, ids = np.unique(np.array(flat), return_inverse=True)
+        rows = np.repeat(np.arange(len(sentences)), lengths)
+        np.add.at(vectors, (rows, ids.reshape(-1) % vectors.shape[1]), 1.0)
+        document_frequency = (vectors > 0).sum(axis=0)
+        idf = np.log((1 + len(sentences)) / (1 + document_frequency)) + 1
+        vectors = np.log1p(vectors) * idf
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms == 0, 1, norms)
+
+    def rank(self, sentences: list) -> np.ndarray:
+        """TextRank score of each sentence (summing to 1)."""
+        n = len(sentences)
+        if n <= 2:
+            return np.full(n, 1.0 / max(1, n))
+        vectors = self._vectors(sentences)
+        similarity = vectors @ vectors.T
+        np.fill_diagonal(similarity, 0)
+        np.clip(similarity, 0, None, out=similarity)
+        # Row-stochastic transition matrix; sentences similar to nothing link to every sentence.
+        totals = similarity.sum(axis=1, keepdims=True)
+        transition = np.where(totals > 0, similarity / np.where(totals == 0, 1, totals), 1.0 / n)
+        scores = np.full(n, 1.0 / n)
+        for _ in range(self.max_iterations):
+            updated = (1 - self.damping) / n + self.damping * (transition.T @ scores)
+            converged = np.abs(updated - scores).sum() < self.tolerance
+            scores = updated
+            if converged:
+                break
+        return scores
+
+    def _select(self, sentences: list, count: int) -> list:
+        """The ``count`` best sentences, in document order."""
+        if len(sentences) <= count:
+            return list(sentences)
+        scores = self.rank(sentences)
+        best = np.sort(np.argsort(-scores, kind="stable")[:count])
+        return [sentences[i] for i in best]
+
+    def extract(self, text: str, max_sentences: int = None) -> list:
+        """The ``max_sentences`` most central sentences of ``text``, in document order."""
+        count = max_sentences or self.max_sentences
+        candidates = [s for s in self.split_sentences(text) if len(s.split()) >= self.min_words]
+        while len(candidates) > self.max_block_sentences:
+            # Keep the best of each block, then rank the survivors together.
+            block = self.max_block_sentences
+            keep = min(max(count, block // 10), block // 2)
+            candidates = [
+                sentence
+                for start in range(0, len(candidates), block)
+                for sentence in self._select(candidates[start:start + block], keep)
+            ]
+        return self._select(candidates, count)
+
+    def summarize(self, text: str, max_sentences: int = None) -> str:
+        """Extractive summary of ``text``: its most central sentences, in document order."""
+        return " ".join(self.extract(text, max_sentences))
+
+    def summarize_chunks(self, chunks: list, max_sentences: int = None, on_chunk=None) -> str:
+        """
+        Extractive summary of a text split into ``chunks``: the best sentences of each chunk
+        (overlapping sentences counted once) are ranked together.
+
+        Args:
+            chunks (list[str]): Consecutive chunks of the text.
+            max_sentences (int, optional): Sentences of the summary.
+            on_chunk (callable, optional): Called with (index, extract) for each chunk.
+        """
+        count = max_sentences or self.max_sentences
+        candidates, seen = [], set()
+        for index, chunk in enumerate(chunks):
+            extracted = self.extract(chunk, count)
+            if on_chunk is not None:
+                on_chunk(index, " ".join(extracted))
+            for sentence in extracted:
+                if sentence not in seen:
+                    seen.add(sentence)
+                    candidates.append(sentence)
+        return " ".join(self._select(candidates, count))
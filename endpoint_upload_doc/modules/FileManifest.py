@@ -0,0 +1,187 @@
+import hashlib
+import logging
+import threading
+import time
+
+from sqlalchemy import (
+    Column, Float, Integer, MetaData, PrimaryKeyConstraint, String, Table, create_engine, delete, insert, select, update
+)
+
+log = logging.getLogger(__name__)
+
+
+class FileManifest:
+    """
+    In-memory manifest of the files uploaded to each Letta folder.
+
+    An entry is a dict with ``folder_id``, ``filename``, ``content_hash`` (sha256 of the
+    uploaded bytes), ``file_id``, ``size`` and ``updated_at``, keyed on (folder_id,
+    filename). ``AssistantWithFilesys`` uses it to skip re-uploads of a file whose content
+    didn't change, so Letta doesn't chunk and embed the same document twice.
+
+    This backend is process-local; use :class:`SqlFileManifest` to share the manifest
+    between workers or replicas and keep it across restarts.
+    """
+
+    FIELDS = ("folder_id", "filename", "content_hash", "file_id", "size", "updated_at")
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._reconciled = set()
+        self._reconcile_lock = threading.Lock()
+
+    @staticmethod
+    def hash_content(content: bytes) -> str:
+        return hashlib.sha256(content).hexdigest()
+
+    def _normalize(self, entry: dict) -> dict:
+        entry = {field: entry.get(field) for field in self.FIELDS}
+        if entry["updated_at"] is None:
+            entry["updated_at"] = time.time()
+        return entry
+
+    def put(self, entry: dict):
+        """Insert or replace the entry for (``entry["folder_id"]``, ``entry["filename"]``)."""
+        entry = self._normalize(entry)
+        with self._lock:
+            self._entries[(entry["folder_id"], entry["filename"])] = entry
+
+    def get(self, folder_id: str, filename: str):
+        """Return the entry for ``filename`` in ``folder_id`` or None."""
+        with self._lock:
+            entry = self._entries.get((folder_id, filename))
+            return dict(entry) if entry else None
+
+    def list(self, folder_id: str) -> list:
+        """Return the entries of ``folder_id``, oldest first."""
+        with self._lock:
+            entries = [dict(e) for (f, _), e in self._entries.items() if f == folder_id]
+        return sorted(entries, key=lambda e: e["updated_at"])
+
+    def delete(self, folder_id: str, filename: str):
+        with self._lock:
+            self._entries.pop((folder_id, filename), None)
+
+    def reconcile(self, client, folder_id: str, page_size: int = 100) -> dict:
+        """
+        Bring the manifest of ``folder_id`` in line with the files actually in Letta.
+
+        Entries whose file no longer exists are dropped, and files the manifest doesn't
+        know (uploaded before it existed, or by another tool) are registered by name
+        without a hash: the next upload under that name replaces them instead of adding
+        a copy. Runs once per folder per process; later calls return immediately.
+
+        Returns:
+            dict: {"added": int, "removed": int}, or {} when already reconciled.
+        """
+        with self._reconcile_lock:
+            if folder_id in self._reconciled:
+                return {}
+            self._reconciled.add(folder_id)
+
+        files = {}
+        after = None
+        try:
+            while True:
+                page = client.folders.files.list(folder_id=folder_id, order="asc", limit=page_size, after=after)
+                for f in page:
+                    files[f.id] = f
+                if len(page) < page_size:
+                    break
+                after = page[-1].id
+        except Exception:
+            with self._reconcile_lock:
+                self._reconciled.discard(folder_id)
+            raise
+
+        known = self.list(folder_id)
+        known_ids = {e["file_id"] for e in known}
+        known_names = {e["filename"] for e in known}
+        removed = 0
+        for entry in known:
+            if entry["file_id"] not in files:
+                self.delete(folder_id, entry["filename"])
+                removed += 1
+        added = 0
+        for file_id, f in files.items():
+            name = getattr(f, "original_file_name", None) or getattr(f, "file_name", None)
+            if file_id in known_ids or not name or name in known_names:
+                continue
+            self.put({
+                "folder_id": folder_id,
+                "filename": name,
+                "content_hash": None,
+                "file_id": file_id,
+                "size": getattr(f, "file_size", None),
+            })
+            known_names.add(name)
+            added += 1
+        if added or removed:
+            log.info(f"[Manifest] Folder {folder_id}: registered {added} existing file(s), dropped {removed} stale entries.")
+        return {"added": added, "removed": removed}
+
+
+class SqlFileManifest(FileManifest):
+    """
+    File manifest stored in a SQL database through SQLAlchemy.
+
+    Takes the same URLs as :class:`SqlAgentRegistry`, and can live in the same database.
+
+    Args:
+        url (str): SQLAlchemy database URL.
+    """
+
+    def __init__(self, url: str):
+        super().__init__()
+        self.url = url
+        connect_args = {"timeout": 30} if url.startswith("sqlite") else {}
+        self.engine = create_engine(url, pool_pre_ping=True, connect_args=connect_args)
+        self.metadata = MetaData()
+        self.table = Table(
+            "assistant_folder_files",
+            self.metadata,
+            Column("folder_id", String(255), nullable=False),
+            Column("filename", String(1024), nullable=False),
+            Column("content_hash", String(64)),
+            Column("file_id", String(255), nullable=False),
+            Column("size", Integer),
+            Column("updated_at", Float, nullable=False),
+            PrimaryKeyConstraint("folder_id", "filename"),
+        )
+        self.metadata.create_all(self.engine)
+
+    def _key(self, folder_id: str, filename: str):
+        return (self.table.c.folder_id == folder_id) & (self.table.c.filename == filename)
+
+    def put(self, entry: dict):
+        entry = self._normalize(entry)
+        with self.engine.begin() as conn:
+            updated = conn.execute(
+                update(self.table).where(self._key(entry["folder_id"], entry["filename"])).values(**entry)
+            ).rowcount
+            if not updated:
+                conn.execute(insert(self.table).values(**entry))
+
+    def get(self, folder_id: str, filename: str):
+        with self.engine.connect() as conn:
+            row = conn.execute(select(self.table).where(self._key(folder_id, filename))).mappings().first()
+        return dict(row) if row else None
+
+    def list(self, folder_id: str) -> list:
+        with self.engine.connect() as conn:
+            rows = conn.execute(
+                select(self.table).where(self.table.c.folder_id == folder_id).order_by(self.table.c.updated_at)
+            ).mappings().all()
+        return [dict(row) for row in rows]
+
+    def delete(self, folder_id: str, filename: str):
+        with self.engine.begin() as conn:
+            conn.execute(delete(self.table).where(self._key(folder_id, filename)))
+
+
+def create_manifest(url: str = None) -> FileManifest:
+    """Build the manifest backend for ``url`` ("memory" or empty for the in-memory one)."""
+    if not url or url == "memory":
+        return FileManifest()
+    return SqlFileManifest(url)
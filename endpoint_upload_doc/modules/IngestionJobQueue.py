@@ -0,0 +1,262 @@
+import logging
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from .Telemetry import Telemetry
+
+log = logging.getLogger(__name__)
+
+
+class IngestionError(Exception):
+    """
+    Error raised by an ingestion stage.
+
+    Carries the HTTP status code the synchronous upload endpoint should answer with,
+    so the same stage functions can back both the blocking and the job-based mode.
+    """
+
+    def __init__(self, message: str, status_code: int = 500):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class QueueFullError(RuntimeError):
+    """Raised when a job is submitted while the ingestion queue is at capacity."""
+
+
+class IngestionJob:
+    """
+    State of a single ingestion job.
+
+    Attributes:
+        job_id (str): Unique identifier returned to the client.
+        status (str): One of {"queued", "running", "completed", "failed"}.
+        stage (str | None): Name of the stage currently running (or the one that failed).
+        stages_done (list[str]): Stages that finished successfully, in order.
+        metadata (dict): Small, JSON-serializable info about the job (agent_id, filename...).
+        result (Any): Return value of the last stage once completed (only the queue's
+            ``result_fields`` of it, when set).
+        error (str | None): Error message when the job failed.
+    """
+
+    def __init__(self, payload, stage_names, metadata=None):
+        self.job_id = uuid.uuid4().hex
+        self.payload = payload
+        self.stage_names = list(stage_names)
+        self.metadata = dict(metadata or {})
+        self.status = "queued"
+        self.stage = None
+        self.stages_done = []
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    @property
+    def progress(self) -> float:
+        """Fraction of stages completed, between 0 and 1."""
+        if not self.stage_names:
+            return 1.0
+        return len(self.stages_done) / len(self.stage_names)
+
+    def to_dict(self) -> dict:
+        """JSON-serializable view of the job (the raw payload is never exposed)."""
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "stage": self.stage,
+            "stages": self.stage_names,
+            "stages_done": list(self.stages_done),
+            "progress": round(self.progress, 3),
+            "metadata": self.metadata,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class IngestionJobQueue:
+    """
+    Bounded job queue running a fixed pipeline of stages on a pool of worker threads.
+
+    Each stage is a callable taking the output of the previous stage (the job payload
+    for the first one). The output of the last stage becomes the job result. Every
+    stage has its own concurrency limit shared by queued jobs and by callers of
+    :meth:`run`, so a burst of uploads can not starve the process of threads or
+    saturate a single backend (e.g. the LLM during summarization).
+
+    Args:
+        stages (list[tuple[str, Callable]]): Ordered (name, function) pairs.
+        workers (int): Number of worker threads consuming the queue.
+        max_queue (int): Maximum number of jobs waiting to be picked up.
+        stage_concurrency (dict[str, int], optional): Max concurrent executions per stage.
+            Stages not listed are limited by the number of workers only.
+        max_finished (int): Number of finished jobs kept for status queries.
+        result_fields (tuple[str], optional): Keys of a dict result kept in the finished job, so
+            finished records don't hold large payloads (e.g. the Markdown text) until evicted.
+            The whole result is kept when omitted.
+        telemetry (Telemetry, optional): Receives the ``ingest.<stage>`` spans and queue wait times.
+            Defaults to the process-wide telemetry.
+
+    Example:
+        >>> jobs = IngestionJobQueue([("double", lambda x: 2 * x)], workers=1)
+        >>> job = jobs.submit(21)
+        >>> jobs.get(job.job_id).to_dict()["status"]
+    """
+
+    def __init__(
+        self,
+        stages,
+        workers: int = 2,
+        max_queue: int = 16,
+        stage_concurrency: dict = None,
+        max_finished: int = 500,
+        result_fields: tuple = None,
+        telemetry: Telemetry = None
+    ):
+        if not stages:
+            raise ValueError("At least one ingestion stage is required.")
+        self.stages = list(stages)
+        self.workers = max(1, workers)
+        self.max_queue = max(1, max_queue)
+        self.max_finished = max_finished
+        self.result_fields = tuple(result_fields) if result_fields is not None else None
+        self.stage_concurrency = dict(stage_concurrency or {})
+        self.telemetry = telemetry or Telemetry.default()
+        self._stage_limits = {
+            name: threading.BoundedSemaphore(max(1, limit))
+            for name, limit in self.stage_concurrency.items()
+        }
+        self._queue = queue.Queue(maxsize=self.max_queue)
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._threads = []
+        self._started = False
+
+    @property
+    def stage_names(self) -> list:
+        return [name for name, _ in self.stages]
+
+    def start(self):
+        """Start the worker threads (idempotent)."""
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+            for i in range(self.workers):
+                t = threading.Thread(target=self._worker, name=f"ingest-worker-{i}", daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    def submit(self, payload, metadata: dict = None) -> IngestionJob:
+        """
+        Enqueue a payload for the pipeline and return its job immediately.
+
+        Raises:
+            QueueFullError: If ``max_queue`` jobs are already waiting.
+        """
+        self.start()
+        job = IngestionJob(payload, self.stage_names, metadata)
+        with self._lock:
+            self._jobs[job.job_id] = job
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            with self._lock:
+                self._jobs.pop(job.job_id, None)
+            raise QueueFullError(
+                f"Ingestion queue is full ({self.max_queue} jobs waiting), retry later."
+            )
+        return job
+
+    def run(self, payload, job: IngestionJob = None):
+        """
+        Run the pipeline synchronously in the calling thread, honouring stage limits.
+
+        Returns:
+            The output of the last stage.
+        """
+        value = payload
+        for name, fn in self.stages:
+            if job is not None:
+                job.stage = name
+            limit = self._stage_limits.get(name)
+            if limit is None:
+                with self.telemetry.span(f"ingest.{name}"):
+                    value = fn(value)
+            else:
+                with limit, self.telemetry.span(f"ingest.{name}"):
+                    value = fn(value)
+            if job is not None:
+                job.stages_done.append(name)
+        return value
+
+    def get(self, job_id: str):
+        """Return the job with this id, or None if unknown (or already evicted)."""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list_jobs(self, **metadata_filter) -> list:
+        """Return all known jobs, newest first, optionally filtered on metadata values."""
+        with self._lock:
+            jobs = list(self._jobs.values())
+        jobs = [
+            j for j in jobs
+            if all(j.metadata.get(k) == v for k, v in metadata_filter.items())
+        ]
+        return list(reversed(jobs))
+
+    def stats(self) -> dict:
+        """Queue depth, job counts per status and configured limits."""
+        with self._lock:
+            counts = {}
+            for job in self._jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+        return {
+            "queued": self._queue.qsize(),
+            "max_queue": self.max_queue,
+            "workers": self.workers,
+            "stage_concurrency": self.stage_concurrency,
+            "jobs": counts,
+        }
+
+    def _worker(self):
+        while True:
+            job = self._queue.get()
+            try:
+                job.status = "running"
+                job.started_at = time.time()
+                self.telemetry.stage_duration.observe(job.started_at - job.created_at, stage="ingest.queued", status="ok")
+                job.result = self._finished_result(self.run(job.payload, job=job))
+                job.status = "completed"
+            except Exception as e:
+                log.error(f"[Ingest] Job {job.job_id} failed during '{job.stage}': {e}")
+                job.error = str(e)
+                job.status = "failed"
+            finally:
+                job.payload = None
+                job.finished_at = time.time()
+                self._queue.task_done()
+                self._evict_finished()
+
+    def _finished_result(self, result):
+        """The part of ``result`` kept in the finished job."""
+        if self.result_fields is None or not isinstance(result, dict):
+            return result
+        return {key: result[key] for key in self.result_fields if key in result}
+
+    def _evict_finished(self):
+        """Drop the oldest finished jobs beyond ``max_finished``."""
+        with self._lock:
+            finished = [
+                job_id for job_id, job in self._jobs.items()
+                if job.status in ("completed", "failed")
+            ]
+            for job_id in finished[:max(0, len(finished) - self.max_finished)]:
+                del self._jobs[job_id]
@@ -0,0 +1,186 @@
+import atexit
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+from letta_client import AsyncLetta, Letta
+
+from .MetadataCache import MetadataCache
+from .RateLimiter import RateLimiter
+from .Telemetry import Telemetry
+
+log = logging.getLogger(__name__)
+
+
+class LettaClientPool:
+    """
+    Process-wide Letta clients and background executor shared by all assistants.
+
+    One ``Letta`` client (and therefore one HTTP connection pool) is kept per server
+    URL, however many ``AssistantWithFilesys`` instances exist, and background work
+    such as upload polling runs on a single bounded thread pool. Both are closed on
+    interpreter exit.
+
+    Async code gets one ``AsyncLetta`` client per server URL from ``async_client``; it
+    must be used from a single event loop (the one of the async entry point) and is
+    closed with ``aclose`` when that loop stops.
+
+    Args:
+        max_connections (int): Maximum open connections per Letta server.
+        max_keepalive_connections (int): Idle connections kept alive per Letta server.
+        keepalive_expiry (float): Seconds an idle connection is kept alive.
+        timeout (float): Request timeout in seconds.
+        background_workers (int): Threads of the shared background executor.
+        telemetry (Telemetry, optional): Counts and times every HTTP call to Letta, and receives
+            the spans of the assistants using this pool. Defaults to the process-wide telemetry.
+        metadata_cache (MetadataCache, optional): TTL cache of Letta metadata (name lookups,
+            embedding and model configs) shared by the assistants using this pool. Defaults to
+            the process-wide cache.
+        rate_limiter (RateLimiter, optional): LLM request/token budget that chat messages are sent
+            within. Defaults to the process-wide limiter, also used by the summarizer.
+
+    Example:
+        >>> pool = LettaClientPool.default()
+        >>> client = pool.client("http://letta_server:8283")
+        >>> pool.executor.submit(print, "runs in the background")
+    """
+
+    _default = None
+    _default_lock = threading.Lock()
+
+    def __init__(
+        self,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 30.0,
+        timeout: float = 60.0,
+        background_workers: int = 8,
+        telemetry: Telemetry = None,
+        metadata_cache: MetadataCache = None,
+        rate_limiter: RateLimiter = None
+    ):
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.timeout = timeout
+        self.background_workers = background_workers
+        self.telemetry = telemetry or Telemetry.default()
+        self.metadata_cache = metadata_cache or MetadataCache.default()
+        self.rate_limiter = rate_limiter or RateLimiter.default()
+        self._clients = {}
+        self._http_clients = []
+        self._async_clients = {}
+        self._async_http_clients = []
+        self._executor = None
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+
+    @classmethod
+    def from_env(cls):
+        """Build a pool configured from LETTA_* environment variables."""
+        return cls(
+            max_connections=int(os.environ.get("LETTA_MAX_CONNECTIONS", 100)),
+            max_keepalive_connections=int(os.environ.get("LETTA_MAX_KEEPALIVE_CONNECTIONS", 20)),
+            keepalive_expiry=float(os.environ.get("LETTA_KEEPALIVE_EXPIRY", 30)),
+            timeout=float(os.environ.get("LETTA_TIMEOUT", 60)),
+            background_workers=int(os.environ.get("LETTA_BACKGROUND_WORKERS", 8)),
+        )
+
+    @classmethod
+    def default(cls):
+        """The process-wide pool, created from the environment on first use."""
+        with cls._default_lock:
+            if cls._default is None:
+                cls._default = cls.from_env()
+                atexit.register(cls._default.shutdown)
+            return cls._default
+
+    @property
+    def running(self) -> bool:
+        """False once the pool is shut down or the interpreter is exiting.
+
+        Long-running background tasks should check this and return, so the executor
+        threads can be joined at exit.
+        """
+        return not self._closed.is_set() and threading.main_thread().is_alive()
+
+    def client(self, base_url: str) -> Letta:
+        """Return the shared Letta client for ``base_url``."""
+        key = base_url.rstrip("/")
+        with self._lock:
+            if self._closed.is_set():
+                raise RuntimeError("Letta client pool is shut down.")
+            client = self._clients.get(key)
+            if client is None:
+                http_client = httpx.Client(
+                    limits=self.limits,
+                    timeout=self.timeout,
+                    follow_redirects=True,
+                    event_hooks=self.telemetry.httpx_event_hooks(),
+                )
+                self._http_clients.append(http_client)
+                client = Letta(base_url=base_url, httpx_client=http_client)
+                self._clients[key] = client
+            return client
+
+    def async_client(self, base_url: str) -> AsyncLetta:
+        """Return the shared AsyncLetta client for ``base_url`` (for the running event loop)."""
+        key = base_url.rstrip("/")
+        with self._lock:
+            if self._closed.is_set():
+                raise RuntimeError("Letta client pool is shut down.")
+            client = self._async_clients.get(key)
+            if client is None:
+                http_client = httpx.AsyncClient(
+                    limits=self.limits,
+                    timeout=self.timeout,
+                    follow_redirects=True,
+                    event_hooks=self.telemetry.httpx_event_hooks(asynchronous=True),
+                )
+                self._async_http_clients.append(http_client)
+                client = AsyncLetta(base_url=base_url, httpx_client=http_client)
+                self._async_clients[key] = client
+            return client
+
+    async def aclose(self):
+        """Close the async HTTP connection pools (call before the event loop stops)."""
+        with self._lock:
+            http_clients, self._async_http_clients = self._async_http_clients, []
+            self._async_clients = {}
+        for http_client in http_clients:
+            try:
+                await http_client.aclose()
+            except Exception as e:
+                log.warning(f"[Letta] Error closing async HTTP client: {e}")
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        """The shared, bounded executor for background work."""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.background_workers,
+                    thread_name_prefix="letta-bg",
+                )
+            return self._executor
+
+    def shutdown(self):
+        """Stop background work and close every HTTP connection pool (idempotent)."""
+        with self._lock:
+            if self._closed.is_set():
+                return
+            self._closed.set()
+            executor, self._executor = self._executor, None
+            http_clients, self._http_clients = self._http_clients, []
+            self._clients = {}
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+        for http_client in http_clients:
+            try:
+                http_client.close()
+            except Exception as e:
+                log.warning(f"[Letta] Error closing HTTP client: {e}")
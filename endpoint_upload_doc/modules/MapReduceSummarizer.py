@@ -0,0 +1,436 @@
+import asyncio
+import logging
+import math
+import threading
+import time
+import weakref
+
+import tiktoken
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from .ChunkDeduplicator import ChunkDeduplicator
+from .ExtractiveSummarizer import ExtractiveSummarizer
+from .RateLimiter import RateLimiter
+from .Telemetry import Telemetry
+
+log = logging.getLogger(__name__)
+
+
+class MapReduceSummarizer:
+    """
+    Token-aware, bounded-concurrency map-reduce summarizer.
+
+    With a ``deduplicator``, repeated boilerplate lines (running headers, footers, page
+    numbers) are removed before the split and near-duplicate chunks after it, so they
+    never reach the map prompt; the tokens removed are logged and reported through
+    ``on_event``. The text is split into chunks measured in tokens of the target model. The
+    tokenizer is loaded on first use (tiktoken downloads it once into ``TIKTOKEN_CACHE_DIR``);
+    while it can't be loaded, tokens are estimated as ``CHARS_PER_TOKEN`` characters. Each chunk is
+    summarized by the map prompt, with at most ``max_concurrency`` LLM calls in flight
+    per event loop, and within the budget of the shared ``RateLimiter``, which retries
+    transient failures with backoff. A chunk that still fails doesn't cancel the others:
+    the failed chunks are retried once more after the rest are done, and only then is an
+    error raised (the summaries that succeeded are kept in the cache for the next
+    attempt). The chunk summaries are then packed into reduce prompts that fit in
+    ``reduce_max_tokens``; if they don't fit in a single prompt they are reduced
+    recursively (a reduce tree) until a single summary remains.
+
+    Everything that would block the event loop (tokenizing, splitting, deduplicating,
+    extracting, and the SQLite lookups of the cache) runs in worker threads, so one large
+    document doesn't stall the other requests served by the loop.
+
+    With an ``extractive`` summarizer, three modes are available (``mode`` sets the
+    default, ``summarize`` takes one per call): ``abstractive`` (LLM map and reduce),
+    ``hybrid`` (each chunk is shrunk to its most central sentences locally, then only the
+    reduce goes to the LLM) and ``extractive`` (no LLM at all). LLM modes fall back to the
+    extractive summary when the rate limiter would make the call wait more than
+    ``fallback_max_wait`` seconds, or when the LLM call fails; after a failure the LLM is
+    skipped for ``fallback_cooldown`` seconds.
+
+    Args:
+        llm: LangChain chat model exposing ``ainvoke``.
+        model_name (str): Model name, used for the tokenizer and for cache keys.
+        map_template (str): System prompt for the map step, with a ``{context}`` variable.
+        reduce_template (str): System prompt for the reduce step, with a ``{summaries}`` variable.
+        chunk_tokens (int): Maximum tokens per map chunk.
+        chunk_overlap_tokens (int): Token overlap between consecutive chunks.
+        reduce_max_tokens (int): Maximum tokens of fragments packed in one reduce prompt.
+        max_concurrency (int): Maximum concurrent LLM calls per event loop.
+        cache (SummaryCache, optional): Cache consulted before every LLM call.
+        max_reduce_depth (int): Levels of the reduce tree before fragments are truncated to fit.
+        telemetry (Telemetry, optional): Receives the split/map/reduce spans and LLM token counts.
+            Defaults to the process-wide telemetry.
+        rate_limiter (RateLimiter, optional): Request/token budget and retry policy of the LLM calls.
+            Defaults to the process-wide limiter.
+        output_tokens_estimate (int): Completion tokens reserved per call until the usage is known.
+        deduplicator (ChunkDeduplicator, optional): Removes boilerplate lines and near-duplicate
+            chunks before the map step. No deduplication when omitted.
+        extractive (ExtractiveSummarizer, optional): Local summarizer of the ``hybrid`` and
+            ``extractive`` modes and of the fallback. Only ``abstractive`` is available without it.
+        mode (str): Default mode, one of ``MODES``.
+        fallback (bool): Fall back to the extractive summary when the LLM is rate-limited or failing.
+        fallback_max_wait (float): Expected rate-limit wait, in seconds, from which the LLM is skipped.
+        fallback_cooldown (float): Seconds the LLM is skipped after a failed summary.
+        shrink_sentences (int): Sentences kept per chunk in ``hybrid`` mode.
+
+    Example:
+        >>> summarizer = MapReduceSummarizer(llm, "gpt-4o-mini", MAP_TEMPLATE, REDUCE_TEMPLATE)
+        >>> summary = await summarizer.summarize(markdown_text)
+    """
+
+    MODES = ("abstractive", "hybrid", "extractive")
+    CHARS_PER_TOKEN = 4
+    ENCODING_RETRY_INTERVAL = 300.0
+
+    def __init__(
+        self,
+        llm,
+        model_name: str,
+        map_template: str,
+        reduce_template: str,
+        chunk_tokens: int = 16000,
+        chunk_overlap_tokens: int = 200,
+        reduce_max_tokens: int = 24000,
+        max_concurrency: int = 4,
+        cache=None,
+        max_reduce_depth: int = 6,
+        telemetry: Telemetry = None,
+        rate_limiter: RateLimiter = None,
+        output_tokens_estimate: int = 500,
+        deduplicator: ChunkDeduplicator = None,
+        extractive: ExtractiveSummarizer = None,
+        mode: str = "abstractive",
+        fallback: bool = True,
+        fallback_max_wait: float = 30.0,
+        fallback_cooldown: float = 60.0,
+        shrink_sentences: int = 12
+    ):
+        self.llm = llm
+        self.model_name = model_name
+        self.map_template = map_template
+        self.reduce_template = reduce_template
+        self.map_prompt = ChatPromptTemplate.from_messages([("system", map_template)])
+        self.reduce_prompt = ChatPromptTemplate.from_messages([("system", reduce_template)])
+        self.chunk_tokens = chunk_tokens
+        self.reduce_max_tokens = reduce_max_tokens
+        self.max_concurrency = max(1, max_concurrency)
+        self.cache = cache
+        self.max_reduce_depth = max_reduce_depth
+        self.telemetry = telemetry or Telemetry.default()
+        self.rate_limiter = rate_limiter or RateLimiter.default()
+        self.output_tokens_estimate = output_tokens_estimate
+        self.deduplicator = deduplicator
+        self.extractive = extractive
+        self.mode = self.check_mode(mode)
+        self.fallback = fallback
+        self.fallback_max_wait = fallback_max_wait
+        self.fallback_cooldown = fallback_cooldown
+        self.shrink_sentences = shrink_sentences
+        self._llm_down_until = 0.0
+        self._encoding = None
+        self._encoding_retry_at = 0.0
+        self._encoding_lock = threading.Lock()
+        self.text_splitter = RecursiveCharacterTextSplitter(
+            chunk_size=chunk_tokens,
+            chunk_overlap=chunk_overlap_tokens,
+            length_function=self.count_tokens,
+        )
+        # asyncio primitives are bound to one loop; keep one semaphore per loop.
+        self._semaphores = weakref.WeakKeyDictionary()
+
+    def check_mode(self, mode: str) -> str:
+        """Return ``mode`` normalized, or raise ValueError if this summarizer can't run it."""
+        mode = (mode or "").strip().lower()
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown summary mode '{mode}', expected one of {', '.join(self.MODES)}.")
+        if mode != "abstractive" and self.extractive is None:
+            raise ValueError(f"Summary mode '{mode}' needs an extractive summarizer.")
+        return mode
+
+    @staticmethod
+    def _get_encoding(model_name: str):
+        """Tokenizer of the target model, falling back to o200k_base for unknown models."""
+        try:
+            return tiktoken.encoding_for_model(model_name)
+        except KeyError:
+            return tiktoken.get_encoding("o200k_base")
+
+    @property
+    def encoding(self):
+        """The tokenizer, loaded on first use; None while it can't be loaded (e.g. offline)."""
+        if self._encoding is None and time.monotonic() >= self._encoding_retry_at:
+            with self._encoding_lock:
+                if self._encoding is None and time.monotonic() >= self._encoding_retry_at:
+                    try:
+                        self._encoding = self._get_encoding(self.model_name)
+                    except Exception as e:
+                        log.warning(
+                            f"[Summarize] Tokenizer of {self.model_name} unavailable, estimating "
+                            f"{self.CHARS_PER_TOKEN} characters per token: {e}"
+                        )
+                        self._encoding_retry_at = time.monotonic() + self.ENCODING_RETRY_INTERVAL
+        return self._encoding
+
+    def count_tokens(self, text: str) -> int:
+        encoding = self.encoding
+        if encoding is None:
+            return math.ceil(len(text) / self.CHARS_PER_TOKEN)
+        return len(encoding.encode(text, disallowed_special=()))
+
+    def split(self, text: str) -> list:
+        """Split text into chunks of at most ``chunk_tokens`` tokens."""
+        return self.text_splitter.split_text(text)
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._semaphores[loop] = semaphore
+        return semaphore
+
+    def _lookup(self, kind: str, template: str, text: str) -> tuple:
+        """(cache key, cached summary or None, token estimate) of one prompt; blocking."""
+        key = cached = None
+        if self.cache is not None:
+            key = self.cache.make_key(kind, self.model_name, template, text)
+            cached = self.cache.get(key, kind=kind)
+        if cached is not None:
+            return key, cached, 0
+        estimate = self.count_tokens(template) + self.count_tokens(text) + self.output_tokens_estimate
+        return key, None, estimate
+
+    async def _call(self, kind: str, prompt_template, template: str, variable: str, text: str) -> str:
+        """Run one prompt through the LLM (or the cache), bounded by the semaphore."""
+        key, cached, estimate = await asyncio.to_thread(self._lookup, kind, template, text)
+        if cached is not None:
+            return cached
+        prompt = prompt_template.invoke({variable: text})
+        async with self._semaphore():
+            with self.telemetry.span(f"llm.{kind}", model=self.model_name):
+                response = await self.rate_limiter.call(lambda: self.llm.ainvoke(prompt), tokens=estimate)
+        self.telemetry.record_usage(self.model_name, kind, response)
+        usage = getattr(response, "usage_metadata", None) or {}
+        self.rate_limiter.settle(estimate, usage.get("total_tokens"))
+        if self.cache is not None:
+            await asyncio.to_thread(self.cache.put, key, response.content, kind)
+        return response.content
+
+    async def _map_chunk(self, index: int, chunk: str, count: int, on_event=None) -> str:
+        summary = await self._call("map", self.map_prompt, self.map_template, "context", chunk)
+        if on_event is not None:
+            on_event("chunk_summary", {"index": index, "count": count, "summary": summary})
+        return summary
+
+    async def _map_chunks(self, chunks: list, indices: list, count: int, on_event=None) -> list:
+        """Summaries of ``chunks`` in order, with the exception in place of a chunk that failed."""
+        return await asyncio.gather(
+            *(self._map_chunk(index, chunk, count, on_event) for index, chunk in zip(indices, chunks)),
+            return_exceptions=True,
+        )
+
+    async def map(self, chunks: list, on_event=None) -> list:
+        """
+        Summarize every chunk, returning the summaries in chunk order.
+
+        ``on_event("chunk_summary", {"index", "count", "summary"})`` is called as soon as
+        each chunk is summarized, in completion order.
+        """
+        with self.telemetry.span("summarize.map", chunks=len(chunks)):
+            summaries = await self._map_chunks(chunks, list(range(len(chunks))), len(chunks), on_event)
+            failed = [i for i, summary in enumerate(summaries) if isinstance(summary, Exception)]
+            if failed:
+                log.warning(f"[Summarize] {len(failed)}/{len(chunks)} chunks failed, retrying them: {summaries[failed[0]]}")
+                retried = await self._map_chunks([chunks[i] for i in failed], failed, len(chunks), on_event)
+                for i, summary in zip(failed, retried):
+                    summaries[i] = summary
+                failed = [i for i in failed if isinstance(summaries[i], Exception)]
+            if failed:
+                raise RuntimeError(
+                    f"{len(failed)} of {len(chunks)} chunks could not be summarized: {summaries[failed[0]]}"
+                ) from summaries[failed[0]]
+            return summaries
+
+    async def reduce(self, fragments: list) -> str:
+        """Condense fragments into one summary, recursing while they don't fit in one prompt."""
+        with self.telemetry.span("summarize.reduce", fragments=len(fragments)):
+            return await self._reduce_tree(fragments)
+
+    async def _reduce_tree(self, fragments: list) -> str:
+        depth = 0
+        while True:
+            batches = await asyncio.to_thread(self._pack, fragments)
+            if len(batches) == 1 or depth >= self.max_reduce_depth:
+                if len(batches) > 1:
+                    log.warning(f"[Summarize] Reduce depth limit reached, truncating {len(fragments)} fragments.")
+                    batches = [await asyncio.to_thread(self._truncate_all, fragments)]
+                return await self._reduce_batch(batches[0])
+            log.info(f"[Summarize] Reduce level {depth}: {len(fragments)} fragments in {len(batches)} batches.")
+            fragments = await asyncio.gather(*(self._reduce_batch(batch) for batch in batches))
+            depth += 1
+
+    async def _reduce_batch(self, batch: list) -> str:
+        return await self._call(
+            "reduce", self.reduce_prompt, self.reduce_template, "summaries", "\n".join(batch)
+        )
+
+    def _truncate(self, text: str, max_tokens: int) -> str:
+        encoding = self.encoding
+        if encoding is None:
+            return text[:max_tokens * self.CHARS_PER_TOKEN]
+        tokens = encoding.encode(text, disallowed_special=())
+        if len(tokens) <= max_tokens:
+            return text
+        return encoding.decode(tokens[:max_tokens])
+
+    def _truncate_all(self, fragments: list) -> list:
+        """Truncate every fragment to an equal share of the reduce budget."""
+        share = max(1, self.reduce_max_tokens // max(1, len(fragments)))
+        return [self._truncate(f, share) for f in fragments]
+
+    def _pack(self, fragments: list) -> list:
+        """Greedily group consecutive fragments into batches of at most ``reduce_max_tokens``."""
+        batches, current, current_tokens = [], [], 0
+        for fragment in fragments:
+            tokens = self.count_tokens(fragment)
+            if tokens > self.reduce_max_tokens:
+                fragment = self._truncate(fragment, self.reduce_max_tokens)
+                tokens = self.reduce_max_tokens
+            if current and current_tokens + tokens > self.reduce_max_tokens:
+                batches.append(current)
+                current, current_tokens = [], 0
+            current.append(fragment)
+            current_tokens += tokens
+        if current:
+            batches.append(current)
+        return batches
+
+    def deduplicate(self, text: str) -> tuple:
+        """
+        Split ``text`` into chunks without its boilerplate lines and near-duplicate chunks.
+
+        Returns:
+            tuple[list[str], dict]: (chunks, {"boilerplate_lines", "duplicate_chunks",
+            "boilerplate_tokens", "duplicate_tokens", "tokens_removed"})
+        """
+        text, removed_lines = self.deduplicator.strip_boilerplate(text)
+        all_chunks = self.split(text)
+        chunks, dropped = self.deduplicator.drop_near_duplicates(all_chunks)
+        boilerplate_tokens = self.count_tokens("\n".join(removed_lines)) if removed_lines else 0
+        duplicate_tokens = sum(self.count_tokens(all_chunks[i]) for i in dropped)
+        return chunks, {
+            "boilerplate_lines": len(removed_lines),
+            "duplicate_chunks": len(dropped),
+            "boilerplate_tokens": boilerplate_tokens,
+            "duplicate_tokens": duplicate_tokens,
+            "tokens_removed": boilerplate_tokens + duplicate_tokens,
+        }
+
+    def _fallback_reason(self, chunks: list):
+        """Why the LLM should be skipped for these chunks right now, or None."""
+        if self.extractive is None or not self.fallback:
+            return None
+        if time.monotonic() < self._llm_down_until:
+            return "llm_unavailable"
+        # Every chunk but the last is about as large as the first.
+        tokens = min(self.chunk_tokens, self.count_tokens(chunks[0])) + self.output_tokens_estimate
+        if self.rate_limiter.wait_estimate(tokens) > self.fallback_max_wait:
+            return "rate_limited"
+        return None
+
+    async def _extract(self, chunks: list, on_event=None, emitted: set = frozenset()) -> str:
+        """Extractive summary of ``chunks``, computed off the event loop; ``emitted`` chunks aren't reported again."""
+        def on_chunk(index, extract):
+            if on_event is not None and index not in emitted:
+                loop.call_soon_threadsafe(on_event, "chunk_summary", {"index": index, "count": len(chunks), "summary": extract})
+
+        loop = asyncio.get_running_loop()
+        with self.telemetry.span("summarize.extract", chunks=len(chunks)):
+            return await asyncio.to_thread(self.extractive.summarize_chunks, chunks, None, on_chunk)
+
+    async def _shrink(self, chunks: list, on_event=None) -> list:
+        """Each chunk reduced to its ``shrink_sentences`` most central sentences (hybrid map step)."""
+        with self.telemetry.span("summarize.shrink", chunks=len(chunks)):
+            extracts = await asyncio.to_thread(
+                lambda: [self.extractive.summarize(chunk, self.shrink_sentences) or chunk for chunk in chunks]
+            )
+        if on_event is not None:
+            for index, extract in enumerate(extracts):
+                on_event("chunk_summary", {"index": index, "count": len(chunks), "summary": extract})
+        return extracts
+
+    async def summarize(self, text: str, on_event=None, mode: str = None) -> str:
+        """
+        Split, deduplicate, map and (tree-)reduce ``text`` into a single summary.
+
+        Args:
+            text (str): Text to summarize.
+            on_event (callable, optional): Called with (event, data) as the work progresses, so
+                callers can stream partial results: ``dedup`` (the counts of ``deduplicate``,
+                with a deduplicator), ``chunks`` ({"count"}) after the split, ``chunk_summary``
+                ({"index", "count", "summary"}) as each chunk is summarized (once per chunk, also
+                when the extractive fallback takes over halfway), and ``summary``
+                ({"summary", "mode", "fallback"}) with the final summary, the mode that produced
+                it and, when the extractive summary replaced the LLM, why.
+            mode (str, optional): One of ``MODES``; defaults to ``self.mode``.
+        """
+        mode = self.check_mode(mode) if mode else self.mode
+        emitted = set()
+        if on_event is not None:
+            # Chunks already reported by the LLM path, not to be reported again by a fallback.
+            def on_event(event, data, forward=on_event):
+                if event == "chunk_summary":
+                    emitted.add(data["index"])
+                forward(event, data)
+
+        with self.telemetry.span("summarize", chars=len(text), mode=mode):
+            if self.deduplicator is None:
+                with self.telemetry.span("summarize.split"):
+                    chunks = await asyncio.to_thread(self.split, text)
+            else:
+                with self.telemetry.span("summarize.deduplicate"):
+                    chunks, removed = await asyncio.to_thread(self.deduplicate, text)
+                self.telemetry.record_dedup(removed["boilerplate_tokens"], removed["duplicate_tokens"])
+                if removed["tokens_removed"]:
+                    log.info(
+                        f"[Summarize] Removed {removed['tokens_removed']} tokens: {removed['boilerplate_lines']} "
+                        f"boilerplate lines, {removed['duplicate_chunks']} near-duplicate chunks."
+                    )
+                if on_event is not None:
+                    on_event("dedup", removed)
+            if on_event is not None:
+                on_event("chunks", {"count": len(chunks)})
+
+            fallback = None
+            if not chunks:
+                summary = ""
+            else:
+                log.info(f"[Summarize] {len(chunks)} chunks of up to {self.chunk_tokens} tokens ({mode}).")
+                if mode != "extractive":
+                    fallback = await asyncio.to_thread(self._fallback_reason, chunks)
+                if mode == "extractive" or fallback:
+                    summary = await self._extract(chunks, on_event)
+                else:
+                    try:
+                        if mode == "hybrid":
+                            summaries = await self._shrink(chunks, on_event)
+                        else:
+                            summaries = await self.map(chunks, on_event=on_event)
+                        summary = await self.reduce(summaries)
+                    except Exception as e:
+                        if self.extractive is None or not self.fallback:
+                            raise
+                        log.warning(f"[Summarize] LLM summary failed, using the extractive summary: {e}")
+                        self._llm_down_until = time.monotonic() + self.fallback_cooldown
+                        fallback = "llm_error"
+                        summary = await self._extract(chunks, on_event, set(emitted))
+                if fallback:
+                    log.info(f"[Summarize] Extractive fallback ({fallback}).")
+            if on_event is not None:
+                on_event("summary", {
+                    "summary": summary,
+                    "mode": "extractive" if fallback else mode,
+                    "fallback": fallback,
+                })
+            return summary
@@ -0,0 +1,215 @@
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+class _Flight:
+    """A load in progress, awaited by the callers asking for the same key meanwhile."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class MetadataCache:
+    """
+    Process-wide TTL cache for Letta metadata that rarely changes.
+
+    Values are grouped in namespaces, each with its own time to live, e.g. embedding
+    configs, model lists, agent/folder lookups by name, folder file listings. A value
+    is loaded with ``get_or_load(namespace, key, loader)``; while a load runs, every
+    other caller asking for the same key waits for its result instead of sending the
+    same request to Letta (single flight), in threads or, with ``aget_or_load``, in
+    tasks of one event loop. ``None`` results (e.g. "no agent with this name") are not
+    cached, so the next lookup asks again. Code that creates, renames or deletes
+    something calls ``put`` or ``invalidate`` so lookups don't return stale data.
+
+    At most ``max_entries`` values are kept; the least recently used go first.
+
+    Args:
+        ttl (float): Seconds a value is served, for namespaces without their own TTL.
+        ttls (dict, optional): Time to live per namespace, in seconds.
+        max_entries (int): Values kept over all namespaces.
+
+    Example:
+        >>> cache = MetadataCache(ttl=300, ttls={"folder_files": 2})
+        >>> configs = cache.get_or_load("embedding_configs", base_url, client.models.embeddings.list)
+        >>> cache.invalidate("agent_by_name", (base_url, "research_helper"))
+    """
+
+    _default = None
+    _default_lock = threading.Lock()
+
+    def __init__(self, ttl: float = 300.0, ttls: dict = None, max_entries: int = 10000):
+        self.ttl = ttl
+        self.ttls = dict(ttls or {})
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._flights = {}
+        self._async_flights = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        """Build a cache configured from METADATA_CACHE_* environment variables."""
+        return cls(
+            ttl=float(os.environ.get("METADATA_CACHE_TTL", 300)),
+            ttls={"folder_files": float(os.environ.get("METADATA_CACHE_FILES_TTL", 2))},
+            max_entries=int(os.environ.get("METADATA_CACHE_MAX_ENTRIES", 10000)),
+        )
+
+    @classmethod
+    def default(cls):
+        """The process-wide cache, created from the environment on first use."""
+        with cls._default_lock:
+            if cls._default is None:
+                cls._default = cls.from_env()
+            return cls._default
+
+    def _count(self, namespace: str, counter: str):
+        counters = self._counters.setdefault(namespace, {"hits": 0, "misses": 0, "coalesced": 0, "invalidations": 0})
+        counters[counter] += 1
+
+    def _lookup(self, namespace: str, key):
+        """(True, value) for a fresh entry, else (False, None). Call with the lock held."""
+        entry = self._entries.get((namespace, key))
+        if entry is None:
+            return False, None
+        value, expires_at = entry
+        if expires_at < time.monotonic():
+            del self._entries[(namespace, key)]
+            return False, None
+        self._entries.move_to_end((namespace, key))
+        return True, value
+
+    def _store(self, namespace: str, key, value, ttl: float = None):
+        """Store ``value`` unless it is None. Call with the lock held."""
+        if value is None:
+            return
+        ttl = ttl if ttl is not None else self.ttls.get(namespace, self.ttl)
+        self._entries[(namespace, key)] = (value, time.monotonic() + ttl)
+        self._entries.move_to_end((namespace, key))
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get(self, namespace: str, key, default=None):
+        """The cached value, or ``default`` if missing or expired (never loads)."""
+        with self._lock:
+            found, value = self._lookup(namespace, key)
+        return value if found else default
+
+    def put(self, namespace: str, key, value, ttl: float = None):
+        """Store a value known to be current, e.g. an agent just created."""
+        with self._lock:
+            self._store(namespace, key, value, ttl)
+
+    def invalidate(self, namespace: str, key=None):
+        """Drop ``key`` from ``namespace``, or the whole namespace when ``key`` is None."""
+        with self._lock:
+            if key is None:
+                for entry_key in [k for k in self._entries if k[0] == namespace]:
+                    del self._entries[entry_key]
+            else:
+                self._entries.pop((namespace, key), None)
+            self._count(namespace, "invalidations")
+
+    def get_or_load(self, namespace: str, key, loader, ttl: float = None):
+        """
+        Return the cached value of ``key``, or load it with ``loader()`` (once, however
+        many threads ask concurrently) and cache it.
+
+        Exceptions of the loader are raised in every waiting caller and nothing is cached.
+        """
+        with self._lock:
+            found, value = self._lookup(namespace, key)
+            if found:
+                self._count(namespace, "hits")
+                return value
+            flight = self._flights.get((namespace, key))
+            leader = flight is None
+            if leader:
+                flight = self._flights[(namespace, key)] = _Flight()
+                self._count(namespace, "misses")
+            else:
+                self._count(namespace, "coalesced")
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = loader()
+        except BaseException as e:
+            flight.error = e
+            raise
+        else:
+            with self._lock:
+                self._store(namespace, key, flight.value, ttl)
+            return flight.value
+        finally:
+            with self._lock:
+                self._flights.pop((namespace, key), None)
+            flight.done.set()
+
+    async def aget_or_load(self, namespace: str, key, loader, ttl: float = None):
+        """
+        Async ``get_or_load``: ``loader()`` returns an awaitable, and concurrent tasks of
+        the running event loop share one load.
+        """
+        flight_key = (namespace, key, id(asyncio.get_running_loop()))
+        with self._lock:
+            found, value = self._lookup(namespace, key)
+            if found:
+                self._count(namespace, "hits")
+                return value
+            future = self._async_flights.get(flight_key)
+            leader = future is None
+            if leader:
+                future = self._async_flights[flight_key] = asyncio.get_running_loop().create_future()
+                self._count(namespace, "misses")
+            else:
+                self._count(namespace, "coalesced")
+
+        if not leader:
+            # Shielded, so a cancelled waiter doesn't cancel the load of the others.
+            return await asyncio.shield(future)
+
+        try:
+            value = await loader()
+        except BaseException as e:
+            if isinstance(e, asyncio.CancelledError):
+                future.cancel()
+            elif not future.done():
+                future.set_exception(e)
+                # Retrieved here so an exception nobody waited for isn't logged as unhandled.
+                future.exception()
+            raise
+        else:
+            with self._lock:
+                self._store(namespace, key, value, ttl)
+            future.set_result(value)
+            return value
+        finally:
+            with self._lock:
+                self._async_flights.pop(flight_key, None)
+
+    def stats(self) -> dict:
+        """Entries, and hit/miss/coalesced/invalidation counts per namespace."""
+        with self._lock:
+            entries = {}
+            for namespace, _ in self._entries:
+                entries[namespace] = entries.get(namespace, 0) + 1
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "namespaces": {
+                    namespace: {"entries": entries.get(namespace, 0), **counters}
+                    for namespace, counters in sorted(self._counters.items())
+                },
+            }
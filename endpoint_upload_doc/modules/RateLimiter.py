@@ -0,0 +1,339 @@
+import asyncio
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+
+import httpx
+
+from .Telemetry import Telemetry
+
+log = logging.getLogger(__name__)
+
+# Statuses worth another attempt: rate limits, timeouts, conflicts and server errors.
+TRANSIENT_STATUSES = {408, 409, 425, 429, 500, 502, 503, 504}
+
+# Connection/timeout errors of the OpenAI and LangChain clients, matched by name so the
+# limiter doesn't import every SDK.
+TRANSIENT_ERROR_NAMES = {"APIConnectionError", "APITimeoutError", "ServiceUnavailableError", "InternalServerError"}
+
+
+def _status_code(error):
+    for candidate in (error, getattr(error, "response", None)):
+        for attr in ("status_code", "status"):
+            value = getattr(candidate, attr, None)
+            if isinstance(value, int):
+                return value
+    return None
+
+
+def _retry_after(error):
+    """Seconds the provider asked to wait (Retry-After / retry-after-ms headers), if any."""
+    headers = getattr(getattr(error, "response", None), "headers", None) or getattr(error, "headers", None)
+    if not headers:
+        return None
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except (TypeError, ValueError):
+        return None
+    return None
+
+
+class RateLimiter:
+    """
+    Process-wide token-bucket limiter for LLM calls, with retries and jittered backoff.
+
+    Two buckets hold the requests-per-minute and tokens-per-minute budgets of the
+    provider; each refills continuously at a sixtieth of its budget per second. A call
+    reserves one request and its estimated tokens up front. When a bucket runs dry the
+    reservation still goes through but the caller waits until the bucket has refilled to
+    cover it, so concurrent callers are served in arrival order at the provider's rate
+    instead of all firing and collecting 429s. ``settle`` corrects the estimate with the
+    usage the provider reported. A budget of 0 disables that bucket.
+
+    ``call`` / ``call_sync`` wrap an LLM call: wait for the budget, run it, and retry
+    transient failures (429, 5xx, timeouts, connection errors) with exponential backoff
+    and jitter, honouring ``Retry-After``. A 429 also pauses every other caller of the
+    limiter for the backoff delay. Non-idempotent calls (e.g. a chat message, which the
+    server may have stored before failing) are only retried on 429.
+
+    Buckets are per process; :class:`SqliteRateLimiter` shares them between the workers
+    of one host.
+
+    Args:
+        requests_per_minute (int): Request budget; 0 for no limit.
+        tokens_per_minute (int): Token budget (prompt + completion); 0 for no limit.
+        max_retries (int): Retries of a failing call before its error is raised.
+        backoff_base (float): Delay before the first retry, in seconds; doubles on each retry.
+        backoff_max (float): Upper bound of the retry delay, in seconds.
+        telemetry (Telemetry, optional): Receives the ``llm.rate_limit_wait`` and ``llm.retry_wait``
+            durations. Defaults to the process-wide telemetry.
+
+    Example:
+        >>> limiter = RateLimiter(requests_per_minute=500, tokens_per_minute=200_000)
+        >>> response = await limiter.call(lambda: llm.ainvoke(prompt), tokens=1200)
+        >>> limiter.settle(1200, response.usage_metadata["total_tokens"])
+    """
+
+    _default = None
+    _default_lock = threading.Lock()
+
+    def __init__(
+        self,
+        requests_per_minute: int = 0,
+        tokens_per_minute: int = 0,
+        max_retries: int = 5,
+        backoff_base: float = 1.0,
+        backoff_max: float = 60.0,
+        telemetry: Telemetry = None
+    ):
+        self.capacities = {"requests": float(requests_per_minute), "tokens": float(tokens_per_minute)}
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.telemetry = telemetry or Telemetry.default()
+        self._state = {"levels": dict(self.capacities), "updated": time.time(), "paused_until": 0.0}
+        self._counters = {"calls": 0, "throttled": 0, "waited_s": 0.0, "retries": 0, "rate_limited": 0, "failed": 0}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        """Build the limiter configured by the LLM_* environment variables."""
+        kwargs = dict(
+            requests_per_minute=int(os.environ.get("LLM_RATE_LIMIT_RPM", 0)),
+            tokens_per_minute=int(os.environ.get("LLM_RATE_LIMIT_TPM", 0)),
+            max_retries=int(os.environ.get("LLM_MAX_RETRIES", 5)),
+            backoff_base=float(os.environ.get("LLM_BACKOFF_BASE", 1)),
+            backoff_max=float(os.environ.get("LLM_BACKOFF_MAX", 60)),
+        )
+        path = os.environ.get("LLM_RATE_LIMIT_DB")
+        return SqliteRateLimiter(path, **kwargs) if path else cls(**kwargs)
+
+    @classmethod
+    def default(cls):
+        """The process-wide limiter, created from the environment on first use."""
+        with cls._default_lock:
+            if cls._default is None:
+                cls._default = RateLimiter.from_env()
+            return cls._default
+
+    # ------------------------------------------------------------ buckets
+
+    def _apply(self, state: dict, costs: dict, now: float) -> float:
+        """
+        Refill the buckets of ``state`` up to ``now``, take ``costs`` out of them and
+        return how long the caller must wait for its reservation to be covered.
+        """
+        elapsed = max(0.0, now - state["updated"])
+        state["updated"] = now
+        delay = max(0.0, state["paused_until"] - now)
+        for name, cost in costs.items():
+            capacity = self.capacities[name]
+            if not capacity:
+                continue
+            rate = capacity / 60
+            level = min(capacity, state["levels"].get(name, capacity) + elapsed * rate)
+            # A single call larger than the whole budget waits for a full bucket, not forever.
+            level = min(capacity, level - min(cost, capacity))
+            state["levels"][name] = level
+            if level < 0:
+                delay = max(delay, -level / rate)
+        return delay
+
+    def _reserve(self, costs: dict) -> float:
+        with self._lock:
+            return self._apply(self._state, costs, time.time())
+
+    def _pause_until(self, until: float):
+        with self._lock:
+            self._state["paused_until"] = max(self._state["paused_until"], until)
+
+    def reserve(self, tokens: int = 0) -> float:
+        """Reserve one request and ``tokens``; returns the seconds to wait before sending it."""
+        delay = self._reserve({"requests": 1, "tokens": max(0, tokens)})
+        with self._lock:
+            self._counters["calls"] += 1
+            if delay > 0:
+                self._counters["throttled"] += 1
+                self._counters["waited_s"] += delay
+        if delay > 0:
+            self.telemetry.stage_duration.observe(delay, stage="llm.rate_limit_wait", status="ok")
+        return delay
+
+    def settle(self, estimated_tokens: int, actual_tokens: int):
+        """Charge (or refund) the difference between a reservation's estimate and the actual usage."""
+        if actual_tokens is None or actual_tokens == estimated_tokens:
+            return
+        self._reserve({"tokens": actual_tokens - estimated_tokens})
+
+    def wait_estimate(self, tokens: int = 0) -> float:
+        """Seconds a call of ``tokens`` would wait for the budget right now (nothing is reserved)."""
+        return self._apply(self._snapshot(), {"requests": 1, "tokens": max(0, tokens)}, time.time())
+
+    def pause(self, seconds: float):
+        """Hold every caller back for ``seconds`` (after the provider said we are over the limit)."""
+        self._pause_until(time.time() + seconds)
+
+    async def acquire(self, tokens: int = 0):
+        """Wait (without blocking the loop) until a request of ``tokens`` fits in the budget."""
+        delay = self.reserve(tokens)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def acquire_sync(self, tokens: int = 0):
+        """Blocking ``acquire``, for calls made from worker threads."""
+        delay = self.reserve(tokens)
+        if delay > 0:
+            time.sleep(delay)
+
+    # ------------------------------------------------------------ retries
+
+    def is_transient(self, error: Exception) -> bool:
+        status = _status_code(error)
+        if status is not None:
+            return status in TRANSIENT_STATUSES
+        return (
+            isinstance(error, (TimeoutError, ConnectionError, httpx.TransportError))
+            or type(error).__name__ in TRANSIENT_ERROR_NAMES
+        )
+
+    def _retry_delay(self, error: Exception, attempt: int, idempotent: bool):
+        """Seconds to wait before retrying after ``error``, or None to give up."""
+        rate_limited = _status_code(error) == 429
+        if attempt >= self.max_retries or not (rate_limited or (idempotent and self.is_transient(error))):
+            with self._lock:
+                self._counters["failed"] += 1
+            return None
+        backoff = min(self.backoff_max, self.backoff_base * 2 ** attempt)
+        delay = random.uniform(backoff / 2, backoff)
+        retry_after = _retry_after(error)
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.backoff_max))
+        with self._lock:
+            self._counters["retries"] += 1
+            if rate_limited:
+                self._counters["rate_limited"] += 1
+        if rate_limited:
+            self.pause(delay)
+        self.telemetry.stage_duration.observe(delay, stage="llm.retry_wait", status="ok")
+        log.warning(f"[RateLimit] {type(error).__name__} ({_status_code(error)}), retry {attempt + 1}/{self.max_retries} in {delay:.1f}s: {error}")
+        return delay
+
+    async def call(self, fn, tokens: int = 0, idempotent: bool = True):
+        """
+        Await ``fn()`` within the budget, retrying transient failures.
+
+        Args:
+            fn (callable): Returns the awaitable to run; called again on every attempt.
+            tokens (int): Estimated tokens of the call (prompt + completion).
+            idempotent (bool): Whether failures other than 429 may be retried.
+        """
+        attempt = 0
+        while True:
+            await self.acquire(tokens)
+            try:
+                return await fn()
+            except Exception as e:
+                delay = self._retry_delay(e, attempt, idempotent)
+                if delay is None:
+                    raise
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    def call_sync(self, fn, tokens: int = 0, idempotent: bool = True):
+        """Blocking ``call`` for synchronous ``fn``."""
+        attempt = 0
+        while True:
+            self.acquire_sync(tokens)
+            try:
+                return fn()
+            except Exception as e:
+                delay = self._retry_delay(e, attempt, idempotent)
+                if delay is None:
+                    raise
+            time.sleep(delay)
+            attempt += 1
+
+    def stats(self) -> dict:
+        """Budgets, current bucket levels and call/throttle/retry counts of this process."""
+        with self._lock:
+            counters = dict(self._counters)
+        state = self._snapshot()
+        return {
+            "requests_per_minute": self.capacities["requests"] or None,
+            "tokens_per_minute": self.capacities["tokens"] or None,
+            "levels": {name: round(level, 1) for name, level in state["levels"].items() if self.capacities[name]},
+            "paused_s": round(max(0.0, state["paused_until"] - time.time()), 2),
+            **counters,
+            "waited_s": round(counters["waited_s"], 2),
+        }
+
+    def _snapshot(self) -> dict:
+        with self._lock:
+            state = {"levels": dict(self._state["levels"]), "updated": self._state["updated"],
+                     "paused_until": self._state["paused_until"]}
+        self._apply(state, {}, time.time())
+        return state
+
+
+class SqliteRateLimiter(RateLimiter):
+    """
+    Rate limiter whose buckets live in a SQLite file, shared by every process using it
+    (e.g. the gunicorn workers of one container), so together they stay within one budget.
+
+    Args:
+        path (str): SQLite database file. Parent directories are created if needed.
+        **kwargs: As for :class:`RateLimiter`.
+    """
+
+    def __init__(self, path: str, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS rate_limit_state ("
+            " name TEXT PRIMARY KEY,"
+            " value REAL NOT NULL)"
+        )
+
+    def _transaction(self, update):
+        """Run ``update(state)`` on the shared state inside one write transaction."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = dict(self._conn.execute("SELECT name, value FROM rate_limit_state").fetchall())
+                state = {
+                    "levels": {name: rows.get(f"level:{name}", capacity) for name, capacity in self.capacities.items()},
+                    "updated": rows.get("updated", time.time()),
+                    "paused_until": rows.get("paused_until", 0.0),
+                }
+                result = update(state)
+                values = [(f"level:{name}", level) for name, level in state["levels"].items()]
+                values += [("updated", state["updated"]), ("paused_until", state["paused_until"])]
+                self._conn.executemany("INSERT OR REPLACE INTO rate_limit_state (name, value) VALUES (?, ?)", values)
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return result
+
+    def _reserve(self, costs: dict) -> float:
+        return self._transaction(lambda state: self._apply(state, costs, time.time()))
+
+    def _pause_until(self, until: float):
+        def update(state):
+            state["paused_until"] = max(state["paused_until"], until)
+        self._transaction(update)
+
+    def _snapshot(self) -> dict:
+        def update(state):
+            self._apply(state, {}, time.time())
+            return {"levels": dict(state["levels"]), "updated": state["updated"], "paused_until": state["paused_until"]}
+        return self._transaction(update)
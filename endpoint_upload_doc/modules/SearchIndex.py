@@ -0,0 +1,446 @@
+import hashlib
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+_TERM = re.compile(r"[^\W_]+")
+
+STOPWORDS = frozenset(
+    "a about above after again against all am an and any are as at be because been before being below between "
+    "both but by can could did do does doing down during each few for from further had has have having he her "
+    "here hers herself him himself his how i if in into is it its itself just me more most my myself no nor not "
+    "now of off on once only or other our ours ourselves out over own same she should so some such than that the "
+    "their theirs them themselves then there these they this those through to too under until up very was we "
+    "were what when where which while who whom why will with would you your yours yourself yourselves".split()
+)
+
+
+def analyze(text: str) -> list:
+    """Index terms of ``text``: lowercased words, without stopwords and single characters."""
+    return [t for t in _TERM.findall(text.lower()) if len(t) > 1 and t not in STOPWORDS]
+
+
+class SearchIndex:
+    """
+    Incremental BM25 full-text index of the documents uploaded to each folder, stored in SQLite.
+
+    Every document is cut into passages of about ``passage_words`` words (following its
+    paragraphs), and an inverted index maps each term to the passages holding it, per
+    folder. ``search`` ranks the documents of one folder with BM25 over whole documents,
+    and their passages with BM25 over passages, without reading anything but the postings
+    of the query terms, so it answers in milliseconds.
+
+    Documents are identified by (folder_id, filename): indexing a filename again replaces
+    its previous version, and unchanged content (same sha256) is skipped. Documents are
+    removed with ``delete_document`` / ``delete_folder``, and ``reindex_folder`` rebuilds a
+    folder from scratch, replacing its index only once the rebuild succeeded.
+
+    Args:
+        path (str): SQLite database file. Parent directories are created if needed.
+        passage_words (int): Target words per passage.
+        k1 (float): BM25 term frequency saturation.
+        b (float): BM25 length normalization.
+
+    Example:
+        >>> index = SearchIndex("/tmp/search_index.sqlite3")
+        >>> index.index_document("source-1", "paper.md", markdown_text, file_id="file-1")
+        >>> index.search("source-1", "protein folding")["documents"][0]["filename"]
+        'paper.md'
+    """
+
+    def __init__(self, path: str, passage_words: int = 120, k1: float = 1.2, b: float = 0.75):
+        self.path = path
+        self.passage_words = max(20, passage_words)
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # The index can always be rebuilt from Letta: no fsync per indexed document.
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            " doc_id INTEGER PRIMARY KEY,"
+            " folder_id TEXT NOT NULL,"
+            " filename TEXT NOT NULL,"
+            " file_id TEXT,"
+            " kind TEXT,"
+            " content_hash TEXT NOT NULL,"
+            " length INTEGER NOT NULL,"
+            " passages INTEGER NOT NULL,"
+            " indexed_at REAL NOT NULL,"
+            " UNIQUE (folder_id, filename))"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS passages ("
+            " passage_id INTEGER PRIMARY KEY,"
+            " doc_id INTEGER NOT NULL,"
+            " position INTEGER NOT NULL,"
+            " text TEXT NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS passages_doc ON passages (doc_id)")
+        # The inverted index: one row per (term, passage), with what BM25 needs inline.
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS postings ("
+            " folder_id TEXT NOT NULL,"
+            " term TEXT NOT NULL,"
+            " passage_id INTEGER NOT NULL,"
+            " doc_id INTEGER NOT NULL,"
+            " tf INTEGER NOT NULL,"
+            " passage_length INTEGER NOT NULL,"
+            " PRIMARY KEY (folder_id, term, passage_id)) WITHOUT ROWID"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS postings_doc ON postings (doc_id)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS folder_stats ("
+            " folder_id TEXT PRIMARY KEY,"
+            " documents INTEGER NOT NULL,"
+            " passages INTEGER NOT NULL,"
+            " document_length INTEGER NOT NULL)"
+        )
+        self._conn.commit()
+
+    # ------------------------------------------------------------ indexing
+
+    def split_passages(self, text: str) -> list:
+        """Passages of about ``passage_words`` words, made of whole paragraphs where possible."""
+        passages, current, current_words = [], [], 0
+        for paragraph in re.split(r"\n\s*\n", text):
+            words = paragraph.split()
+            if not words:
+                continue
+            # Paragraphs much longer than a passage are cut into windows.
+            if len(words) > 2 * self.passage_words:
+                if current:
+                    passages.append("\n\n".join(current))
+                    current, current_words = [], 0
+                for start in range(0, len(words), self.passage_words):
+                    passages.append(" ".join(words[start:start + self.passage_words]))
+                continue
+            current.append(paragraph.strip())
+            current_words += len(words)
+            if current_words >= self.passage_words:
+                passages.append("\n\n".join(current))
+                current, current_words = [], 0
+        if current:
+            passages.append("\n\n".join(current))
+        return passages
+
+    def _delete(self, doc_id: int, folder_id: str):
+        """Remove a document and its passages/postings. Call with the lock held, in a transaction."""
+        length, passages = self._conn.execute(
+            "SELECT length, passages FROM documents WHERE doc_id = ?", (doc_id,)
+        ).fetchone()
+        self._conn.execute("DELETE FROM postings WHERE doc_id = ?", (doc_id,))
+        self._conn.execute("DELETE FROM passages WHERE doc_id = ?", (doc_id,))
+        self._conn.execute("DELETE FROM documents WHERE doc_id = ?", (doc_id,))
+        self._conn.execute(
+            "UPDATE folder_stats SET documents = documents - 1, passages = passages - ?,"
+            " document_length = document_length - ? WHERE folder_id = ?",
+            (passages, length, folder_id)
+        )
+
+    def index_document(self, folder_id: str, filename: str, text: str, file_id: str = None, kind: str = None) -> bool:
+        """
+        Index ``text`` as ``filename`` of ``folder_id``, replacing a previous version.
+
+        Returns:
+            bool: False if the same content was already indexed under this name (nothing done).
+        """
+        content_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        passages = self.split_passages(text)
+        analyzed = [analyze(passage) for passage in passages]
+        length = sum(len(terms) for terms in analyzed)
+
+        with self._lock:
+            try:
+                row = self._conn.execute(
+                    "SELECT doc_id, content_hash FROM documents WHERE folder_id = ? AND filename = ?",
+                    (folder_id, filename)
+                ).fetchone()
+                if row is not None and row[1] == content_hash:
+                    if file_id:
+                        self._conn.execute("UPDATE documents SET file_id = ? WHERE doc_id = ?", (file_id, row[0]))
+                        self._conn.commit()
+                    return False
+                if row is not None:
+                    self._delete(row[0], folder_id)
+
+                doc_id = self._conn.execute(
+                    "INSERT INTO documents (folder_id, filename, file_id, kind, content_hash, length, passages, indexed_at)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (folder_id, filename, file_id, kind, content_hash, length, len(passages), time.time())
+                ).lastrowid
+                postings = []
+                for position, (passage, terms) in enumerate(zip(passages, analyzed)):
+                    passage_id = self._conn.execute(
+                        "INSERT INTO passages (doc_id, position, text) VALUES (?, ?, ?)",
+                        (doc_id, position, passage)
+                    ).lastrowid
+                    counts = {}
+                    for term in terms:
+                        counts[term] = counts.get(term, 0) + 1
+                    postings.extend(
+                        (folder_id, term, passage_id, doc_id, tf, len(terms)) for term, tf in counts.items()
+                    )
+                # In key order, so the inserts walk the postings B-tree instead of jumping around it.
+                postings.sort(key=lambda posting: posting[1])
+                self._conn.executemany(
+                    "INSERT INTO postings (folder_id, term, passage_id, doc_id, tf, passage_length)"
+                    " VALUES (?, ?, ?, ?, ?, ?)",
+                    postings
+                )
+                self._conn.execute(
+                    "INSERT INTO folder_stats (folder_id, documents, passages, document_length) VALUES (?, 1, ?, ?)"
+                    " ON CONFLICT (folder_id) DO UPDATE SET documents = documents + 1,"
+                    " passages = passages + excluded.passages, document_length = document_length + excluded.document_length",
+                    (folder_id, len(passages), length)
+                )
+                self._conn.commit()
+            except BaseException:
+                self._conn.rollback()
+                raise
+        return True
+
+    def delete_document(self, folder_id: str, filename: str) -> bool:
+        """Remove ``filename`` of ``folder_id`` from the index; False if it wasn't indexed."""
+        with self._lock:
+            try:
+                row = self._conn.execute(
+                    "SELECT doc_id FROM documents WHERE folder_id = ? AND filename = ?", (folder_id, filename)
+                ).fetchone()
+                if row is None:
+                    return False
+                self._delete(row[0], folder_id)
+                self._conn.commit()
+            except BaseException:
+                self._conn.rollback()
+                raise
+        return True
+
+    def _delete_folder(self, folder_id: str) -> int:
+        """Remove every document of ``folder_id``. Call with the lock held, in a transaction."""
+        doc_ids = [row[0] for row in self._conn.execute(
+            "SELECT doc_id FROM documents WHERE folder_id = ?", (folder_id,)
+        )]
+        self._conn.execute("DELETE FROM postings WHERE folder_id = ?", (folder_id,))
+        self._conn.executemany("DELETE FROM passages WHERE doc_id = ?", [(d,) for d in doc_ids])
+        self._conn.execute("DELETE FROM documents WHERE folder_id = ?", (folder_id,))
+        self._conn.execute("DELETE FROM folder_stats WHERE folder_id = ?", (folder_id,))
+        return len(doc_ids)
+
+    def delete_folder(self, folder_id: str) -> int:
+        """Remove every document of ``folder_id``; returns how many there were."""
+        with self._lock:
+            try:
+                removed = self._delete_folder(folder_id)
+                self._conn.commit()
+            except BaseException:
+                self._conn.rollback()
+                raise
+        return removed
+
+    def reindex_folder(self, folder_id: str, documents) -> dict:
+        """
+        Rebuild the index of ``folder_id`` from ``documents``.
+
+        The documents are indexed under a staging folder id while they are read, and replace
+        the folder's index in one transaction once all of them were: if reading them fails
+        halfway (e.g. Letta errors), the current index stays as it was and keeps answering.
+
+        Args:
+            folder_id (str): Folder to rebuild.
+            documents (Iterable[dict]): {"filename", "text", "file_id" (optional), "kind" (optional)}.
+
+        Returns:
+            dict: {"removed": documents dropped, "indexed": documents indexed}
+        """
+        staging = f"{folder_id}\0reindex"
+        self.delete_folder(staging)  # Left over by an interrupted rebuild.
+        indexed = 0
+        try:
+            for document in documents:
+                self.index_document(
+                    staging, document["filename"], document["text"],
+                    file_id=document.get("file_id"), kind=document.get("kind")
+                )
+                indexed += 1
+        except BaseException:
+            self.delete_folder(staging)
+            raise
+
+        with self._lock:
+            try:
+                removed = self._delete_folder(folder_id)
+                for table in ("documents", "postings", "folder_stats"):
+                    self._conn.execute(f"UPDATE {table} SET folder_id = ? WHERE folder_id = ?", (folder_id, staging))
+                self._conn.commit()
+            except BaseException:
+                self._conn.rollback()
+                raise
+        return {"removed": removed, "indexed": indexed}
+
+    # ------------------------------------------------------------- search
+
+    def _bm25(self, tf, length, average: float, idf: float):
+        """BM25 scores of one term, for arrays of term frequencies and lengths."""
+        norm = self.k1 * (1 - self.b + self.b * length / average) if average else self.k1
+        return idf * tf * (self.k1 + 1) / (tf + norm)
+
+    @staticmethod
+    def _idf(count: int, df: int) -> float:
+        return math.log(1 + (count - df + 0.5) / (df + 0.5))
+
+    @staticmethod
+    def _snippet(text: str, match, max_chars: int) -> str:
+        """About ``max_chars`` of ``text``, starting shortly before the first query term (``match``)."""
+        if len(text) <= max_chars:
+            return text
+        found = match.search(text)
+        first = found.start() if found else 0
+        start = max(0, min(first - max_chars // 4, len(text) - max_chars))
+        start = text.rfind(" ", 0, start) + 1 if start else 0
+        end = start + max_chars
+        return ("..." if start else "") + text[start:end].strip() + ("..." if end < len(text) else "")
+
+    def search(
+        self,
+        folder_id: str,
+        query: str,
+        limit: int = 10,
+        passages_per_document: int = 2,
+        snippet_chars: int = 300
+    ) -> dict:
+        """
+        Rank the documents and passages of ``folder_id`` matching ``query`` (BM25).
+
+        Returns:
+            dict: {"query", "folder_id", "terms", "documents": [{"filename", "file_id", "kind",
+            "score", "passages": [{"position", "score", "snippet"}]}], "passages": [{"filename",
+            "file_id", "kind", "position", "score", "snippet"}], "took_ms"}
+        """
+        started = time.perf_counter()
+        terms = list(dict.fromkeys(analyze(query)))[:32]
+        result = {"query": query, "folder_id": folder_id, "terms": terms, "documents": [], "passages": []}
+
+        stats, postings, documents = None, [], {}
+        if terms:
+            with self._lock:
+                stats = self._conn.execute(
+                    "SELECT documents, passages, document_length FROM folder_stats WHERE folder_id = ?", (folder_id,)
+                ).fetchone()
+                # One (passage_id, doc_id, tf, passage_length) array per query term.
+                postings = [
+                    np.array(self._conn.execute(
+                        "SELECT passage_id, doc_id, tf, passage_length FROM postings WHERE folder_id = ? AND term = ?",
+                        (folder_id, term)
+                    ).fetchall(), dtype=np.int64).reshape(-1, 4)
+                    for term in terms
+                ]
+                documents = {
+                    doc_id: (filename, file_id, kind, length)
+                    for doc_id, filename, file_id, kind, length in self._conn.execute(
+                        "SELECT doc_id, filename, file_id, kind, length FROM documents WHERE folder_id = ?", (folder_id,)
+                    )
+                }
+        postings = [p for p in postings if len(p)]
+        if stats is None or not postings:
+            result["took_ms"] = round((time.perf_counter() - started) * 1000, 2)
+            return result
+
+        document_count, passage_count, total_length = stats
+        average_passage = total_length / passage_count if passage_count else 0
+        average_document = total_length / document_count if document_count else 0
+        passage_scores, document_ids, document_scores = [], [], []
+        for p in postings:
+            passage_scores.append(self._bm25(p[:, 2], p[:, 3], average_passage, self._idf(passage_count, len(p))))
+            # Term frequency in a document: the sum over its passages.
+            docs, inverse = np.unique(p[:, 1], return_inverse=True)
+            tf = np.bincount(inverse.reshape(-1), weights=p[:, 2])
+            lengths = np.array([documents[d][3] for d in docs.tolist()])
+            document_ids.append(docs)
+            document_scores.append(self._bm25(tf, lengths, average_document, self._idf(document_count, len(docs))))
+
+        # Sum the scores of every term per passage and per document.
+        every = np.concatenate(postings)
+        passage_ids, inverse = np.unique(every[:, 0], return_inverse=True)
+        inverse = inverse.reshape(-1)
+        passage_score = np.bincount(inverse, weights=np.concatenate(passage_scores))
+        passage_doc = np.empty(len(passage_ids), dtype=np.int64)
+        passage_doc[inverse] = every[:, 1]
+        doc_ids, inverse = np.unique(np.concatenate(document_ids), return_inverse=True)
+        doc_score = np.bincount(inverse.reshape(-1), weights=np.concatenate(document_scores))
+
+        top_documents = np.argsort(-doc_score, kind="stable")[:limit]
+        top_passages = np.argsort(-passage_score, kind="stable")[:limit]
+        best_passages = {}
+        for i in top_documents.tolist():
+            own = np.nonzero(passage_doc == doc_ids[i])[0]
+            best_passages[i] = own[np.argsort(-passage_score[own], kind="stable")[:passages_per_document]].tolist()
+        shown = set(top_passages.tolist()).union(*best_passages.values())
+
+        shown_ids = [int(passage_ids[j]) for j in shown]
+        with self._lock:
+            texts = {
+                passage_id: (position, text)
+                for passage_id, position, text in self._conn.execute(
+                    f"SELECT passage_id, position, text FROM passages WHERE passage_id IN ({','.join('?' * len(shown_ids))})",
+                    shown_ids
+                )
+            }
+        match = re.compile(r"\b(?:" + "|".join(map(re.escape, terms)) + r")\b", re.IGNORECASE)
+
+        def passage_hit(j):
+            # A document deleted since the postings were read has no text left.
+            position, text = texts.get(int(passage_ids[j]), (None, ""))
+            return {
+                "position": position,
+                "score": round(float(passage_score[j]), 4),
+                "snippet": self._snippet(text, match, snippet_chars),
+            }
+
+        for i in top_documents.tolist():
+            filename, file_id, kind, _ = documents[int(doc_ids[i])]
+            result["documents"].append({
+                "filename": filename,
+                "file_id": file_id,
+                "kind": kind,
+                "score": round(float(doc_score[i]), 4),
+                "passages": [passage_hit(j) for j in best_passages[i]],
+            })
+        for j in top_passages.tolist():
+            filename, file_id, kind, _ = documents[int(passage_doc[j])]
+            result["passages"].append({"filename": filename, "file_id": file_id, "kind": kind, **passage_hit(j)})
+        result["took_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        return result
+
+    def stats(self, folder_id: str = None) -> dict:
+        """Indexed documents, passages and terms, over all folders or for one."""
+        with self._lock:
+            if folder_id is None:
+                folders, documents, passages = self._conn.execute(
+                    "SELECT COUNT(*), COALESCE(SUM(documents), 0), COALESCE(SUM(passages), 0) FROM folder_stats"
+                ).fetchone()
+                postings = self._conn.execute("SELECT COUNT(*) FROM postings").fetchone()[0]
+                return {"folders": folders, "documents": documents, "passages": passages,
+                        "postings": postings, "path": self.path}
+            row = self._conn.execute(
+                "SELECT documents, passages FROM folder_stats WHERE folder_id = ?", (folder_id,)
+            ).fetchone()
+            files = [
+                {"filename": filename, "file_id": file_id, "kind": kind, "passages": passages, "indexed_at": indexed_at}
+                for filename, file_id, kind, passages, indexed_at in self._conn.execute(
+                    "SELECT filename, file_id, kind, passages, indexed_at FROM documents"
+                    " WHERE folder_id = ? ORDER BY filename", (folder_id,)
+                )
+            ]
+        documents, passages = row or (0, 0)
+        return {"folder_id": folder_id, "documents": documents, "passages": passages, "files": files}
@@ -0,0 +1,139 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+
+class SummaryCache:
+    """
+    Persistent, content-addressed cache for LLM summaries, stored in SQLite.
+
+    Entries are keyed on the hash of (kind, model, prompt template, input text), so a
+    chunk that was already summarized with the same prompt and model is never sent to
+    the LLM again, whichever document or agent it comes from. The total size of the
+    stored summaries is capped; when the cap is exceeded the least recently used
+    entries are evicted.
+
+    Hit/miss counters are kept per process and per kind (e.g. "map", "reduce").
+
+    Args:
+        path (str): SQLite database file. Parent directories are created if needed.
+        max_bytes (int): Size cap for the stored summaries, in bytes.
+
+    Example:
+        >>> cache = SummaryCache("/tmp/summary_cache.sqlite3")
+        >>> key = cache.make_key("map", "gpt-4o-mini", "Summarize: {context}", "some text")
+        >>> cache.get(key) is None
+        True
+        >>> cache.put(key, "a summary")
+        >>> cache.get(key)
+        'a summary'
+    """
+
+    def __init__(self, path: str, max_bytes: int = 256 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._counters = {}
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS summaries ("
+            " key TEXT PRIMARY KEY,"
+            " kind TEXT NOT NULL,"
+            " value TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " last_access REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS summaries_last_access ON summaries (last_access)"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(kind: str, model: str, prompt: str, text: str) -> str:
+        """Build the cache key for ``text`` summarized with ``prompt`` by ``model``."""
+        text_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        h = hashlib.sha256()
+        for part in (kind, model, prompt, text_hash):
+            h.update(part.encode("utf-8"))
+            h.update(b"\0")
+        return h.hexdigest()
+
+    def get(self, key: str, kind: str = "map"):
+        """Return the cached summary for ``key`` (refreshing its LRU position) or None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM summaries WHERE key = ?", (key,)
+            ).fetchone()
+            counters = self._counters.setdefault(kind, {"hits": 0, "misses": 0})
+            if row is None:
+                counters["misses"] += 1
+                return None
+            counters["hits"] += 1
+            self._conn.execute(
+                "UPDATE summaries SET last_access = ? WHERE key = ?", (time.time(), key)
+            )
+            self._conn.commit()
+            return row[0]
+
+    def put(self, key: str, value: str, kind: str = "map"):
+        """Store a summary, then evict least recently used entries above the size cap."""
+        size = len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO summaries (key, kind, value, size, last_access)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (key, kind, value, size, time.time())
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM summaries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self._conn.execute(
+            "SELECT key, size FROM summaries ORDER BY last_access ASC"
+        )
+        to_delete = []
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            to_delete.append((key,))
+            total -= size
+        self._conn.executemany("DELETE FROM summaries WHERE key = ?", to_delete)
+
+    def stats(self) -> dict:
+        """Hit/miss counters (total and per kind) plus the current size of the cache."""
+        with self._lock:
+            entries, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM summaries"
+            ).fetchone()
+            by_kind = {k: dict(v) for k, v in self._counters.items()}
+        hits = sum(v["hits"] for v in by_kind.values())
+        misses = sum(v["misses"] for v in by_kind.values())
+        lookups = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "by_kind": by_kind,
+            "entries": entries,
+            "bytes": size,
+            "max_bytes": self.max_bytes,
+            "path": self.path,
+        }
+
+    def clear(self):
+        """Remove every entry and reset the counters."""
+        with self._lock:
+            self._conn.execute("DELETE FROM summaries")
+            self._conn.commit()
+            self._counters = {}
@@ -0,0 +1,276 @@
+import logging
+import re
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+
+log = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()) -> str:
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._render_sample(key, value))
+        return lines
+
+    def _render_sample(self, key, value) -> list:
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {value}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total, count = self._values.get(key, ([0] * len(self.buckets), 0.0, 0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._values[key] = (counts, total + value, count + 1)
+
+    def _render_sample(self, key, value) -> list:
+        counts, total, count = value
+        labels = _format_labels(self.labelnames, key)
+        lines = [
+            f"{self.name}_bucket{_format_labels(self.labelnames, key, [('le', bound)])} {bucket_count}"
+            for bound, bucket_count in zip(self.buckets, counts)
+        ]
+        lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, [('le', '+Inf')])} {count}")
+        lines.append(f"{self.name}_sum{labels} {total}")
+        lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class Telemetry:
+    """
+    Process-wide timed spans, Prometheus metrics and optional OpenTelemetry traces.
+
+    ``span(stage)`` times a block of work: the duration goes to the
+    ``research_assistant_stage_duration_seconds`` histogram (labelled with the stage
+    and ``ok``/``error``), the ``research_assistant_stage_in_flight`` gauge counts the
+    blocks currently running, a DEBUG log line is written when that level is enabled,
+    and an OpenTelemetry span is started when an exporter is configured. LLM token
+    usage and Letta HTTP calls have their own counters. ``render()`` returns every
+    metric in the Prometheus text format for the ``/metrics`` endpoint.
+
+    Example:
+        >>> telemetry = Telemetry.default()
+        >>> with telemetry.span("convert", filename="paper.pdf"):
+        ...     markdown = converter.convert(path)
+        >>> telemetry.record_tokens("gpt-4o-mini", "map", input_tokens=812, output_tokens=95)
+    """
+
+    _default = None
+    _default_lock = threading.Lock()
+
+    # Letta ids in URL paths (agent-<uuid>, source-<uuid>, file-<uuid>, message-<uuid>, ...)
+    _ID_SEGMENT = re.compile(r"/[a-z]+-[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}")
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.stage_duration = Histogram(
+            "research_assistant_stage_duration_seconds",
+            "Duration of each processing stage.",
+            ("stage", "status"),
+            buckets,
+        )
+        self.in_flight = Gauge(
+            "research_assistant_stage_in_flight",
+            "Stages currently running.",
+            ("stage",),
+        )
+        self.llm_tokens = Counter(
+            "research_assistant_llm_tokens_total",
+            "LLM tokens used, by model, call kind and direction.",
+            ("model", "kind", "direction"),
+        )
+        self.dedup_tokens = Counter(
+            "research_assistant_dedup_tokens_removed_total",
+            "Tokens removed before summarization, by reason (boilerplate lines, near-duplicate chunks).",
+            ("reason",),
+        )
+        self.letta_calls = Counter(
+            "research_assistant_letta_calls_total",
+            "HTTP calls made to the Letta server.",
+            ("method", "path", "status"),
+        )
+        self.letta_duration = Histogram(
+            "research_assistant_letta_call_duration_seconds",
+            "Duration of HTTP calls to the Letta server.",
+            ("method", "path"),
+            buckets,
+        )
+        self._metrics = [
+            self.stage_duration, self.in_flight, self.llm_tokens, self.dedup_tokens, self.letta_calls, self.letta_duration
+        ]
+        self._tracer = None
+
+    @classmethod
+    def default(cls):
+        """The process-wide telemetry."""
+        with cls._default_lock:
+            if cls._default is None:
+                cls._default = cls()
+            return cls._default
+
+    # ------------------------------------------------------------------ spans
+
+    @contextmanager
+    def span(self, stage: str, **attributes):
+        """Time the enclosed block as ``stage``; works around awaits as well."""
+        with ExitStack() as stack:
+            if self._tracer is not None:
+                # Current span, so nested spans (e.g. map calls in a summary) are its children.
+                stack.enter_context(self._tracer.start_as_current_span(stage, attributes={
+                    k: v for k, v in attributes.items() if isinstance(v, (str, bool, int, float))
+                }))
+            self.in_flight.inc(stage=stage)
+            started = time.perf_counter()
+            status = "ok"
+            try:
+                yield
+            except BaseException:
+                status = "error"
+                raise
+            finally:
+                elapsed = time.perf_counter() - started
+                self.in_flight.dec(stage=stage)
+                self.stage_duration.observe(elapsed, stage=stage, status=status)
+                if log.isEnabledFor(logging.DEBUG):
+                    details = " ".join(f"{k}={v}" for k, v in attributes.items())
+                    log.debug(f"[Span] {stage} {status} in {elapsed * 1000:.1f} ms {details}".rstrip())
+
+    def record_tokens(self, model: str, kind: str, input_tokens: int = 0, output_tokens: int = 0):
+        """Count the tokens of one LLM call."""
+        if input_tokens:
+            self.llm_tokens.inc(input_tokens, model=model, kind=kind, direction="input")
+        if output_tokens:
+            self.llm_tokens.inc(output_tokens, model=model, kind=kind, direction="output")
+
+    def record_dedup(self, boilerplate_tokens: int = 0, duplicate_tokens: int = 0):
+        """Count the tokens removed from a document before summarization."""
+        if boilerplate_tokens:
+            self.dedup_tokens.inc(boilerplate_tokens, reason="boilerplate")
+        if duplicate_tokens:
+            self.dedup_tokens.inc(duplicate_tokens, reason="near_duplicate")
+
+    def record_usage(self, model: str, kind: str, message):
+        """Count the tokens of a LangChain chat model response (``usage_metadata``), if reported."""
+        usage = getattr(message, "usage_metadata", None) or {}
+        self.record_tokens(model, kind, usage.get("input_tokens", 0), usage.get("output_tokens", 0))
+
+    # ------------------------------------------------------------ Letta calls
+
+    def _letta_path(self, url) -> str:
+        return self._ID_SEGMENT.sub("/{id}", url.path)
+
+    def _on_letta_request(self, request):
+        request.extensions["research_assistant_started"] = time.perf_counter()
+
+    def _on_letta_response(self, response):
+        request = response.request
+        path = self._letta_path(request.url)
+        self.letta_calls.inc(method=request.method, path=path, status=response.status_code)
+        started = request.extensions.get("research_assistant_started")
+        if started is not None:
+            self.letta_duration.observe(time.perf_counter() - started, method=request.method, path=path)
+
+    async def _on_letta_request_async(self, request):
+        self._on_letta_request(request)
+
+    async def _on_letta_response_async(self, response):
+        self._on_letta_response(response)
+
+    def httpx_event_hooks(self, asynchronous: bool = False) -> dict:
+        """Event hooks counting and timing every call of an httpx client to Letta."""
+        if asynchronous:
+            return {"request": [self._on_letta_request_async], "response": [self._on_letta_response_async]}
+        return {"request": [self._on_letta_request], "response": [self._on_letta_response]}
+
+    # ---------------------------------------------------------------- export
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def enable_otel(self, service_name: str = "research-assistant", endpoint: str = None) -> bool:
+        """
+        Export spans with OpenTelemetry over OTLP/HTTP. Requires ``opentelemetry-sdk`` and
+        ``opentelemetry-exporter-otlp-proto-http``; without them the metrics keep working
+        and only the traces are skipped.
+
+        Returns:
+            bool: Whether the exporter is active.
+        """
+        try:
+            from opentelemetry import trace
+            from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+            from opentelemetry.sdk.resources import Resource
+            from opentelemetry.sdk.trace import TracerProvider
+            from opentelemetry.sdk.trace.export import BatchSpanProcessor
+        except ImportError:
+            log.warning("[Telemetry] OpenTelemetry packages are not installed, traces are disabled.")
+            return False
+        provider = TracerProvider(resource=Resource.create({"service.name": service_name}))
+        exporter = OTLPSpanExporter(endpoint=endpoint) if endpoint else OTLPSpanExporter()
+        provider.add_span_processor(BatchSpanProcessor(exporter))
+        trace.set_tracer_provider(provider)
+        self._tracer = trace.get_tracer(__name__)
+        log.info(f"[Telemetry] Exporting traces for '{service_name}' over OTLP.")
+        return True
@@ -0,0 +1,344 @@
+import logging
+import queue
+import threading
+import time
+
+from .MetadataCache import MetadataCache
+from .Telemetry import Telemetry
+
+log = logging.getLogger(__name__)
+
+
+class UploadStatusTracker:
+    """
+    Central tracker of Letta file processing statuses (chunking and embedding).
+
+    Instead of one polling thread per uploaded file, a single background thread lists
+    each folder that has pending files once per tick, pages through the listing until
+    every pending file of that folder has been seen, and records the statuses in an
+    in-memory table. Folders whose files make no progress are polled less and less
+    often (adaptive backoff), and polling resumes at full speed as soon as something
+    changes or a new file is tracked.
+
+    Status changes are pushed to subscribers (e.g. SSE connections) as they are seen.
+
+    Tracking also ends without Letta reporting a final status: a file that two full
+    listings of its folder no longer contain (deleted) becomes ``missing``, a file
+    replaced by a new upload of its name becomes ``superseded`` (see ``untrack``), and a
+    file still pending after ``max_pending_age`` seconds becomes ``expired``.
+
+    Args:
+        min_interval (float): Seconds between polls of a folder that is making progress.
+        max_interval (float): Upper bound of the backoff interval.
+        backoff (float): Multiplier applied to a folder's interval after a tick with no change.
+        page_size (int): Files requested per list call.
+        retention (float): Seconds finished entries are kept in the table.
+        max_entries (int): Maximum number of finished entries kept in the table.
+        max_pending_age (float): Seconds after which a file that never reached a final status
+            stops being polled.
+        telemetry (Telemetry, optional): Receives the ``letta.processing`` duration of each file
+            (upload to completed/error, i.e. Letta's chunking and embedding). Defaults to the
+            process-wide telemetry.
+        metadata_cache (MetadataCache, optional): Holds the folder listings of ``refresh`` for a
+            short while (its ``folder_files`` TTL), so lookups of several unknown files of one
+            folder share one listing. Defaults to the process-wide cache.
+    """
+
+    TERMINAL_STATUSES = {"completed", "error", "missing", "superseded", "expired"}
+
+    _default = None
+    _default_lock = threading.Lock()
+
+    def __init__(
+        self,
+        min_interval: float = 1.0,
+        max_interval: float = 15.0,
+        backoff: float = 1.5,
+        page_size: int = 100,
+        retention: float = 3600.0,
+        max_entries: int = 10000,
+        max_pending_age: float = 3600.0,
+        telemetry: Telemetry = None,
+        metadata_cache: MetadataCache = None
+    ):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.page_size = page_size
+        self.retention = retention
+        self.max_entries = max_entries
+        self.max_pending_age = max_pending_age
+        self.telemetry = telemetry or Telemetry.default()
+        self.metadata_cache = metadata_cache or MetadataCache.default()
+        self._tracked_at = {}
+        self._misses = {}
+        self._entries = {}
+        self._folders = {}
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._stopped = threading.Event()
+
+    @classmethod
+    def default(cls):
+        """The process-wide tracker."""
+        with cls._default_lock:
+            if cls._default is None:
+                cls._default = cls()
+            return cls._default
+
+    # ------------------------------------------------------------------ table
+
+    def track(self, client, folder_id: str, file_id: str, filename: str = None, status: str = None):
+        """Record an uploaded file and poll its folder until the file reaches a final status."""
+        entry = {
+            "file_id": file_id,
+            "folder_id": folder_id,
+            "filename": filename,
+            "status": status or "pending",
+            "error_message": None,
+            "chunks_embedded": None,
+            "total_chunks": None,
+            "updated_at": time.time(),
+        }
+        with self._lock:
+            self._entries[file_id] = entry
+            self._tracked_at.setdefault(file_id, time.time())
+            folder = self._folders.setdefault(folder_id, {"client": client, "interval": self.min_interval, "due": 0.0})
+            folder["client"] = client
+            folder["interval"] = self.min_interval
+            folder["due"] = 0.0
+        self._publish(entry)
+        self._ensure_running()
+        self._wakeup.set()
+
+    def untrack(self, file_id: str, status: str = "superseded", error_message: str = None):
+        """Stop polling ``file_id`` (e.g. replaced by a new upload), recording ``status`` as its final status."""
+        self._finish(file_id, status, error_message)
+
+    def _finish(self, file_id: str, status: str, error_message: str = None):
+        """Give a tracked file a final status that Letta did not report, and publish it."""
+        with self._lock:
+            current = self._entries.get(file_id)
+            if current is None or current["status"] in self.TERMINAL_STATUSES:
+                return
+            entry = dict(current, status=status, error_message=error_message, updated_at=time.time())
+            self._entries[file_id] = entry
+            self._tracked_at.pop(file_id, None)
+            self._misses.pop(file_id, None)
+        log.info(f"[Upload] {status.capitalize()}: {entry['filename']}")
+        self._publish(entry)
+
+    def get(self, file_id: str):
+        """Return the last known status entry of ``file_id``, or None if it isn't tracked."""
+        with self._lock:
+            entry = self._entries.get(file_id)
+            return dict(entry) if entry else None
+
+    def refresh(self, client, folder_id: str, file_id: str):
+        """
+        Look up a file this process doesn't know about (uploaded by another worker, or before
+        a restart) and keep tracking it if it isn't finished.
+
+        The folder listing is shared through the metadata cache: concurrent lookups in one
+        folder make one paginated listing, and later ones reuse it until it expires.
+
+        Returns:
+            dict | None: The status entry, or None if the file isn't in the folder.
+        """
+        files = self.metadata_cache.get_or_load(
+            "folder_files",
+            folder_id,
+            lambda: self._list_folder(client, folder_id, None)
+        )
+        f = files.get(file_id)
+        if f is None:
+            return None
+        status = getattr(f, "processing_status", None)
+        name = getattr(f, "original_file_name", None) or getattr(f, "file_name", None)
+        if status in self.TERMINAL_STATUSES:
+            entry = self._entry_from_file(f, folder_id, name)
+            with self._lock:
+                self._entries[file_id] = entry
+            return dict(entry)
+        self.track(client, folder_id, file_id, filename=name, status=status)
+        return self.get(file_id)
+
+    # ------------------------------------------------------------ subscribers
+
+    def subscribe(self) -> queue.Queue:
+        """Register a subscriber; every status change is put on the returned queue."""
+        q = queue.Queue(maxsize=1000)
+        with self._lock:
+            self._subscribers.add(q)
+        return q
+
+    def unsubscribe(self, q: queue.Queue):
+        with self._lock:
+            self._subscribers.discard(q)
+
+    def _publish(self, entry: dict):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for q in subscribers:
+            try:
+                q.put_nowait(dict(entry))
+            except queue.Full:
+                # Slow consumer: drop the event rather than block the tracker.
+                pass
+
+    # ---------------------------------------------------------------- polling
+
+    def _ensure_running(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name="upload-status-tracker", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._wakeup.set()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            now = time.time()
+            with self._lock:
+                due = [
+                    (folder_id, folder) for folder_id, folder in self._folders.items()
+                    if folder["due"] <= now
+                ]
+            for folder_id, folder in due:
+                self._poll_folder(folder_id, folder)
+
+            self._evict()
+            with self._lock:
+                if not self._folders:
+                    next_due = None
+                else:
+                    next_due = min(folder["due"] for folder in self._folders.values())
+            timeout = self.max_interval if next_due is None else max(0.05, next_due - time.time())
+            self._wakeup.wait(timeout)
+            self._wakeup.clear()
+
+    def _pending_in(self, folder_id: str) -> set:
+        with self._lock:
+            return {
+                file_id for file_id, entry in self._entries.items()
+                if entry["folder_id"] == folder_id and entry["status"] not in self.TERMINAL_STATUSES
+            }
+
+    def _poll_folder(self, folder_id: str, folder: dict):
+        pending = self._pending_in(folder_id)
+        if not pending:
+            with self._lock:
+                self._folders.pop(folder_id, None)
+            return
+
+        changed = False
+        complete = False
+        try:
+            found = self._list_folder(folder["client"], folder_id, pending)
+            # Fewer files than wanted means the listing went through the whole folder.
+            complete = len(found) < len(pending)
+        except Exception as e:
+            log.warning(f"[Upload] Status polling error for folder {folder_id}: {e}")
+            found = {}
+
+        now = time.time()
+        for file_id in pending:
+            f = found.get(file_id)
+            with self._lock:
+                tracked_at = self._tracked_at.get(file_id, now)
+                if f is None:
+                    misses = self._misses[file_id] = self._misses.get(file_id, 0) + complete
+                else:
+                    self._misses.pop(file_id, None)
+                    misses = 0
+            if misses >= 2:
+                # Deleted, or replaced through another worker: it will never finish.
+                self._finish(file_id, "missing", "File is no longer in the folder")
+                changed = True
+                continue
+            if now - tracked_at > self.max_pending_age and (
+                f is None or getattr(f, "processing_status", None) not in self.TERMINAL_STATUSES
+            ):
+                self._finish(file_id, "expired", f"No final status after {self.max_pending_age:.0f}s")
+                changed = True
+                continue
+            if f is None:
+                continue
+            with self._lock:
+                current = self._entries.get(file_id)
+                if current is None:
+                    continue
+                entry = self._entry_from_file(f, folder_id, current["filename"])
+                if (entry["status"], entry["chunks_embedded"]) == (current["status"], current["chunks_embedded"]):
+                    continue
+                self._entries[file_id] = entry
+            changed = True
+            if entry["status"] in self.TERMINAL_STATUSES:
+                log.info(f"[Upload] {entry['status'].capitalize()}: {entry['filename']}")
+                with self._lock:
+                    tracked_at = self._tracked_at.pop(file_id, None)
+                if tracked_at is not None:
+                    self.telemetry.stage_duration.observe(
+                        time.time() - tracked_at,
+                        stage="letta.processing",
+                        status="ok" if entry["status"] == "completed" else "error"
+                    )
+            self._publish(entry)
+
+        with self._lock:
+            if changed:
+                folder["interval"] = self.min_interval
+            else:
+                folder["interval"] = min(self.max_interval, folder["interval"] * self.backoff)
+            folder["due"] = time.time() + folder["interval"]
+
+    def _list_folder(self, client, folder_id: str, wanted: set) -> dict:
+        """Page through the folder (newest first) until every wanted file is found, or all of it when ``wanted`` is None."""
+        found = {}
+        after = None
+        while True:
+            files = client.folders.files.list(
+                folder_id=folder_id,
+                order="desc",
+                limit=self.page_size,
+                after=after
+            )
+            for f in files:
+                if wanted is None or f.id in wanted:
+                    found[f.id] = f
+            if (wanted is not None and len(found) == len(wanted)) or len(files) < self.page_size:
+                return found
+            after = files[-1].id
+
+    @staticmethod
+    def _entry_from_file(f, folder_id: str, filename: str) -> dict:
+        return {
+            "file_id": f.id,
+            "folder_id": folder_id,
+            "filename": filename,
+            "status": getattr(f, "processing_status", None),
+            "error_message": getattr(f, "error_message", None),
+            "chunks_embedded": getattr(f, "chunks_embedded", None),
+            "total_chunks": getattr(f, "total_chunks", None),
+            "updated_at": time.time(),
+        }
+
+    def _evict(self):
+        """Drop finished entries past their retention, and the oldest beyond ``max_entries``."""
+        cutoff = time.time() - self.retention
+        with self._lock:
+            finished = sorted(
+                (entry["updated_at"], file_id) for file_id, entry in self._entries.items()
+                if entry["status"] in self.TERMINAL_STATUSES
+            )
+            excess = max(0, len(self._entries) - self.max_entries)
+            for i, (updated_at, file_id) in enumerate(finished):
+                if updated_at < cutoff or i < excess:
+                    del self._entries[file_id]
+                    self._tracked_at.pop(file_id, None)
+                    self._misses.pop(file_id, None)
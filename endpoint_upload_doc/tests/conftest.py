@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The service imports its modules as ``modules.*`` from endpoint_upload_doc.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
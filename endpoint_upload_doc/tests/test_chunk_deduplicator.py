@@ -0,0 +1,45 @@
+from modules.ChunkDeduplicator import ChunkDeduplicator
+
+
+def _pages(bodies, header="Journal of Testing", footer="Page {n} of {total}"):
+    pages = []
+    for n, body in enumerate(bodies, 1):
+        pages.append(f"{header}\n\n{body}\n\n{footer.format(n=n, total=len(bodies))}")
+    return "\n\f".join(pages)
+
+
+def test_numbered_content_survives():
+    text = "\n\n".join([
+        "para 1 content words here",
+        "para 2 content words here",
+        "para 3 content words here",
+        "para 4 content words here",
+        "1. Mix the reagents",
+        "2. Heat the sample",
+        "3. Measure the signal",
+        "| step | value |",
+        "| 1 | 10 |",
+        "| 2 | 10 |",
+        "| 3 | 10 |",
+    ])
+    stripped, removed = ChunkDeduplicator().strip_boilerplate(text)
+    assert removed == []
+    assert stripped == text
+
+
+def test_running_headers_and_page_numbers_are_removed():
+    bodies = [
+        f"Body of page {n}, with its own sentences.\nStep {n} of the method is described here.\n" + "".join(f"Line {i} of page {n}.\n" for i in range(6))
+        for n in range(1, 6)
+    ]
+    stripped, removed = ChunkDeduplicator().strip_boilerplate(_pages(bodies))
+    assert stripped.count("Journal of Testing") == 1
+    assert stripped.count("Page ") == 1
+    assert len(removed) == 8
+    for n in range(1, 6):
+        assert f"Step {n} of the method" in stripped
+
+
+def test_repeats_close_together_are_kept():
+    text = "\n\n".join(["Chorus line"] * 4)
+    assert ChunkDeduplicator().strip_boilerplate(text)[1] == []
@@ -0,0 +1,35 @@
+import pytest
+
+from benchmarks.FakeLettaServer import FakeLettaServer
+from modules.AssistantWithFilesys import AssistantWithFilesys
+from modules.FileManifest import FileManifest
+
+
+@pytest.fixture(params=[False, True], ids=["reply-only", "echo-user-message"])
+def letta(request):
+    server = FakeLettaServer(echo_user_message=request.param)
+    base_url = server.start()
+    yield server, base_url
+    server.stop()
+
+
+def _page_through(assistant, limit):
+    messages, before = [], None
+    while True:
+        page = assistant.get_history(before=before, limit=limit)
+        messages = page["messages"] + messages
+        before = page["next_cursor"]
+        if before is None:
+            return messages
+
+
+def test_history_pages_through_every_chat_turn(letta):
+    server, base_url = letta
+    assistant = AssistantWithFilesys("history-test", "history-test-folder", base_url=base_url, manifest=FileManifest())
+    for i in range(6):
+        assistant.chat(f"question {i}")
+
+    stored = [m["content"] for m in server.messages[assistant.agent.id]]
+    assert len(stored) == 12
+    assert [m["content"] for m in _page_through(assistant, limit=4)] == stored
+    assert all(m["id"] for m in assistant.get_conversation(limit=50))
@@ -0,0 +1,74 @@
+import pytest
+
+from modules.SearchIndex import SearchIndex
+
+
+@pytest.fixture
+def index(tmp_path):
+    return SearchIndex(str(tmp_path / "search_index.sqlite3"))
+
+
+def _found(index, folder_id, query):
+    return [document["filename"] for document in index.search(folder_id, query)["documents"]]
+
+
+def test_index_and_search(index):
+    assert index.index_document("f1", "proteins.md", "Protein folding kinetics.\n\nChaperones assist folding.", file_id="file-1")
+    index.index_document("f1", "markets.md", "Energy prices and market policy.")
+    index.index_document("f2", "other.md", "Protein folding in another folder.")
+
+    result = index.search("f1", "protein folding")
+    assert [document["filename"] for document in result["documents"]] == ["proteins.md"]
+    assert result["documents"][0]["file_id"] == "file-1"
+    assert "folding" in result["passages"][0]["snippet"]
+    assert index.stats("f1")["documents"] == 2
+
+
+def test_reindexing_a_filename_replaces_it(index):
+    index.index_document("f1", "paper.md", "Protein folding kinetics.")
+    assert not index.index_document("f1", "paper.md", "Protein folding kinetics.")
+    assert index.index_document("f1", "paper.md", "Energy market prices.")
+
+    assert _found(index, "f1", "protein") == []
+    assert _found(index, "f1", "energy") == ["paper.md"]
+    assert index.stats("f1")["documents"] == 1
+
+
+def test_delete_document_and_folder(index):
+    index.index_document("f1", "a.md", "Protein folding kinetics.")
+    index.index_document("f1", "b.md", "Protein structure prediction.")
+
+    assert index.delete_document("f1", "a.md")
+    assert not index.delete_document("f1", "a.md")
+    assert _found(index, "f1", "protein") == ["b.md"]
+
+    assert index.delete_folder("f1") == 1
+    assert _found(index, "f1", "protein") == []
+    assert index.stats()["postings"] == 0
+
+
+def test_reindex_replaces_the_folder(index):
+    index.index_document("f1", "old.md", "Protein folding kinetics.")
+    index.index_document("f2", "kept.md", "Protein folding elsewhere.")
+
+    result = index.reindex_folder("f1", [{"filename": "new.md", "text": "Protein structure prediction."}])
+
+    assert result == {"removed": 1, "indexed": 1}
+    assert _found(index, "f1", "protein") == ["new.md"]
+    assert _found(index, "f2", "protein") == ["kept.md"]
+    assert index.stats()["folders"] == 2
+
+
+def test_failed_reindex_keeps_the_current_index(index):
+    index.index_document("f1", "old.md", "Protein folding kinetics.")
+
+    def listing():
+        yield {"filename": "new.md", "text": "Protein structure prediction."}
+        raise ConnectionError("Letta went away")
+
+    with pytest.raises(ConnectionError):
+        index.reindex_folder("f1", listing())
+
+    assert _found(index, "f1", "protein") == ["old.md"]
+    stats = index.stats()
+    assert (stats["folders"], stats["documents"]) == (1, 1)